@@ -2,31 +2,34 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from secrets import token_urlsafe
 import jwt
 from jwt import PyJWTError
 from passlib.context import CryptContext
-from supabase import Client, create_client
+import logging
 import os
 from dotenv import load_dotenv
+import metrics
+from auth_cache import RevocationList, UserCache
+from executors import Overloaded, run_io, run_password
+from supabase_client import get_client
+
+logger = logging.getLogger(__name__)
 
 # Cargar variables de entorno
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")  # Asegúrate de cambiar esto en producción
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-# Inicializar Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Coste de bcrypt (cada unidad más duplica el tiempo de hash y verificación)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
 # Configurar el router
 router = APIRouter()
 
 # Configurar el contexto de encriptación de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # Configurar OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -73,34 +76,59 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def load_revocations():
+    # Solo las revocaciones que no han caducado: las demás ya las rechaza el propio JWT
+    with metrics.supabase_query("invalidated_tokens"):
+        response = get_client().table("invalidated_tokens") \
+            .select("token, expires_at") \
+            .gt("expires_at", datetime.now(timezone.utc).isoformat()) \
+            .execute()
+    return response.data
+
+# Tokens revocados y usuarios verificados en memoria para no consultar Supabase en cada petición
+revocations = RevocationList(load_revocations)
+user_cache = UserCache()
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        # Verificar si el token está en la lista negra
-        response = supabase.table("invalidated_tokens").select("*").eq("token", token).execute()
-        if response.data:
+    with metrics.auth_timer():
+        credentials_exception = HTTPException(
+            status_code=401,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        # Verificar firma y caducidad del JWT localmente, antes de cualquier consulta
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+            token_data = TokenData(email=email)
+        except PyJWTError:
             raise credentials_exception
 
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        # Verificar si el token está en la lista negra (copia en memoria que se relee cada pocos segundos)
+        if revocations.needs_refresh():
+            try:
+                await run_io(revocations.refresh)
+            except Exception as e:
+                logger.error(f"Error al leer los tokens revocados: {str(e)}")
+                if not revocations.loaded:
+                    raise HTTPException(status_code=500, detail=f"Error loading invalidated tokens: {str(e)}")
+        if token in revocations:
             raise credentials_exception
-        token_data = TokenData(email=email)
-    except PyJWTError:
-        raise credentials_exception
 
-    user = get_user_by_email(token_data.email)
-    if user is None:
-        raise credentials_exception
-    return user
+        user = user_cache.get(token_data.email)
+        if user is None:
+            user = await run_io(get_user_by_email, token_data.email)
+            if user is None:
+                raise credentials_exception
+            user_cache.put(token_data.email, user)
+        return user
 
 def get_user_by_email(email: str):
     try:
-        response = supabase.table("users").select("*").eq("email", email).execute()
+        with metrics.supabase_query("users"):
+            response = get_client().table("users").select("*").eq("email", email).execute()
         if response.data:
             return User(**response.data[0])
         return None
@@ -119,14 +147,14 @@ async def signup(user: UserCreate):
         )
     
     # Crear nuevo usuario
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_password(get_password_hash, user.password)
     try:
         new_user = {
             "email": user.email,
             "hashed_password": hashed_password,
             "is_active": True
         }
-        response = supabase.table("users").insert(new_user).execute()
+        response = get_client().table("users").insert(new_user).execute()
         
         # Crear token de acceso
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -144,7 +172,8 @@ async def signup(user: UserCreate):
 @router.post("/login", response_model=Token)
 async def login(user_data: UserCreate):
     # Buscar usuario por email
-    response = supabase.table("users").select("*").eq("email", user_data.email).execute()
+    with metrics.supabase_query("users"):
+        response = get_client().table("users").select("*").eq("email", user_data.email).execute()
     
     if not response.data:
         raise HTTPException(
@@ -155,7 +184,7 @@ async def login(user_data: UserCreate):
     
     # Obtener el hash de la contraseña
     hashed_password = response.data[0]["hashed_password"]
-    if not verify_password(user_data.password, hashed_password):
+    if not await run_password(verify_password, user_data.password, hashed_password):
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password",
@@ -180,7 +209,8 @@ async def logout(current_user: User = Depends(get_current_user), token: str = De
             "token": token,
             "expires_at": expires_at.isoformat()
         }
-        supabase.table("invalidated_tokens").insert(invalidated_token).execute()
+        get_client().table("invalidated_tokens").insert(invalidated_token).execute()
+        revocations.add(token, expires_at.timestamp())
         
         return {"message": "Successfully logged out"}
     except Exception as e:
@@ -202,7 +232,7 @@ async def forgot_password(request: PasswordResetRequest):
     
     try:
         # Actualizar usuario con el token
-        supabase.table("users").update({
+        get_client().table("users").update({
             "reset_token": reset_token,
             "reset_token_expires": expires.isoformat()
         }).eq("email", request.email).execute()
@@ -220,7 +250,7 @@ async def forgot_password(request: PasswordResetRequest):
 async def reset_password(reset: PasswordReset):
     try:
         # Buscar usuario con el token válido
-        response = supabase.table("users").select("*").eq("reset_token", reset.token).execute()
+        response = get_client().table("users").select("*").eq("reset_token", reset.token).execute()
         
         if not response.data:
             raise HTTPException(
@@ -239,16 +269,17 @@ async def reset_password(reset: PasswordReset):
             )
         
         # Actualizar contraseña y limpiar token
-        hashed_password = get_password_hash(reset.new_password)
-        supabase.table("users").update({
+        hashed_password = await run_password(get_password_hash, reset.new_password)
+        get_client().table("users").update({
             "hashed_password": hashed_password,
             "reset_token": None,
             "reset_token_expires": None
         }).eq("id", user_data["id"]).execute()
+        user_cache.invalidate(user_data["email"])
         
         return {"message": "Password has been reset successfully"}
     except Exception as e:
-        if isinstance(e, HTTPException):
+        if isinstance(e, (HTTPException, Overloaded)):
             raise e
         raise HTTPException(
             status_code=500,
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre lecturas de la tabla invalidated_tokens
+AUTH_REVOCATION_REFRESH_SECONDS = float(os.getenv("AUTH_REVOCATION_REFRESH_SECONDS", "10"))
+
+# Segundos que se reutiliza un usuario leído de Supabase y número máximo de usuarios guardados
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+
+
+# Fracción de segundo y zona horaria sin minutos en las fechas de Postgres
+_FRACTION = re.compile(r"\.(\d+)")
+_SHORT_OFFSET = re.compile(r"(:\d{2}(?:\.\d+)?[+-]\d{2})$")
+
+
+def token_key(token: str) -> str:
+    """Huella del token; en memoria no se guardan los tokens en claro."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _timestamp(value) -> float:
+    """Segundos epoch de un expires_at de Postgres (sin zona horaria se toma UTC).
+
+    datetime.fromisoformat de Python 3.9 solo acepta fracciones de 3 o 6 cifras y zonas
+    "+HH:MM", pero Postgres recorta los ceros finales ("00:00:00.12+00") y puede devolver "Z".
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    text = _FRACTION.sub(lambda match: "." + match.group(1)[:6].ljust(6, "0"), text)
+    text = _SHORT_OFFSET.sub(r"\1:00", text)
+    parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class RevocationList:
+    """Tokens revocados (logout) en memoria, indexados por su huella SHA-256.
+
+    loader devuelve las filas de invalidated_tokens que todavía no han caducado. Las
+    revocaciones nunca se deshacen, así que cada lectura se une a lo que ya había y las
+    entradas se eliminan cuando pasa su expires_at: a partir de ahí el JWT ya no es válido.
+    """
+
+    def __init__(self, loader: Callable[[], List[dict]], refresh_seconds: float = AUTH_REVOCATION_REFRESH_SECONDS):
+        self._loader = loader
+        self.refresh_seconds = refresh_seconds
+        # huella del token -> expires_at (timestamp)
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._refreshed_at: Optional[float] = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def needs_refresh(self) -> bool:
+        refreshed_at = self._refreshed_at
+        return refreshed_at is None or time.monotonic() - refreshed_at >= self.refresh_seconds
+
+    def refresh(self):
+        """Lee las revocaciones vigentes si la copia en memoria ha caducado."""
+        with self._lock:
+            # Otra petición puede haberla actualizado mientras se esperaba el lock
+            if not self.needs_refresh():
+                return
+            try:
+                rows = self._loader()
+            except Exception:
+                self.refresh_failures += 1
+                raise
+            revoked = dict(self._revoked)
+            for row in rows:
+                revoked[token_key(row["token"])] = _timestamp(row["expires_at"])
+            self._revoked = self._pruned(revoked)
+            self._refreshed_at = time.monotonic()
+            self.refreshes += 1
+
+    @property
+    def loaded(self) -> bool:
+        return self._refreshed_at is not None
+
+    def add(self, token: str, expires_at: float):
+        """Revoca un token en este proceso sin esperar a la siguiente lectura."""
+        with self._lock:
+            revoked = dict(self._revoked)
+            revoked[token_key(token)] = expires_at
+            self._revoked = revoked
+
+    def __contains__(self, token: str) -> bool:
+        expires_at = self._revoked.get(token_key(token))
+        return expires_at is not None and expires_at > time.time()
+
+    def __len__(self):
+        return len(self._revoked)
+
+    @staticmethod
+    def _pruned(revoked: Dict[str, float]) -> Dict[str, float]:
+        now = time.time()
+        return {key: expires_at for key, expires_at in revoked.items() if expires_at > now}
+
+
+class UserCache(LRUCache[str, object]):
+    """Usuarios leídos de Supabase, por email, durante ttl segundos (LRU con tamaño máximo)."""
+
+    def __init__(self, ttl: float = AUTH_USER_CACHE_TTL_SECONDS, maxsize: int = AUTH_USER_CACHE_SIZE):
+        super().__init__(maxsize, ttl)
+
+    def invalidate(self, email: str):
+        self.pop(email)
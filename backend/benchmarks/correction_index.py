@@ -0,0 +1,67 @@
+"""Compara CorrectionIndex (borrados simétricos) con process.extractOne sobre correcciones sintéticas.
+
+Uso (desde backend/):
+    python -m benchmarks.correction_index --corrections 1000 10000 --max-distance 2
+"""
+import argparse
+import random
+import time
+
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import process
+
+from benchmarks.town_matcher import misspell
+from matching import CorrectionIndex, MATCH_THRESHOLD, MAX_EDIT_DISTANCE
+
+
+def synthetic_corrections(count: int, rng: random.Random):
+    keys = set()
+    while len(keys) < count:
+        keys.add("".join(rng.choice("abcdefghijklmnoprstuvwy") for _ in range(rng.randint(3, 12))))
+    return sorted(keys)
+
+
+def run(correction_count: int, query_count: int, max_distance: int, seed: int):
+    rng = random.Random(seed)
+    keys = synthetic_corrections(correction_count, rng)
+    queries = [misspell(rng.choice(keys), rng) for _ in range(query_count)]
+
+    start = time.perf_counter()
+    index = CorrectionIndex(keys, max_distance)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [index.extract_one(q) for q in queries]
+    indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linear = []
+    for q in queries:
+        best_match, best_score = process.extractOne(q, keys, scorer=fuzz.ratio)
+        linear.append((best_match, best_score) if best_score >= MATCH_THRESHOLD else None)
+    linear_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(indexed, linear) if a != b)
+    print(f"corrections={correction_count:>7} k={max_distance} "
+          f"build={build_time * 1000:8.1f} ms "
+          f"extractOne={linear_time / query_count * 1000:8.3f} ms/word "
+          f"index={indexed_time / query_count * 1000:8.3f} ms/word "
+          f"comparisons/word={index.comparisons / query_count:8.1f} "
+          f"mismatches={mismatches}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corrections", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--max-distance", type=int, default=MAX_EDIT_DISTANCE)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    mismatches = sum(run(count, args.queries, args.max_distance, args.seed) for count in args.corrections)
+    if mismatches:
+        raise SystemExit(f"{mismatches} resultados distintos de process.extractOne")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Sustituto en memoria del cliente de Supabase para los benchmarks.
+
+Solo implementa lo que usa supabase_loader: client.table(nombre).select(columnas).execute().
+"""
+import time
+from typing import Dict, List
+
+
+class FakeResponse:
+    def __init__(self, data: List[dict]):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self._client = client
+        self._table = table
+        self._columns: List[str] = []
+
+    def select(self, columns: str = "*") -> "FakeQuery":
+        self._columns = [] if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def execute(self) -> FakeResponse:
+        start = time.perf_counter()
+        rows = self._client.tables.get(self._table, [])
+        if self._columns:
+            data = [{column: row.get(column) for column in self._columns} for row in rows]
+        else:
+            data = [dict(row) for row in rows]
+        self._client.fetch_seconds[self._table] = time.perf_counter() - start
+        return FakeResponse(data)
+
+
+class FakeSupabase:
+    """Tablas en memoria; fetch_seconds guarda cuánto tardó la última lectura de cada tabla."""
+
+    def __init__(self, tables: Dict[str, List[dict]]):
+        self.tables = tables
+        self.fetch_seconds: Dict[str, float] = {}
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
@@ -0,0 +1,109 @@
+"""Compara la sincronización incremental de los diccionarios con la reconstrucción completa.
+
+Usa un MemoryStore como origen de eventos: cada lote añade, modifica y borra
+correcciones y pueblos, y el snapshot se actualiza con StoreLoader.sync(). Mide lo que
+tarda en aplicarse cada lote frente a reconstruir el snapshot desde las tablas, y
+comprueba que las correcciones de un documento sintético son las mismas con el
+snapshot parcheado que con uno reconstruido (índices y cdist). Falla si alguna difiere.
+
+Uso (desde backend/):
+    python -m benchmarks.incremental_sync --rows 10000 100000 --batches 5 --batch-size 20
+"""
+import argparse
+import random
+import time
+
+from benchmarks.pipeline import synthetic_document, synthetic_tables
+from benchmarks.town_matcher import misspell
+from dictionary import build_snapshot, store_loader
+from dictionary_store import MemoryStore
+from spellchecker import check_text, word_cache
+import spellchecker
+
+
+def random_edits(store: MemoryStore, size: int, rng: random.Random):
+    """Aplica al almacén un lote de cambios como los de un editor; devuelve las palabras tocadas."""
+    keys = [row["original"] for row in store.rows("spellcheck")]
+    towns = [row["name"] for row in store.rows("towns")]
+    touched = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < 0.35:
+            original = misspell(rng.choice(keys), rng) or rng.choice(keys)
+            store.upsert("spellcheck", [{"original": original, "suggestion": original.upper()}])
+            touched.append(original)
+        elif roll < 0.5:
+            original = rng.choice(keys)
+            store.upsert("spellcheck", [{"original": original, "suggestion": original[::-1].upper()}])
+            touched.append(original)
+        elif roll < 0.65:
+            original = rng.choice(keys)
+            store.delete("spellcheck", [original])
+            touched.append(misspell(original, rng))
+            if rng.random() < 0.3:
+                # Borrada y vuelta a añadir en el mismo lote: pasa al final de la tabla
+                store.upsert("spellcheck", [{"original": original, "suggestion": "again"}])
+        elif roll < 0.85:
+            name = misspell(rng.choice(towns), rng).title()
+            store.upsert("towns", [{"name": name}])
+            touched.append(name)
+        else:
+            name = rng.choice(towns)
+            store.delete("towns", [name])
+            touched.append(misspell(name, rng))
+    return touched
+
+
+def suggestions(text: str, snapshot, bulk: bool):
+    spellchecker.USE_BULK_SCORING = bulk
+    word_cache.clear()
+    response = check_text(text, snapshot)
+    return [(s["start"], s["original"], s["suggestion"], s["similarity"]) for s in response["suggestions"]]
+
+
+def run(rows: int, batches: int, batch_size: int, size: int, seed: int) -> int:
+    rng = random.Random(seed)
+    tables = synthetic_tables(rows, rng)
+    store = MemoryStore(tables)
+    loader = store_loader(store)
+    start = time.perf_counter()
+    snapshot = loader()
+    print(f"rows={rows:>7} build={(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    mismatches = 0
+    for batch in range(batches):
+        touched = random_edits(store, batch_size, rng)
+        start = time.perf_counter()
+        patched = loader.sync()
+        sync_time = time.perf_counter() - start
+        start = time.perf_counter()
+        rebuilt = build_snapshot(store.corrections(), store.towns())
+        rebuild_time = time.perf_counter() - start
+
+        text = synthetic_document(size, tables, rng) + " " + " ".join(touched)
+        differences = sum(
+            suggestions(text, patched, bulk) != suggestions(text, rebuilt, bulk) for bulk in (False, True)
+        )
+        mismatches += differences
+        print(f"  batch={batch + 1:>3} changes={batch_size:>5} sync={sync_time * 1000:8.2f} ms "
+              f"rebuild={rebuild_time * 1000:8.1f} ms speedup={rebuild_time / max(sync_time, 1e-9):8.1f}x "
+              f"corrections={len(patched.custom_replacements):>7} towns={len(patched.town_names):>7} "
+              f"mismatches={differences}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--size", type=int, default=20000, help="Bytes del documento de comprobación")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    mismatches = sum(run(rows, args.batches, args.batch_size, args.size, args.seed) for rows in args.rows)
+    if mismatches:
+        raise SystemExit(f"{mismatches} documentos con correcciones distintas de la reconstrucción completa")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Mide cuántas comparaciones aproximadas evita la etapa "lexicon" con un diccionario de inglés real.
+
+El diccionario es una lista de palabras ordenada por frecuencia, la misma que usa la API
+(ENGLISH_LEXICON_PATH y ENGLISH_LEXICON_SIZE, o --lexicon y --limit), y el texto no se
+genera a partir de él: sale de --text (un corpus de texto real) o, si no se indica, de
+la lista completa con frecuencias de Zipf, así que incluye palabras raras que quedan
+fuera de las --limit primeras. Además se añaden erratas (--typo-rate) de las palabras
+del texto y nombres de las tablas towns y spellcheck (--names-rate).
+
+Cada documento se corrige con la etapa desactivada y activada. Se muestran las
+comparaciones contra towns y spellcheck, el tiempo de las etapas aproximadas y, por
+tipo de palabra distinta, cuántas reciben sugerencia: las conocidas que dejan de
+corregirse por error, las erratas que siguen corrigiéndose y las que el diccionario
+acepta porque son otra palabra inglesa.
+
+Uso (desde backend/):
+    python -m benchmarks.known_words --lexicon palabras_frecuentes.txt --limit 50000 --sizes 100KB 1MB
+    python -m benchmarks.known_words --lexicon palabras_frecuentes.txt --text corpus.txt --typo-rate 0.05
+"""
+import argparse
+import itertools
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.pipeline import PUNCTUATION, parse_size, synthetic_tables
+from benchmarks.town_matcher import misspell
+from dictionary import supabase_loader
+from lexicon import ENGLISH_LEXICON_PATH, ENGLISH_LEXICON_SIZE, EnglishLexicon, file_words
+from spellchecker import check_text, word_cache
+from tokenizer import WORD, iter_spans, tokenize
+import spellchecker
+
+FUZZY_STAGES = ["fuzzy_town", "fuzzy_corrections"]
+# Tipos de palabra del documento
+KNOWN = "known"
+UNKNOWN = "unknown"
+TYPO = "typo"
+NAME = "name"
+KINDS = [KNOWN, UNKNOWN, TYPO, NAME]
+
+
+def comparisons(snapshot) -> int:
+    return (
+        snapshot.town_matcher.comparisons
+        + snapshot.correction_index.comparisons
+        + snapshot.town_scorer.comparisons
+        + snapshot.correction_scorer.comparisons
+    )
+
+
+def measure(text: str, snapshot, enabled: bool):
+    """Corrige text con la etapa "lexicon" activada o no; devuelve (respuesta, comparaciones, tiempos)."""
+    spellchecker.english_lexicon.enabled = enabled
+    word_cache.clear()
+    before = comparisons(snapshot)
+    timings = {}
+    started = time.perf_counter()
+    response = check_text(text, snapshot, timings=timings)
+    timings["total"] = time.perf_counter() - started
+    return response, comparisons(snapshot) - before, timings
+
+
+def zipf_words(ranked: List[str], rng: random.Random):
+    """Palabras de ranked (ordenadas por frecuencia) con probabilidad proporcional a 1/rango."""
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(ranked) + 1)))
+    while True:
+        yield from rng.choices(ranked, cum_weights=cum_weights, k=4096)
+
+
+def corpus_words(path: str):
+    """Tokens de un fichero de texto, repetidos indefinidamente."""
+    with open(path, encoding="utf-8") as f:
+        tokens = tokenize(f.read())
+    if not tokens:
+        raise SystemExit(f"{path} no contiene texto")
+    return itertools.cycle(tokens)
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """Errata de word con al menos un carácter cambiado."""
+    while True:
+        wrong = misspell(word, rng)
+        if wrong.lower() != word.lower():
+            return wrong
+
+
+def realistic_document(
+    size: int,
+    words,
+    names: List[str],
+    rng: random.Random,
+    typo_rate: float,
+    names_rate: float,
+    punctuate: bool,
+) -> Tuple[str, Set[str], Set[str]]:
+    """Texto de unos size bytes con las palabras de words, erratas y nombres de las tablas.
+
+    Devuelve el texto y las erratas y nombres añadidos, en minúsculas. Con punctuate
+    (words es una lista de frecuencias, sin signos) se cierra una frase cada pocas
+    palabras y la siguiente empieza en mayúscula.
+    """
+    parts = []
+    typos: Set[str] = set()
+    added_names: Set[str] = set()
+    length = 0
+    sentence = 0
+    for word in words:
+        if length >= size:
+            break
+        roll = rng.random()
+        if roll < names_rate:
+            word = rng.choice(names)
+            added_names.update(token.lower() for token in tokenize(word))
+        elif roll < names_rate + typo_rate and word.isalpha() and len(word) > 3:
+            word = typo(word, rng)
+            typos.add(word.lower())
+        if punctuate and sentence == 0:
+            word = word[:1].upper() + word[1:]
+        parts.append(word)
+        length += len(word) + 1
+        sentence += 1
+        if punctuate and word.isalpha() and rng.random() < 1 / 12:
+            parts.append(rng.choice(PUNCTUATION))
+            sentence = 0
+    return " ".join(parts)[:size], typos, added_names
+
+
+def classify(text: str, known_words: EnglishLexicon, typos: Set[str], names: Set[str]) -> Dict[str, str]:
+    """Tipo de cada palabra distinta del texto (las que podrían recibir una sugerencia)."""
+    kinds = {}
+    for span in iter_spans(text):
+        if span.kind != WORD:
+            continue
+        word = text[span.start:span.end]
+        if word in kinds:
+            continue
+        if word.lower() in typos:
+            kinds[word] = TYPO
+        elif word.lower() in names:
+            kinds[word] = NAME
+        elif word in known_words:
+            kinds[word] = KNOWN
+        else:
+            kinds[word] = UNKNOWN
+    return kinds
+
+
+def suggested(response) -> Set[str]:
+    return {s["original"] for s in response["suggestions"] if s["suggestion"] != s["original"]}
+
+
+def run(rows: int, sizes, seed: int, known_words: EnglishLexicon, ranked: List[str], args):
+    rng = random.Random(seed)
+    tables = synthetic_tables(rows, rng)
+    names = [row["name"] for row in tables["towns"]] + [row["original"] for row in tables["spellcheck"]]
+    snapshot = supabase_loader(FakeSupabase(tables))()
+    spellchecker.english_lexicon = known_words
+    known_words.load()
+    print(f"rows={rows:>7} lexicon={len(known_words)} palabras")
+
+    words = corpus_words(args.text) if args.text else zipf_words(ranked, rng)
+    for size in sizes:
+        text, typos, added_names = realistic_document(
+            size, words, names, rng, args.typo_rate, args.names_rate, punctuate=not args.text
+        )
+        kinds = classify(text, known_words, typos, added_names)
+        baseline, off_comparisons, off_timings = measure(text, snapshot, enabled=False)
+        response, on_comparisons, on_timings = measure(text, snapshot, enabled=True)
+        avoided = off_comparisons - on_comparisons
+        off_fuzzy = sum(off_timings.get(stage, 0.0) for stage in FUZZY_STAGES)
+        on_fuzzy = sum(on_timings.get(stage, 0.0) for stage in FUZZY_STAGES)
+        print(
+            f"  size={size:>9} comparisons off={off_comparisons:>11} on={on_comparisons:>11} "
+            f"avoided={avoided:>11} ({avoided / max(off_comparisons, 1):6.1%}) "
+            f"fuzzy off={off_fuzzy * 1000:8.1f} ms on={on_fuzzy * 1000:8.1f} ms "
+            f"lexicon={on_timings.get('lexicon', 0.0) * 1000:6.1f} ms "
+            f"total off={off_timings['total'] * 1000:8.1f} ms on={on_timings['total'] * 1000:8.1f} ms"
+        )
+
+        # Palabras distintas de cada tipo y cuántas reciben sugerencia sin y con la etapa
+        totals = Counter(kinds.values())
+        off_suggested = Counter(kinds[word] for word in suggested(baseline) if word in kinds)
+        on_suggested = Counter(kinds[word] for word in suggested(response) if word in kinds)
+        print("    " + " ".join(
+            f"{kind}={totals[kind]} (sugeridas off={off_suggested[kind]} on={on_suggested[kind]})" for kind in KINDS
+        ))
+        # Erratas que forman otra palabra inglesa: la etapa las acepta sin buscar sugerencia
+        hidden = sum(1 for word, kind in kinds.items() if kind == TYPO and word in known_words)
+        print(f"    erratas aceptadas por ser palabras del diccionario={hidden}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--sizes", nargs="+", default=["100KB", "1MB"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--lexicon", default=ENGLISH_LEXICON_PATH,
+        help="Lista de palabras por frecuencia, una por línea (ENGLISH_LEXICON_PATH por defecto)",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=ENGLISH_LEXICON_SIZE,
+        help="Palabras más frecuentes de la lista que forman el diccionario (0 todas; ENGLISH_LEXICON_SIZE por defecto)",
+    )
+    parser.add_argument("--text", help="Fichero de texto real del que salen las palabras de los documentos")
+    parser.add_argument("--typo-rate", type=float, default=0.03, help="Proporción de palabras con errata")
+    parser.add_argument("--names-rate", type=float, default=0.02, help="Proporción de nombres de towns/spellcheck")
+    args = parser.parse_args()
+
+    if not args.lexicon:
+        parser.error("indica la lista de palabras con --lexicon o ENGLISH_LEXICON_PATH")
+    ranked = list(dict.fromkeys(word.lower() for word in file_words(args.lexicon)))
+    if not ranked:
+        parser.error(f"{args.lexicon} no contiene palabras")
+    lexicon_words = ranked[:args.limit] if args.limit else ranked
+    if not args.text and len(lexicon_words) == len(ranked):
+        print("Aviso: sin --text ni --limit todas las palabras del texto están en el diccionario, salvo erratas y nombres")
+    known_words = EnglishLexicon(lambda: lexicon_words)
+    sizes = [parse_size(size) for size in args.sizes]
+    for rows in args.rows:
+        run(rows, sizes, args.seed, known_words, ranked, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Mide el pipeline completo de /spellcheck con diccionarios y documentos sintéticos.
+
+Las tablas spellcheck y towns se leen de un Supabase en memoria, así que los resultados
+no dependen de la red. Para cada tamaño de diccionario y de documento se muestran los
+tiempos por etapa, las palabras por segundo y el pico de memoria (RSS) del proceso.
+
+Uso (desde backend/):
+    python -m benchmarks.pipeline --rows 1000 10000 100000 --sizes 1KB 100KB 1MB 10MB
+    python -m benchmarks.pipeline --rows 10000 --sizes 1MB --json resultados.json
+"""
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+
+import orjson
+
+from benchmarks.correction_index import synthetic_corrections
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.town_matcher import misspell, synthetic_towns
+from dictionary import supabase_loader
+from spellchecker import check_text, word_cache
+from tokenizer import tokenize
+
+STAGES = ["tokenize", "exact", "custom", "slang", "lexicon", "fuzzy_town", "fuzzy_corrections", "build"]
+
+COMMON_WORDS = [
+    "the", "and", "that", "have", "for", "not", "with", "you", "this", "but", "his", "from",
+    "they", "say", "her", "she", "will", "one", "all", "would", "there", "their", "what",
+    "out", "about", "who", "get", "which", "when", "make", "can", "like", "time", "just",
+    "him", "know", "take", "people", "into", "year", "your", "good", "some", "could", "them",
+    "see", "other", "than", "then", "now", "look", "only", "come", "its", "over", "think",
+    "also", "back", "after", "use", "two", "how", "our", "work", "first", "well", "way",
+    "even", "new", "want", "because", "any", "these", "give", "day", "most", "meeting",
+    "morning", "project", "report", "please", "thanks", "office", "client", "order",
+]
+PUNCTUATION = [".", ",", "!", "?", ";", ":"]
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024 * 1024}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
+
+
+def synthetic_tables(rows: int, rng: random.Random):
+    """Filas de las tablas spellcheck y towns con rows filas cada una."""
+    originals = synthetic_corrections(rows, rng)
+    corrections = [
+        {"original": original, "suggestion": "".join(reversed(original))}
+        for original in originals
+    ]
+    towns = [{"name": name} for name in synthetic_towns(rows, rng)]
+    return {"spellcheck": corrections, "towns": towns}
+
+
+def synthetic_document(size: int, tables, rng: random.Random) -> str:
+    """Texto de unos size bytes con palabras comunes, pueblos, correcciones, erratas y palabras desconocidas."""
+    towns = [row["name"] for row in tables["towns"]]
+    originals = [row["original"] for row in tables["spellcheck"]]
+    vocabulary = (
+        [rng.choice(towns) for _ in range(200)]
+        + [rng.choice(originals) for _ in range(200)]
+        + [misspell(rng.choice(towns), rng) for _ in range(300)]
+        + [misspell(rng.choice(originals), rng) for _ in range(300)]
+        + ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+           for _ in range(500)]
+    )
+    parts = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < 0.7:
+            word = rng.choice(COMMON_WORDS)
+        elif roll < 0.95:
+            word = rng.choice(vocabulary)
+        else:
+            word = rng.choice(PUNCTUATION)
+        parts.append(word)
+        length += len(word) + 1
+    return " ".join(parts)[:size]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run(rows: int, sizes, seed: int):
+    rng = random.Random(seed)
+    tables = synthetic_tables(rows, rng)
+    client = FakeSupabase(tables)
+
+    start = time.perf_counter()
+    snapshot = supabase_loader(client)()
+    load_time = time.perf_counter() - start
+    fetch_time = sum(client.fetch_seconds.values())
+    print(f"rows={rows:>7} fetch={fetch_time * 1000:8.1f} ms "
+          f"index={(load_time - fetch_time) * 1000:8.1f} ms rss={peak_rss_mb():8.1f} MB")
+
+    results = []
+    for size in sizes:
+        text = synthetic_document(size, tables, rng)
+        # Cada documento empieza con la caché de decisiones vacía
+        word_cache.clear()
+        timings = {}
+        start = time.perf_counter()
+        response = check_text(text, snapshot, timings=timings)
+        total = time.perf_counter() - start
+        start = time.perf_counter()
+        # La API codifica la respuesta con orjson (ORJSONResponse)
+        orjson.dumps(response)
+        serialize_time = time.perf_counter() - start
+
+        tokens = len(tokenize(text))
+        result = {
+            "rows": rows,
+            "bytes": size,
+            "tokens": tokens,
+            "suggestions": len(response["suggestions"]),
+            "fetch_seconds": fetch_time,
+            "index_seconds": load_time - fetch_time,
+            "stages": {stage: timings.get(stage, 0.0) for stage in STAGES},
+            "check_seconds": total,
+            "serialize_seconds": serialize_time,
+            "words_per_second": tokens / total if total else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        results.append(result)
+        stages = " ".join(f"{stage}={result['stages'][stage] * 1000:8.1f}" for stage in STAGES)
+        print(f"  size={size:>9} tokens={tokens:>8} {stages} json={serialize_time * 1000:8.1f} ms "
+              f"words/s={result['words_per_second']:10.0f} rss={result['peak_rss_mb']:8.1f} MB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--sizes", nargs="+", default=["1KB", "100KB", "1MB", "10MB"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Guarda los resultados en este fichero para compararlos entre versiones")
+    args = parser.parse_args()
+    sizes = [parse_size(size) for size in args.sizes]
+    results = []
+    for rows in args.rows:
+        results.extend(run(rows, sizes, args.seed))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
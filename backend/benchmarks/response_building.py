@@ -0,0 +1,80 @@
+"""Compara la serialización de las respuestas de /spellcheck con pydantic y con orjson.
+
+Antes la API validaba la respuesta con SpellCheckResponse (un modelo pydantic por
+sugerencia), la pasaba por jsonable_encoder y la codificaba con json; ahora el
+diccionario de check_text se codifica directamente con ORJSONResponse. Para documentos
+sintéticos de varios tamaños se muestran la construcción de la respuesta (etapa build)
+y cada paso de las dos serializaciones, y se comprueba que los dos cuerpos tienen el
+mismo contenido. Falla si alguno difiere.
+
+Uso (desde backend/):
+    python -m benchmarks.response_building --rows 10000 --sizes 100KB 1MB 5MB
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+# La API se importa sin Supabase: solo se usan sus modelos de respuesta
+os.environ.setdefault("DICTIONARY_STORE", "memory")
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from benchmarks.pipeline import parse_size, synthetic_document, synthetic_tables
+from dictionary import build_snapshot
+from main import SpellCheckResponse
+from spellchecker import check_text, word_cache
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    value = function(*args)
+    return value, time.perf_counter() - start
+
+
+def run(rows: int, sizes, seed: int) -> int:
+    rng = random.Random(seed)
+    tables = synthetic_tables(rows, rng)
+    snapshot = build_snapshot(tables["spellcheck"], tables["towns"])
+    print(f"rows={rows:>7}")
+
+    mismatches = 0
+    for size in sizes:
+        text = synthetic_document(size, tables, rng)
+        word_cache.clear()
+        timings = {}
+        result = check_text(text, snapshot, timings=timings)
+
+        model, validate_time = timed(lambda: SpellCheckResponse(**result))
+        encoded, encode_time = timed(jsonable_encoder, model)
+        before, dumps_time = timed(JSONResponse, encoded)
+        after, orjson_time = timed(ORJSONResponse, result)
+        pydantic_time = validate_time + encode_time + dumps_time
+
+        same = json.loads(before.body) == orjson.loads(after.body)
+        mismatches += not same
+        print(f"  size={size:>9} suggestions={len(result['suggestions']):>7} build={timings['build'] * 1000:8.1f} ms "
+              f"pydantic={validate_time * 1000:8.1f} encoder={encode_time * 1000:8.1f} "
+              f"json={dumps_time * 1000:8.1f} total={pydantic_time * 1000:8.1f} ms "
+              f"orjson={orjson_time * 1000:8.1f} ms speedup={pydantic_time / max(orjson_time, 1e-9):6.1f}x "
+              f"same={same}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000])
+    parser.add_argument("--sizes", nargs="+", default=["100KB", "1MB", "5MB"])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    sizes = [parse_size(size) for size in args.sizes]
+    mismatches = sum(run(rows, sizes, args.seed) for rows in args.rows)
+    if mismatches:
+        raise SystemExit(f"{mismatches} respuestas distintas entre pydantic y orjson")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compara el índice de towns (FuzzyMatcher) con process.extractOne sobre listas sintéticas.
+
+Uso (desde backend/):
+    python -m benchmarks.town_matcher --towns 1000 10000 --queries 500
+"""
+import argparse
+import random
+import time
+
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import process
+
+from matching import FuzzyMatcher, MATCH_THRESHOLD
+
+SYLLABLES = ["san", "ta", "ri", "ver", "side", "field", "ton", "ville", "burg", "mont", "port",
+             "lake", "wood", "ches", "ter", "mad", "i", "son", "ge", "or", "ga", "la", "na", "spring"]
+
+
+def synthetic_towns(count: int, rng: random.Random):
+    towns = []
+    for _ in range(count):
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+        if rng.random() < 0.1:
+            name += " " + "".join(rng.choice(SYLLABLES) for _ in range(2)).title()
+        towns.append(name)
+    return towns
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    chars = list(word.replace(" ", ""))
+    for _ in range(rng.randint(0, 2)):
+        pos = rng.randrange(len(chars))
+        op = rng.random()
+        if op < 0.33 and len(chars) > 3:
+            del chars[pos]
+        elif op < 0.66:
+            chars.insert(pos, rng.choice("aeioulnrst"))
+        else:
+            chars[pos] = rng.choice("aeioulnrst")
+    return "".join(chars)
+
+
+def linear_extract_one(word, town_names):
+    best_match, best_score = process.extractOne(word, town_names, scorer=fuzz.ratio)
+    if best_score >= MATCH_THRESHOLD:
+        return best_match, best_score
+    return None
+
+
+def run(town_count: int, query_count: int, seed: int):
+    rng = random.Random(seed)
+    towns = synthetic_towns(town_count, rng)
+    # Mitad de consultas son erratas de pueblos reales y mitad palabras sin relación
+    queries = [misspell(rng.choice(towns), rng) for _ in range(query_count // 2)]
+    queries += ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+                for _ in range(query_count - len(queries))]
+
+    start = time.perf_counter()
+    matcher = FuzzyMatcher(towns)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [matcher.extract_one(q) for q in queries]
+    indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linear = [linear_extract_one(q, towns) for q in queries]
+    linear_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(indexed, linear) if a != b)
+    print(f"towns={town_count:>7} queries={query_count:>5} "
+          f"build={build_time * 1000:8.1f} ms "
+          f"extractOne={linear_time / query_count * 1000:8.3f} ms/word "
+          f"index={indexed_time / query_count * 1000:8.3f} ms/word "
+          f"speedup={linear_time / max(indexed_time, 1e-9):7.1f}x "
+          f"comparisons/word={matcher.comparisons / query_count:8.1f} "
+          f"mismatches={mismatches}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--towns", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    mismatches = sum(run(count, args.queries, args.seed) for count in args.towns)
+    if mismatches:
+        raise SystemExit(f"{mismatches} resultados distintos de process.extractOne")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compila las tablas spellcheck y towns en un snapshot binario para arrancar sin consultar Supabase.
+
+Las tablas se leen del almacén configurado en DICTIONARY_STORE (Supabase por defecto).
+
+El fichero incluye los diccionarios normalizados y los índices de búsqueda ya construidos,
+con una suma de comprobación y los parámetros de los índices. La API lo usa al arrancar si
+DICTIONARY_SNAPSHOT_PATH apunta a él.
+
+Uso (desde backend/):
+    python compile_dictionaries.py --output dictionaries.snapshot
+    python compile_dictionaries.py --check dictionaries.snapshot
+"""
+import argparse
+import logging
+import os
+import time
+
+from dictionary import store_loader
+from dictionary_store import create_store
+from snapshot_file import SnapshotFileError, load_snapshot, save_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def compile_snapshot(output: str):
+    start = time.perf_counter()
+    snapshot = store_loader(create_store())()
+    save_snapshot(snapshot, output)
+    logger.info(
+        f"Snapshot {snapshot.version} escrito en {output} ({os.path.getsize(output) / 1e6:.1f} MB) "
+        f"en {time.perf_counter() - start:.1f} s"
+    )
+
+
+def check_snapshot(path: str) -> bool:
+    start = time.perf_counter()
+    try:
+        snapshot, compiled_at = load_snapshot(path)
+    except SnapshotFileError as e:
+        logger.error(str(e))
+        return False
+    logger.info(
+        f"Snapshot {snapshot.version} válido: {len(snapshot.custom_replacements)} correcciones, "
+        f"{len(snapshot.town_names)} pueblos/ciudades, compilado hace {time.time() - compiled_at:.0f} s, "
+        f"cargado en {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--output", help="Fichero en el que escribir el snapshot")
+    group.add_argument("--check", help="Comprueba un snapshot existente")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.output:
+        compile_snapshot(args.output)
+    elif not check_snapshot(args.check):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from dictionary_store import Change, DictionaryStore, SupabaseStore
+from matching import CorrectionIndex, FuzzyMatcher, TownIndex
+from scoring import BulkScorer
+from snapshot_file import SnapshotFileError, load_snapshot, save_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre recargas automáticas de los diccionarios (0 desactiva la recarga en segundo plano)
+DICTIONARY_TTL_SECONDS = float(os.getenv("DICTIONARY_TTL_SECONDS", "300"))
+# Segundos entre consultas de los cambios de las tablas (0 desactiva la sincronización incremental)
+DICTIONARY_SYNC_SECONDS = float(os.getenv("DICTIONARY_SYNC_SECONDS", "5"))
+# Con más cambios pendientes que estos se espera a la siguiente recarga completa
+DICTIONARY_SYNC_MAX_CHANGES = int(os.getenv("DICTIONARY_SYNC_MAX_CHANGES", "5000"))
+
+# Fichero con el snapshot compilado (compile_dictionaries.py) que se usa al arrancar sin consultar Supabase
+DICTIONARY_SNAPSHOT_PATH = os.getenv("DICTIONARY_SNAPSHOT_PATH", "")
+# Reescribir el fichero cuando una recarga trae una versión nueva de los diccionarios
+DICTIONARY_SNAPSHOT_WRITE = os.getenv("DICTIONARY_SNAPSHOT_WRITE", "false").lower() == "true"
+# Antigüedad máxima (segundos) del fichero para arrancar con él sin esperar a Supabase (0 sin límite)
+DICTIONARY_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("DICTIONARY_SNAPSHOT_MAX_AGE_SECONDS", "0"))
+
+
+class DictionarySnapshot:
+    """Copia inmutable de las tablas spellcheck y towns lista para usarse en las correcciones."""
+
+    def __init__(self, custom_replacements: Dict[str, str], town_names: List[str]):
+        self.custom_replacements = custom_replacements
+        self.town_names = town_names
+        # Búsqueda exacta (literal y normalizada) de pueblos/ciudades, incluidos los de varias palabras
+        self.town_index = TownIndex(town_names)
+        # Índice de búsqueda aproximada de pueblos/ciudades, construido una vez por snapshot
+        self.town_matcher = FuzzyMatcher(town_names)
+        # Índice de borrados simétricos sobre las palabras originales de la tabla spellcheck
+        self.correction_index = CorrectionIndex(list(custom_replacements.keys()))
+        # Puntuación en bloque (rapidfuzz.cdist) sobre las mismas listas normalizadas
+        self.town_scorer = BulkScorer(self.town_matcher.processed_choices)
+        self.correction_scorer = BulkScorer(self.correction_index.processed_choices)
+        # La versión depende solo del contenido: un snapshot al que se le han aplicado
+        # cambios tiene la misma que el reconstruido desde cero con las tablas resultantes
+        self.content_hash = content_hash(custom_replacements, town_names)
+        self.version = format_version(self.content_hash)
+        self.loaded_at = time.time()
+        # Versión del último snapshot construido desde cero y cambios aplicados desde
+        # entonces con patched(), en orden (el pool de procesos se los reenvía a sus hijos)
+        self.base_version = self.version
+        self.patches: Tuple[List[Change], ...] = ()
+
+    def patched(self, changes: List[Change]) -> "DictionarySnapshot":
+        """Snapshot con los cambios aplicados, sin reconstruir los índices.
+
+        Este snapshot no se modifica: las peticiones en curso pueden seguir usándolo. El
+        nuevo comparte sus estructuras grandes y solo copia lo que cambia (ver los
+        métodos patched de los índices). Devuelve self si ningún cambio tiene efecto.
+        """
+        replacements: Optional[Dict[str, str]] = None
+        digest = self.content_hash
+        added_keys: Dict[str, None] = {}
+        removed_keys: Set[str] = set()
+        towns: Optional[Set[str]] = None
+        added_towns: Dict[str, None] = {}
+        removed_towns: Set[str] = set()
+        for change in changes:
+            if change.table == "spellcheck":
+                # Como en build_snapshot, las filas que solo se distinguen por mayúsculas
+                # comparten clave; cuál prevalece se decide en la siguiente lectura completa
+                key = change.row["original"].lower()
+                current = self.custom_replacements if replacements is None else replacements
+                if change.op == "upsert":
+                    if current.get(key) == change.row["suggestion"]:
+                        continue
+                    if replacements is None:
+                        replacements = current = dict(self.custom_replacements)
+                    if key not in current:
+                        added_keys[key] = None
+                    else:
+                        digest -= _entry_hash("spellcheck", key, current[key])
+                    current[key] = change.row["suggestion"]
+                    digest += _entry_hash("spellcheck", key, current[key])
+                elif key in current:
+                    if replacements is None:
+                        replacements = current = dict(self.custom_replacements)
+                    digest -= _entry_hash("spellcheck", key, current.pop(key))
+                    if added_keys.pop(key, False) is False:
+                        removed_keys.add(key)
+            elif change.table == "towns":
+                name = change.row["name"]
+                current = self.town_index.names if towns is None else towns
+                if (change.op == "upsert") == (name in current):
+                    continue
+                if towns is None:
+                    towns = current = set(self.town_index.names)
+                if change.op == "upsert":
+                    current.add(name)
+                    added_towns[name] = None
+                    digest += _entry_hash("towns", name)
+                else:
+                    current.discard(name)
+                    digest -= _entry_hash("towns", name)
+                    if added_towns.pop(name, False) is False:
+                        removed_towns.add(name)
+        if replacements is None and towns is None:
+            return self
+
+        snapshot = copy.copy(self)
+        if replacements is not None:
+            snapshot.custom_replacements = replacements
+        if added_towns or removed_towns:
+            # Los pueblos borrados y vueltos a añadir pasan al final, como al releer la tabla
+            snapshot.town_names = [name for name in self.town_names if name not in removed_towns]
+            snapshot.town_names.extend(added_towns)
+            snapshot.town_index = self.town_index.patched(snapshot.town_names, list(added_towns), removed_towns)
+            snapshot.town_matcher = self.town_matcher.patched(list(added_towns), removed_towns)
+            snapshot.town_scorer = BulkScorer(snapshot.town_matcher.processed_choices)
+        if added_keys or removed_keys:
+            snapshot.correction_index = self.correction_index.patched(list(added_keys), removed_keys)
+            snapshot.correction_scorer = BulkScorer(snapshot.correction_index.processed_choices)
+        snapshot.content_hash = digest % _CONTENT_HASH_MODULUS
+        snapshot.version = format_version(snapshot.content_hash)
+        snapshot.loaded_at = time.time()
+        snapshot.patches = self.patches + (changes,)
+        return snapshot
+
+
+# Suma de los hashes de cada fila, módulo 2^128: no depende del orden de las filas y se
+# actualiza en patched() restando las que cambian y sumando las nuevas
+_CONTENT_HASH_MODULUS = 1 << 128
+
+
+def _entry_hash(*fields: str) -> int:
+    digest = hashlib.blake2b("\x00".join(fields).encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest, "little")
+
+
+def content_hash(custom_replacements: Dict[str, str], town_names: List[str]) -> int:
+    """Hash del contenido de los diccionarios, independiente del orden de las filas."""
+    total = sum(_entry_hash("spellcheck", original, suggestion) for original, suggestion in custom_replacements.items())
+    total += sum(_entry_hash("towns", name) for name in set(town_names))
+    return total % _CONTENT_HASH_MODULUS
+
+
+def format_version(digest: int) -> str:
+    """Identificador corto (12 caracteres hexadecimales) de un hash de contenido."""
+    return f"{digest:032x}"[:12]
+
+
+def compute_version(custom_replacements: Dict[str, str], town_names: List[str]) -> str:
+    """Calcula un identificador estable a partir del contenido de los diccionarios."""
+    return format_version(content_hash(custom_replacements, town_names))
+
+
+def build_snapshot(correction_rows: List[dict], town_rows: List[dict]) -> DictionarySnapshot:
+    """Construye un snapshot a partir de las filas de las tablas spellcheck y towns."""
+    custom_replacements = {item["original"].lower(): item["suggestion"] for item in correction_rows}
+    town_names = [item["name"] for item in town_rows]
+    return DictionarySnapshot(custom_replacements, town_names)
+
+
+class StoreLoader:
+    """Lee los diccionarios de un almacén: enteros (al llamarlo) o solo los cambios (sync).
+
+    Si el almacén sabe calcular su versión y no ha cambiado desde la última lectura
+    completa, una llamada devuelve el snapshot anterior sin leer las tablas ni
+    reconstruir los índices. sync() aplica al último snapshot los cambios registrados
+    desde entonces; la siguiente lectura completa vuelve a construir los índices desde
+    cero y descarta lo que se fue acumulando.
+    """
+
+    def __init__(self, store: DictionaryStore, max_changes: int = DICTIONARY_SYNC_MAX_CHANGES):
+        self.store = store
+        self.max_changes = max_changes
+        self._version: Optional[str] = None
+        self._cursor = None
+        self._snapshot: Optional[DictionarySnapshot] = None
+        # Hay más cambios pendientes de los que conviene aplicar uno a uno
+        self._overflow = False
+
+    def __call__(self) -> DictionarySnapshot:
+        version = self.store.version()
+        if version is not None and self._snapshot is not None and self._version == version:
+            return self._snapshot
+        cursor = self.store.cursor()
+        snapshot = build_snapshot(self.store.corrections(), self.store.towns())
+        logger.info(f"Cargadas {len(snapshot.custom_replacements)} correcciones personalizadas de {self.store.name}")
+        logger.info(f"Cargados {len(snapshot.town_names)} nombres de pueblos/ciudades desde {self.store.name}")
+        self._version, self._cursor, self._snapshot = version, cursor, snapshot
+        self._overflow = False
+        return snapshot
+
+    def sync(self) -> Optional[DictionarySnapshot]:
+        """Snapshot con los cambios posteriores a la última lectura, o None si no se puede.
+
+        Devuelve None si todavía no se ha leído nada, si el almacén no tiene registro de
+        cambios o si hay más de max_changes pendientes (se aplican en la próxima lectura
+        completa).
+        """
+        if self._snapshot is None or self._cursor is None or self._overflow:
+            return None
+        result = self.store.changes(self._cursor)
+        if result is None:
+            return None
+        changes, cursor = result
+        if len(changes) > self.max_changes:
+            logger.warning(
+                f"{len(changes)} cambios pendientes en {self.store.name}; se aplicarán en la próxima recarga completa"
+            )
+            self._overflow = True
+            return None
+        snapshot = self._snapshot.patched(changes) if changes else self._snapshot
+        if snapshot is not self._snapshot:
+            logger.info(f"Aplicados {len(changes)} cambios de {self.store.name} a los diccionarios")
+        self._cursor, self._snapshot = cursor, snapshot
+        return snapshot
+
+
+def store_loader(store: DictionaryStore) -> StoreLoader:
+    """Devuelve un StoreLoader que lee ambas tablas del almacén y construye el snapshot."""
+    return StoreLoader(store)
+
+
+def supabase_loader(client) -> StoreLoader:
+    """Devuelve una función que carga ambas tablas desde Supabase y construye el snapshot."""
+    return store_loader(SupabaseStore(client))
+
+
+class DictionaryCache:
+    """Mantiene en memoria el snapshot de diccionarios compartido por todas las peticiones.
+
+    El snapshot se sustituye de forma atómica: las peticiones en curso siguen usando
+    la referencia que obtuvieron con get() aunque se produzca una recarga.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], DictionarySnapshot],
+        ttl: float = DICTIONARY_TTL_SECONDS,
+        snapshot_path: str = DICTIONARY_SNAPSHOT_PATH,
+        sync_interval: float = DICTIONARY_SYNC_SECONDS,
+    ):
+        self._loader = loader
+        # Solo los StoreLoader saben leer únicamente los cambios
+        self._sync: Optional[Callable[[], Optional[DictionarySnapshot]]] = getattr(loader, "sync", None)
+        self.ttl = ttl
+        self.sync_interval = sync_interval if self._sync is not None else 0
+        self.snapshot_path = snapshot_path
+        self.loaded_from_file = False
+        self._snapshot: Optional[DictionarySnapshot] = None
+        self._reload_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.unchanged_refreshes = 0
+        self.refresh_failures = 0
+        self.syncs = 0
+        self.synced_versions = 0
+        self.sync_failures = 0
+        self.last_refresh_at: Optional[float] = None
+        self.last_sync_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # Con serve.py el snapshot lo carga el proceso padre: generación de este worker y
+        # función que le pide una recarga
+        self.generation: Optional[int] = None
+        self._request_reload: Optional[Callable[[], None]] = None
+
+    def get(self) -> DictionarySnapshot:
+        """Devuelve el snapshot actual, cargándolo si todavía no existe."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            with self._stats_lock:
+                self.hits += 1
+            return snapshot
+        with self._stats_lock:
+            self.misses += 1
+        return self.reload()
+
+    def reload(self) -> DictionarySnapshot:
+        """Vuelve a leer los diccionarios y sustituye el snapshot si el contenido ha cambiado."""
+        if self._request_reload is not None and self._snapshot is not None:
+            # El proceso padre recarga y sustituye a los workers con la versión nueva
+            self._request_reload()
+            return self._snapshot
+        with self._reload_lock:
+            try:
+                snapshot = self._loader()
+            except Exception as e:
+                with self._stats_lock:
+                    self.refresh_failures += 1
+                    self.last_error = str(e)
+                raise
+            with self._stats_lock:
+                self.refreshes += 1
+                self.last_refresh_at = time.time()
+                self.last_error = None
+                current = self._snapshot
+                if current is not None and current.version == snapshot.version:
+                    self.unchanged_refreshes += 1
+                    return current
+                self._snapshot = snapshot
+            logger.info(f"Diccionarios actualizados a la versión {snapshot.version}")
+            if self.snapshot_path and DICTIONARY_SNAPSHOT_WRITE:
+                try:
+                    save_snapshot(snapshot, self.snapshot_path)
+                except OSError as e:
+                    logger.error(f"Error al guardar el snapshot de diccionarios: {str(e)}")
+            return snapshot
+
+    def sync(self) -> Optional[DictionarySnapshot]:
+        """Aplica al snapshot los cambios de las tablas sin volver a leerlas enteras.
+
+        Devuelve el snapshot resultante (el mismo si no hubo cambios) o None si el
+        almacén no tiene registro de cambios o hace falta una recarga completa.
+        """
+        if self._sync is None:
+            return None
+        with self._reload_lock:
+            try:
+                snapshot = self._sync()
+            except Exception as e:
+                with self._stats_lock:
+                    self.sync_failures += 1
+                    self.last_error = str(e)
+                raise
+            if snapshot is None:
+                return None
+            with self._stats_lock:
+                self.syncs += 1
+                self.last_sync_at = time.time()
+                current = self._snapshot
+                if current is not None and current.version == snapshot.version:
+                    return current
+                self._snapshot = snapshot
+                self.synced_versions += 1
+            logger.info(f"Diccionarios sincronizados a la versión {snapshot.version}")
+            return snapshot
+
+    def load_file(self) -> bool:
+        """Usa el snapshot compilado si existe, es válido y no es demasiado antiguo."""
+        if not self.snapshot_path:
+            return False
+        try:
+            snapshot, compiled_at = load_snapshot(self.snapshot_path)
+        except SnapshotFileError as e:
+            logger.warning(f"No se usa el snapshot de diccionarios {self.snapshot_path}: {str(e)}")
+            return False
+        age = time.time() - compiled_at
+        if DICTIONARY_SNAPSHOT_MAX_AGE_SECONDS > 0 and age > DICTIONARY_SNAPSHOT_MAX_AGE_SECONDS:
+            logger.warning(f"El snapshot de diccionarios tiene {age:.0f} s; se leerá Supabase")
+            return False
+        with self._stats_lock:
+            self._snapshot = snapshot
+            self.last_refresh_at = compiled_at
+            self.loaded_from_file = True
+        logger.info(f"Diccionarios cargados del snapshot {self.snapshot_path} (versión {snapshot.version})")
+        return True
+
+    def load_initial(self) -> bool:
+        """Carga el primer snapshot: el compilado si es válido y, si no, el del almacén.
+
+        Devuelve True si se usó el fichero compilado (conviene recargar enseguida).
+        """
+        from_file = self.load_file()
+        if not from_file:
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Error al cargar los diccionarios: {str(e)}")
+        return from_file
+
+    def manage_externally(self, generation: int, request_reload: Callable[[], None]):
+        """Las recargas completas las hace otro proceso; start() solo sincroniza los cambios."""
+        self.generation = generation
+        self._request_reload = request_reload
+
+    def start(self):
+        """Carga los diccionarios y arranca la recarga periódica en segundo plano.
+
+        Si hay un snapshot compilado válido se arranca con él sin consultar Supabase y
+        la primera recarga se hace enseguida en segundo plano. Entre recargas, los
+        cambios se aplican cada sync_interval segundos.
+        """
+        from_file = self._request_reload is None and self.load_initial()
+        if (self.ttl > 0 or self.sync_interval > 0 or from_file) and self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._refresh_loop, args=(from_file,), name="dictionary-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Detiene la recarga en segundo plano."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _refresh_loop(self, refresh_now: bool = False):
+        if refresh_now:
+            self._refresh()
+        # Con serve.py, las recargas completas las hace el proceso padre
+        ttl = self.ttl if self._request_reload is None else 0
+        intervals = [interval for interval in (ttl, self.sync_interval) if interval > 0]
+        if not intervals:
+            return
+        next_reload = time.monotonic() + ttl
+        while not self._stop_event.wait(min(intervals)):
+            if ttl > 0 and time.monotonic() >= next_reload:
+                self._refresh()
+                next_reload = time.monotonic() + ttl
+            elif self.sync_interval > 0:
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.error(f"Error al sincronizar los diccionarios: {str(e)}")
+
+    def _refresh(self):
+        try:
+            self.reload()
+        except Exception as e:
+            logger.error(f"Error al recargar los diccionarios: {str(e)}")
+
+    def stats(self) -> dict:
+        """Métricas de uso y antigüedad del snapshot."""
+        with self._stats_lock:
+            snapshot = self._snapshot
+            now = time.time()
+            staleness = now - self.last_refresh_at if self.last_refresh_at else None
+            return {
+                "version": snapshot.version if snapshot else None,
+                "corrections": len(snapshot.custom_replacements) if snapshot else 0,
+                "towns": len(snapshot.town_names) if snapshot else 0,
+                "loaded_at": snapshot.loaded_at if snapshot else None,
+                "last_refresh_at": self.last_refresh_at,
+                "staleness_seconds": staleness,
+                "stale": staleness is None or (self.ttl > 0 and staleness > 2 * self.ttl),
+                "ttl_seconds": self.ttl,
+                "sync_interval_seconds": self.sync_interval,
+                "last_sync_at": self.last_sync_at,
+                "loaded_from_file": self.loaded_from_file,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "unchanged_refreshes": self.unchanged_refreshes,
+                "refresh_failures": self.refresh_failures,
+                "syncs": self.syncs,
+                "synced_versions": self.synced_versions,
+                "sync_failures": self.sync_failures,
+                "last_error": self.last_error,
+            }
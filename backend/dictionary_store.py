@@ -0,0 +1,331 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import metrics
+
+# Almacén del que se leen las tablas spellcheck y towns: "supabase", "sqlite" o "memory"
+DICTIONARY_STORE = os.getenv("DICTIONARY_STORE", "supabase").lower()
+# Fichero de la base de datos SQLite local (DICTIONARY_STORE=sqlite)
+DICTIONARY_SQLITE_PATH = os.getenv("DICTIONARY_SQLITE_PATH", "dictionaries.sqlite3")
+# Columna con la fecha de modificación de cada fila en Supabase; con ella se leen solo los
+# cambios en lugar de las tablas enteras ("" lo desactiva)
+DICTIONARY_UPDATED_AT_COLUMN = os.getenv("DICTIONARY_UPDATED_AT_COLUMN", "")
+
+# Columnas de cada tabla; la primera es la clave usada en on_conflict
+TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "spellcheck": ("original", "suggestion"),
+    "towns": ("name",),
+}
+
+
+class Change(NamedTuple):
+    """Cambio en una tabla de diccionarios."""
+    table: str
+    # "upsert" o "delete"
+    op: str
+    # Fila completa en los upserts; solo la clave en los borrados
+    row: dict
+
+
+class DictionaryStore:
+    """Origen de las tablas spellcheck y towns.
+
+    corrections() y towns() devuelven las filas completas, en un orden estable.
+    version() es un identificador barato del contenido (None si el almacén no puede
+    calcularlo sin leer las tablas); si no cambia, no hace falta volver a leerlas.
+    cursor() es la posición actual en el registro de cambios, que se toma antes de leer
+    las tablas. changes(cursor) devuelve los cambios posteriores al cursor y el cursor
+    nuevo, o None si el almacén no tiene registro de cambios y hay que leer las tablas
+    enteras. Un cambio puede repetirse (por ejemplo, si se produjo durante la lectura):
+    aplicarlo otra vez no tiene efecto.
+    """
+
+    name = ""
+
+    def corrections(self) -> List[dict]:
+        raise NotImplementedError
+
+    def towns(self) -> List[dict]:
+        raise NotImplementedError
+
+    def version(self) -> Optional[str]:
+        return None
+
+    def cursor(self):
+        return None
+
+    def changes(self, cursor) -> Optional[Tuple[List[Change], object]]:
+        return None
+
+    def upsert(self, table: str, rows: List[dict]):
+        raise NotImplementedError
+
+    def delete(self, table: str, keys: List[str]):
+        raise NotImplementedError
+
+
+class SupabaseStore(DictionaryStore):
+    """Tablas en Supabase; todas las consultas se miden con metrics.supabase_query.
+
+    Con updated_at_column, los cambios se leen por marca de agua: las filas con fecha de
+    modificación posterior a la última vista. Así no se ven los borrados, que solo se
+    aplican en la siguiente lectura completa de las tablas.
+    """
+
+    name = "supabase"
+
+    def __init__(self, client=None, updated_at_column: str = DICTIONARY_UPDATED_AT_COLUMN):
+        self._client = client
+        self.updated_at_column = updated_at_column
+
+    @property
+    def client(self):
+        """Cliente indicado al crear el almacén o, si no, el compartido del proceso.
+
+        El compartido se pide en cada consulta y no se guarda: tras un fork (workers de
+        serve.py) el hijo usa su propio cliente en lugar de las conexiones del padre.
+        """
+        if self._client is not None:
+            return self._client
+        from supabase_client import get_client
+
+        return get_client()
+
+    def corrections(self) -> List[dict]:
+        with metrics.supabase_query("spellcheck"):
+            return self.client.table("spellcheck").select("original, suggestion").execute().data
+
+    def towns(self) -> List[dict]:
+        with metrics.supabase_query("towns"):
+            return self.client.table("towns").select("name").execute().data
+
+    def cursor(self):
+        """Última fecha de modificación de cada tabla.
+
+        Las filas sin fecha se excluyen: con el orden descendente PostgREST las pone
+        primero, y postgrest-py no envía nullslast aunque se pida nullsfirst=False.
+        """
+        if not self.updated_at_column:
+            return None
+        column = self.updated_at_column
+        cursor = {}
+        for table in TABLE_COLUMNS:
+            query = self.client.table(table).select(column).not_.is_(column, "null")
+            with metrics.supabase_query(table):
+                rows = query.order(column, desc=True, nullsfirst=False).limit(1).execute().data
+            cursor[table] = rows[0][column] if rows else None
+        return cursor
+
+    def changes(self, cursor) -> Optional[Tuple[List[Change], object]]:
+        if not self.updated_at_column or cursor is None:
+            return None
+        column = self.updated_at_column
+        changes: List[Change] = []
+        next_cursor = dict(cursor)
+        for table, columns in TABLE_COLUMNS.items():
+            # Una fila sin fecha no puede ordenarse frente al cursor: llega con la recarga completa
+            query = self.client.table(table).select(", ".join(columns + (column,))).not_.is_(column, "null")
+            if cursor.get(table) is not None:
+                # gte y no gt: una fila escrita después de leer el cursor puede tener su misma
+                # fecha. Las filas del límite se devuelven en cada consulta, sin efecto
+                query = query.gte(column, cursor[table])
+            with metrics.supabase_query(table):
+                rows = query.order(column).execute().data
+            changes.extend(Change(table, "upsert", {c: row[c] for c in columns}) for row in rows)
+            if rows:
+                next_cursor[table] = rows[-1][column]
+        return changes, next_cursor
+
+    def upsert(self, table: str, rows: List[dict]):
+        from postgrest.types import ReturnMethod
+
+        key = TABLE_COLUMNS[table][0]
+        with metrics.supabase_query(table):
+            self.client.table(table).upsert(rows, on_conflict=key, returning=ReturnMethod.minimal).execute()
+
+    def delete(self, table: str, keys: List[str]):
+        key = TABLE_COLUMNS[table][0]
+        with metrics.supabase_query(table):
+            self.client.table(table).delete().in_(key, list(keys)).execute()
+
+
+class MemoryStore(DictionaryStore):
+    """Tablas en memoria con la misma semántica de upsert, para pruebas y benchmarks."""
+
+    name = "memory"
+
+    def __init__(self, tables: Optional[Dict[str, Iterable[dict]]] = None):
+        self._tables: Dict[str, "OrderedDict[str, dict]"] = {table: OrderedDict() for table in TABLE_COLUMNS}
+        self._log: List[Change] = []
+        self._lock = threading.Lock()
+        for table, rows in (tables or {}).items():
+            self.upsert(table, list(rows))
+
+    def corrections(self) -> List[dict]:
+        return self.rows("spellcheck")
+
+    def towns(self) -> List[dict]:
+        return self.rows("towns")
+
+    def rows(self, table: str) -> List[dict]:
+        with self._lock:
+            return [dict(row) for row in self._tables[table].values()]
+
+    def version(self) -> Optional[str]:
+        return str(len(self._log))
+
+    def cursor(self):
+        return len(self._log)
+
+    def changes(self, cursor) -> Optional[Tuple[List[Change], object]]:
+        with self._lock:
+            start = int(cursor or 0)
+            return self._log[start:], len(self._log)
+
+    def upsert(self, table: str, rows: List[dict]):
+        key = TABLE_COLUMNS[table][0]
+        with self._lock:
+            stored = self._tables[table]
+            for row in rows:
+                row = {column: row[column] for column in TABLE_COLUMNS[table]}
+                if stored.get(row[key]) != row:
+                    stored[row[key]] = row
+                    self._log.append(Change(table, "upsert", row))
+
+    def delete(self, table: str, keys: List[str]):
+        key = TABLE_COLUMNS[table][0]
+        with self._lock:
+            stored = self._tables[table]
+            for value in keys:
+                if stored.pop(value, None) is not None:
+                    self._log.append(Change(table, "delete", {key: value}))
+
+
+# Cada tabla tiene clave primaria y los triggers registran en changes cualquier modificación,
+# también las hechas desde fuera de la aplicación (sqlite3, scripts de importación)
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spellcheck (original TEXT PRIMARY KEY, suggestion TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS towns (name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    op TEXT NOT NULL,
+    row TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS spellcheck_insert AFTER INSERT ON spellcheck BEGIN
+    INSERT INTO changes (tbl, op, row) VALUES
+        ('spellcheck', 'upsert', json_object('original', NEW.original, 'suggestion', NEW.suggestion));
+END;
+CREATE TRIGGER IF NOT EXISTS spellcheck_update AFTER UPDATE ON spellcheck
+WHEN OLD.original = NEW.original BEGIN
+    INSERT INTO changes (tbl, op, row) VALUES
+        ('spellcheck', 'upsert', json_object('original', NEW.original, 'suggestion', NEW.suggestion));
+END;
+CREATE TRIGGER IF NOT EXISTS spellcheck_rename AFTER UPDATE ON spellcheck
+WHEN OLD.original != NEW.original BEGIN
+    INSERT INTO changes (tbl, op, row) VALUES
+        ('spellcheck', 'delete', json_object('original', OLD.original)),
+        ('spellcheck', 'upsert', json_object('original', NEW.original, 'suggestion', NEW.suggestion));
+END;
+CREATE TRIGGER IF NOT EXISTS spellcheck_delete AFTER DELETE ON spellcheck BEGIN
+    INSERT INTO changes (tbl, op, row) VALUES ('spellcheck', 'delete', json_object('original', OLD.original));
+END;
+CREATE TRIGGER IF NOT EXISTS towns_insert AFTER INSERT ON towns BEGIN
+    INSERT INTO changes (tbl, op, row) VALUES ('towns', 'upsert', json_object('name', NEW.name));
+END;
+CREATE TRIGGER IF NOT EXISTS towns_delete AFTER DELETE ON towns BEGIN
+    INSERT INTO changes (tbl, op, row) VALUES ('towns', 'delete', json_object('name', OLD.name));
+END;
+"""
+
+
+class SQLiteStore(DictionaryStore):
+    """Tablas en un fichero SQLite local: lecturas por clave primaria y sin red.
+
+    Cada operación abre su propia conexión, así que el almacén se puede usar desde
+    varios hilos; el modo WAL permite leer mientras se importa.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = DICTIONARY_SQLITE_PATH):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SQLITE_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _select(self, sql: str, params: tuple = ()) -> List[tuple]:
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _write(self, sql: str, params: List[tuple]):
+        conn = self._connect()
+        try:
+            # Una transacción por llamada: un lote se aplica entero o no se aplica
+            with conn:
+                conn.executemany(sql, params)
+        finally:
+            conn.close()
+
+    def corrections(self) -> List[dict]:
+        rows = self._select("SELECT original, suggestion FROM spellcheck ORDER BY rowid")
+        return [{"original": original, "suggestion": suggestion} for original, suggestion in rows]
+
+    def towns(self) -> List[dict]:
+        return [{"name": name} for (name,) in self._select("SELECT name FROM towns ORDER BY rowid")]
+
+    def version(self) -> Optional[str]:
+        (seq,) = self._select("SELECT COALESCE(MAX(seq), 0) FROM changes")[0]
+        return str(seq)
+
+    def cursor(self):
+        return int(self.version())
+
+    def changes(self, cursor) -> Optional[Tuple[List[Change], object]]:
+        rows = self._select("SELECT seq, tbl, op, row FROM changes WHERE seq > ? ORDER BY seq", (int(cursor or 0),))
+        if not rows:
+            return [], int(cursor or 0)
+        return [Change(table, op, json.loads(row)) for _, table, op, row in rows], rows[-1][0]
+
+    def upsert(self, table: str, rows: List[dict]):
+        if table == "spellcheck":
+            sql = (
+                "INSERT INTO spellcheck (original, suggestion) VALUES (?, ?) "
+                "ON CONFLICT(original) DO UPDATE SET suggestion = excluded.suggestion "
+                "WHERE suggestion != excluded.suggestion"
+            )
+        elif table == "towns":
+            sql = "INSERT INTO towns (name) VALUES (?) ON CONFLICT(name) DO NOTHING"
+        else:
+            raise ValueError(f"Tabla desconocida: {table}")
+        columns = TABLE_COLUMNS[table]
+        self._write(sql, [tuple(row[column] for column in columns) for row in rows])
+
+    def delete(self, table: str, keys: List[str]):
+        # table y key salen de TABLE_COLUMNS, nunca de la entrada del usuario
+        key = TABLE_COLUMNS[table][0]
+        self._write(f"DELETE FROM {table} WHERE {key} = ?", [(value,) for value in keys])
+
+
+def create_store(kind: str = DICTIONARY_STORE) -> DictionaryStore:
+    """Almacén configurado en DICTIONARY_STORE; el de Supabase usa el cliente compartido."""
+    if kind == "supabase":
+        return SupabaseStore()
+    if kind == "sqlite":
+        return SQLiteStore()
+    if kind == "memory":
+        return MemoryStore()
+    raise ValueError(f"Almacén de diccionarios desconocido: {kind}")
@@ -0,0 +1,282 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+from dictionary import DictionarySnapshot
+from dictionary_store import Change
+from spellchecker import check_batch, check_text
+
+logger = logging.getLogger(__name__)
+
+# Correcciones que se ejecutan a la vez y peticiones que pueden esperar turno antes de rechazar con 503
+SPELLCHECK_MAX_CONCURRENCY = int(os.getenv("SPELLCHECK_MAX_CONCURRENCY", str(os.cpu_count() or 4)))
+SPELLCHECK_MAX_QUEUE = int(os.getenv("SPELLCHECK_MAX_QUEUE", "32"))
+# Segundos que una petición puede esperar turno antes de rechazarla
+SPELLCHECK_QUEUE_TIMEOUT = float(os.getenv("SPELLCHECK_QUEUE_TIMEOUT", "10"))
+
+# Hilos para las llamadas bloqueantes a Supabase
+IO_THREADS = int(os.getenv("IO_THREADS", "8"))
+
+# Hilos para bcrypt (hash y verificación de contraseñas) y peticiones que pueden esperar turno
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "5"))
+
+# Procesos para los textos grandes (0 desactiva el pool de procesos) y tamaño a partir del cual se usan
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0"))
+PROCESS_POOL_MIN_CHARS = int(os.getenv("PROCESS_POOL_MIN_CHARS", "200000"))
+# Cambios de las sincronizaciones que se reenvían a los procesos con cada trabajo; al
+# superarlos se crea un pool nuevo con el snapshot actual
+PROCESS_POOL_MAX_PATCH_CHANGES = int(os.getenv("PROCESS_POOL_MAX_PATCH_CHANGES", "1000"))
+
+
+class Overloaded(Exception):
+    """No hay capacidad para atender la petición en este momento."""
+
+
+class ConcurrencyLimiter:
+    """Limita las correcciones simultáneas y la cola de espera del event loop.
+
+    Cuando la cola está llena, o una petición espera más de queue_timeout segundos,
+    se lanza Overloaded en lugar de acumular trabajo sin límite.
+    """
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Se llama tras cada cambio de active, waiting o rejected (métricas)
+        self.on_change: Callable[[], None] = lambda: None
+
+    async def acquire(self):
+        # El semáforo se crea dentro del event loop que lo va a usar
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self.active + self.waiting >= self.limit + self.max_queue:
+            self.rejected += 1
+            self.on_change()
+            raise Overloaded("Cola de correcciones llena")
+        self.waiting += 1
+        self.on_change()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("Tiempo de espera agotado en la cola de correcciones")
+        finally:
+            self.waiting -= 1
+            self.on_change()
+        self.active += 1
+        self.on_change()
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+        self.on_change()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+
+# Snapshot del proceso hijo, construido una vez al arrancar cada proceso del pool
+_worker_snapshot: Optional[DictionarySnapshot] = None
+# Cambios de los recibidos con los trabajos que ya se han aplicado a _worker_snapshot
+_worker_patches = 0
+
+
+def _init_worker(custom_replacements, town_names):
+    global _worker_snapshot, _worker_patches
+    _worker_snapshot = DictionarySnapshot(custom_replacements, town_names)
+    _worker_patches = 0
+
+
+def _apply_patches(patches: Tuple[List[Change], ...]):
+    # Cada trabajo trae todos los cambios desde que se creó el pool; se aplican los nuevos
+    global _worker_snapshot, _worker_patches
+    for changes in patches[_worker_patches:]:
+        _worker_snapshot = _worker_snapshot.patched(changes)
+    _worker_patches = len(patches)
+
+
+def _worker_check_text(text: str, patches: Tuple[List[Change], ...] = ()) -> Tuple[dict, Dict[str, float]]:
+    _apply_patches(patches)
+    timings: Dict[str, float] = {}
+    return check_text(text, _worker_snapshot, timings=timings), timings
+
+
+def _worker_check_batch(texts: List[str], patches: Tuple[List[Change], ...] = ()) -> Tuple[List[dict], Dict[str, float]]:
+    _apply_patches(patches)
+    timings: Dict[str, float] = {}
+    return check_batch(texts, _worker_snapshot, timings), timings
+
+
+class SnapshotProcessPool:
+    """Pool de procesos cuyos hijos tienen una copia del snapshot de diccionarios.
+
+    El snapshot se envía una sola vez al arrancar cada proceso. Las sincronizaciones no
+    crean un pool nuevo: los cambios aplicados desde entonces viajan con cada trabajo y
+    los hijos aplican los que les faltan. Tras una recarga completa, o si se acumulan
+    más de PROCESS_POOL_MAX_PATCH_CHANGES cambios, se crea un pool nuevo y el anterior
+    termina los trabajos pendientes.
+    """
+
+    def __init__(self, workers: int, max_patch_changes: int = PROCESS_POOL_MAX_PATCH_CHANGES):
+        self.workers = workers
+        self.max_patch_changes = max_patch_changes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Snapshot completo del que parten los hijos y cambios que ya tenían al crearse
+        self._base_version: Optional[str] = None
+        self._first_patch = 0
+        # Momento de carga del snapshot más reciente enviado a los hijos
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def executor_for(
+        self, snapshot: DictionarySnapshot
+    ) -> Optional[Tuple[ProcessPoolExecutor, Tuple[List[Change], ...]]]:
+        """Pool para corregir con snapshot y cambios que deben aplicar antes sus procesos.
+
+        Devuelve None si los procesos ya tienen un snapshot posterior (la petición empezó
+        antes de una sincronización o una recarga); entonces se corrige en un hilo.
+        """
+        with self._lock:
+            if self._executor is not None:
+                if snapshot.loaded_at < self._loaded_at:
+                    return None
+                if snapshot.base_version == self._base_version:
+                    patches = snapshot.patches[self._first_patch:]
+                    if sum(len(changes) for changes in patches) <= self.max_patch_changes:
+                        self._loaded_at = snapshot.loaded_at
+                        return self._executor, patches
+                self._executor.shutdown(wait=False)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(snapshot.custom_replacements, snapshot.town_names),
+            )
+            self._base_version = snapshot.base_version
+            self._first_patch = len(snapshot.patches)
+            self._loaded_at = snapshot.loaded_at
+            logger.info(f"Pool de {self.workers} procesos creado para la versión {snapshot.version}")
+            return self._executor, ()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+correction_limiter = ConcurrencyLimiter(SPELLCHECK_MAX_CONCURRENCY, SPELLCHECK_MAX_QUEUE, SPELLCHECK_QUEUE_TIMEOUT)
+io_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+cpu_executor = ThreadPoolExecutor(max_workers=SPELLCHECK_MAX_CONCURRENCY, thread_name_prefix="spellcheck")
+# bcrypt tiene su propio pool y su propio límite para que un pico de logins no frene las correcciones
+password_limiter = ConcurrencyLimiter(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, PASSWORD_HASH_QUEUE_TIMEOUT)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+process_pool = SnapshotProcessPool(PROCESS_POOL_WORKERS)
+
+metrics.track_limiter("spellcheck", correction_limiter)
+metrics.track_limiter("password_hash", password_limiter)
+
+
+async def run_io(func, *args):
+    """Ejecuta una llamada bloqueante (Supabase) en el pool de hilos de E/S."""
+    # El contexto se copia para que las métricas de la petición en curso vean lo medido en el hilo
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(io_executor, context.run, func, *args)
+
+
+async def run_cpu(func, *args):
+    """Ejecuta trabajo de CPU en el pool de hilos de corrección."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, context.run, func, *args)
+
+
+async def run_password(func, *args):
+    """Ejecuta un hash o una verificación de bcrypt en su pool, respetando su límite de concurrencia."""
+    async with password_limiter.slot():
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+
+
+async def run_check_text(text: str, snapshot: DictionarySnapshot, timings: Optional[Dict[str, float]] = None) -> dict:
+    """Corrige un texto fuera del event loop; los textos grandes van al pool de procesos.
+
+    Si se pasa timings, recibe los tiempos por etapa igual que check_text.
+    """
+    loop = asyncio.get_running_loop()
+    large = process_pool.enabled and len(text) >= PROCESS_POOL_MIN_CHARS
+    target = process_pool.executor_for(snapshot) if large else None
+    if target is not None:
+        executor, patches = target
+        result, worker_timings = await loop.run_in_executor(executor, _worker_check_text, text, patches)
+        if timings is not None:
+            timings.update(worker_timings)
+        return result
+    return await loop.run_in_executor(cpu_executor, functools.partial(check_text, text, snapshot, timings=timings))
+
+
+async def run_check_batch(
+    texts: List[str],
+    snapshot: DictionarySnapshot,
+    timings: Optional[Dict[str, float]] = None,
+) -> List[dict]:
+    """Corrige un lote fuera del event loop; los lotes grandes van al pool de procesos."""
+    loop = asyncio.get_running_loop()
+    large = process_pool.enabled and sum(len(text) for text in texts) >= PROCESS_POOL_MIN_CHARS
+    target = process_pool.executor_for(snapshot) if large else None
+    if target is not None:
+        executor, patches = target
+        results, worker_timings = await loop.run_in_executor(executor, _worker_check_batch, texts, patches)
+        if timings is not None:
+            timings.update(worker_timings)
+        return results
+    return await loop.run_in_executor(cpu_executor, check_batch, texts, snapshot, timings)
+
+
+def shutdown():
+    """Detiene los pools al apagar la aplicación."""
+    process_pool.shutdown()
+    cpu_executor.shutdown(wait=False)
+    password_executor.shutdown(wait=False)
+    io_executor.shutdown(wait=False)
+
+
+def stats() -> dict:
+    return {
+        **correction_limiter.stats(),
+        "io_threads": IO_THREADS,
+        "process_pool_workers": PROCESS_POOL_WORKERS,
+        "process_pool_min_chars": PROCESS_POOL_MIN_CHARS,
+        "password_hashing": password_limiter.stats(),
+    }
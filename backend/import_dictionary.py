@@ -0,0 +1,174 @@
+"""Importa correcciones o pueblos/ciudades desde CSV o JSONL con upserts en bloque.
+
+Las filas se leen en streaming y se envían en lotes con upsert (on_conflict sobre
+la clave de cada tabla). Tras cada lote se guarda un checkpoint con las filas ya
+importadas, así que si la importación falla se puede relanzar y continúa donde se quedó.
+
+Uso (desde backend/):
+    python import_dictionary.py spellcheck correcciones.csv --batch-size 1000
+    python import_dictionary.py towns pueblos.jsonl
+    python import_dictionary.py towns pueblos.csv --backend sqlite
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from dictionary_store import DICTIONARY_STORE, TABLE_COLUMNS, create_store
+
+logger = logging.getLogger(__name__)
+
+# Filas por upsert y reintentos por lote antes de abandonar
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_RETRIES = int(os.getenv("IMPORT_RETRIES", "3"))
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    """Lee filas de un CSV con cabecera o de un fichero JSONL (un objeto por línea)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def clean_row(table: str, row: dict) -> Optional[dict]:
+    """Fila con solo las columnas de la tabla, o None si le falta alguna."""
+    cleaned = {}
+    for column in TABLE_COLUMNS[table]:
+        value = row.get(column)
+        if value is None or not str(value).strip():
+            return None
+        cleaned[column] = str(value).strip()
+    if table == "spellcheck":
+        # Las correcciones se buscan en minúsculas
+        cleaned["original"] = cleaned["original"].lower()
+    return cleaned
+
+
+def batches(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_checkpoint(path: str) -> int:
+    try:
+        with open(path) as f:
+            return int(json.load(f)["rows"])
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path: str, rows: int):
+    # Escritura atómica: un fallo a mitad nunca deja un checkpoint corrupto
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"rows": rows}, f)
+    os.replace(tmp_path, path)
+
+
+def import_rows(
+    store,
+    table: str,
+    rows: Iterable[dict],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    checkpoint: Optional[str] = None,
+    retries: int = IMPORT_RETRIES,
+) -> dict:
+    """Importa las filas en lotes y devuelve un resumen (filas leídas, importadas, descartadas y segundos).
+
+    Con checkpoint, se saltan las filas ya importadas en una ejecución anterior y el
+    fichero se borra al terminar. Un lote que falla se reintenta con espera creciente.
+    """
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"Tabla desconocida: {table}")
+    key = TABLE_COLUMNS[table][0]
+    done = read_checkpoint(checkpoint) if checkpoint else 0
+    if done:
+        logger.info(f"Reanudando {table} después de {done} filas")
+
+    started = time.perf_counter()
+    read = imported = skipped = 0
+    for batch in batches(rows, batch_size):
+        if read + len(batch) <= done:
+            read += len(batch)
+            continue
+        pending = batch[max(0, done - read):]
+        read += len(batch)
+
+        # Una clave repetida en el mismo upsert es un error en Postgres: gana la última
+        unique: Dict[str, dict] = {}
+        for row in pending:
+            cleaned = clean_row(table, row)
+            if cleaned is None:
+                skipped += 1
+            else:
+                unique[cleaned[key]] = cleaned
+        if unique:
+            _upsert_with_retries(store, table, list(unique.values()), retries)
+            imported += len(unique)
+        if checkpoint:
+            write_checkpoint(checkpoint, read)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"{table}: {read} filas leídas, {imported} importadas ({imported / max(elapsed, 1e-9):.0f} filas/s)")
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return {
+        "table": table,
+        "read": read,
+        "imported": imported,
+        "skipped": skipped,
+        "resumed_from": done,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _upsert_with_retries(store, table: str, rows: List[dict], retries: int):
+    for attempt in range(retries + 1):
+        try:
+            store.upsert(table, rows)
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait = 2 ** attempt
+            logger.warning(f"Error al importar un lote de {table} ({str(e)}); reintentando en {wait} s")
+            time.sleep(wait)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("table", choices=sorted(TABLE_COLUMNS))
+    parser.add_argument("path", help="Fichero .csv (con cabecera) o .jsonl")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--retries", type=int, default=IMPORT_RETRIES)
+    parser.add_argument("--checkpoint", help="Fichero de progreso (por defecto <path>.<table>.checkpoint)")
+    parser.add_argument("--backend", choices=["supabase", "sqlite", "memory"], default=DICTIONARY_STORE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = create_store(args.backend)
+    checkpoint = args.checkpoint or f"{args.path}.{args.table}.checkpoint"
+    summary = import_rows(store, args.table, read_rows(args.path), args.batch_size, checkpoint, args.retries)
+    logger.info(
+        f"Importación completada: {summary['imported']} filas en {summary['table']} "
+        f"({summary['skipped']} descartadas) en {summary['seconds']:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Aceptar sin búsqueda aproximada las palabras del diccionario de inglés (corpus words de NLTK)
+ENGLISH_LEXICON_ENABLED = os.getenv("ENGLISH_LEXICON_ENABLED", "false").lower() == "true"
+# Descargar el corpus si no está instalado (si no, el diccionario queda vacío y se registra el error)
+ENGLISH_LEXICON_DOWNLOAD = os.getenv("ENGLISH_LEXICON_DOWNLOAD", "false").lower() == "true"
+# Lista de palabras ordenada por frecuencia (una por línea, p. ej. "palabra" o "palabra 12345")
+# que se usa en lugar del corpus de NLTK
+ENGLISH_LEXICON_PATH = os.getenv("ENGLISH_LEXICON_PATH", "")
+# Palabras más frecuentes que se leen de esa lista (0 para leerla entera)
+ENGLISH_LEXICON_SIZE = int(os.getenv("ENGLISH_LEXICON_SIZE", "0"))
+
+
+def nltk_words(download: bool = ENGLISH_LEXICON_DOWNLOAD) -> Iterable[str]:
+    """Palabras del corpus words de NLTK; solo se importa NLTK al cargar el diccionario."""
+    import nltk
+
+    try:
+        nltk.data.find("corpora/words")
+    except LookupError:
+        if not download:
+            raise
+        logger.info("Descargando recursos de NLTK...")
+        nltk.download("words", quiet=True)
+    from nltk.corpus import words
+
+    return words.words()
+
+
+def file_words(path: str, limit: int = 0) -> Iterable[str]:
+    """Primera columna de las primeras limit líneas (todas con 0) de una lista de palabras."""
+    with open(path, encoding="utf-8") as f:
+        for count, line in enumerate(f):
+            if limit and count >= limit:
+                break
+            fields = line.split()
+            if fields and not fields[0].startswith("#"):
+                yield fields[0]
+
+
+def configured_words() -> Iterable[str]:
+    """Palabras de ENGLISH_LEXICON_PATH si está configurada; si no, el corpus words de NLTK."""
+    if ENGLISH_LEXICON_PATH:
+        return file_words(ENGLISH_LEXICON_PATH, ENGLISH_LEXICON_SIZE)
+    return nltk_words()
+
+
+class EnglishLexicon:
+    """Diccionario de inglés de solo lectura que se carga la primera vez que se consulta.
+
+    Las palabras se guardan en minúsculas, ordenadas y sin repetir en un único array de
+    numpy de ancho fijo (unos pocos MB frente a las decenas de un set de str), y se buscan
+    con búsqueda binaria. Si la carga falla el diccionario queda vacío: nunca impide corregir.
+    """
+
+    def __init__(self, source=configured_words, enabled: bool = ENGLISH_LEXICON_ENABLED):
+        self._source = source
+        # Si está desactivado, la etapa "lexicon" de la corrección no lo consulta ni lo carga
+        self.enabled = enabled
+        self._words: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.load_seconds = 0.0
+        self.error: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._words is not None
+
+    def load(self) -> np.ndarray:
+        words = self._words
+        if words is not None:
+            return words
+        with self._lock:
+            if self._words is None:
+                started = time.perf_counter()
+                try:
+                    encoded = {word.lower().encode("utf-8") for word in self._source()}
+                    words = np.array(sorted(encoded), dtype=bytes) if encoded else np.array([], dtype="S1")
+                    logger.info(f"Diccionario de inglés cargado con {len(words)} palabras")
+                except Exception as e:
+                    logger.error(f"Error al cargar el diccionario de inglés: {str(e)}")
+                    self.error = str(e)
+                    words = np.array([], dtype="S1")
+                self.load_seconds = time.perf_counter() - started
+                self._words = words
+            return self._words
+
+    def __contains__(self, word: str) -> bool:
+        words = self.load()
+        key = word.lower().encode("utf-8")
+        # numpy recortaría una clave más larga que el ancho del array
+        if not len(words) or len(key) > words.dtype.itemsize:
+            return False
+        i = int(np.searchsorted(words, key))
+        return i < len(words) and words[i] == key
+
+    def __len__(self):
+        return len(self.load())
+
+    def stats(self) -> dict:
+        words = self._words
+        return {
+            "enabled": self.enabled,
+            "source": ENGLISH_LEXICON_PATH or "nltk",
+            "loaded": words is not None,
+            "words": 0 if words is None else len(words),
+            "bytes": 0 if words is None else words.nbytes,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+# Diccionario compartido por todas las peticiones del proceso
+english_lexicon = EnglishLexicon()
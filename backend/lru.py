@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Caché LRU protegida por un lock, con caducidad opcional.
+
+    maxsize limita la suma de weight(valor) de las entradas (por defecto cada entrada
+    pesa 1, así que es el número de entradas); al superarlo se descartan las usadas hace
+    más tiempo. Con ttl, una entrada deja de devolverse ttl segundos después de guardarla.
+    Con maxsize o ttl a 0 la caché no guarda nada.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, weight: Optional[Callable[[V], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._weight = weight
+        # clave -> (valor, instante de caducidad, peso)
+        self._entries: "OrderedDict[K, Tuple[V, float, int]]" = OrderedDict()
+        self._total_weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and (self.ttl is None or self.ttl > 0)
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: K, value: V):
+        weight = self._weight(value) if self._weight is not None else 1
+        # Una entrada que no cabe entera no se guarda (vaciaría la caché)
+        if not self.enabled or weight > self.maxsize:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, weight)
+            self._total_weight += weight
+            while self._total_weight > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def pop(self, key: K):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: K):
+        _, _, weight = self._entries.pop(key)
+        self._total_weight -= weight
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_weight = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,92 +1,39 @@
 import os
-import re
-import nltk
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
+import codecs
+import json
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from typing import List, Dict, Set
-from supabase import create_client, Client
 from dotenv import load_dotenv
 import pathlib
 import logging
 from auth import router as auth_router, User, get_current_user
+from dictionary import DictionaryCache, store_loader
+from dictionary_store import create_store
+from lexicon import english_lexicon
+from response_cache import etag_matches, response_cache, response_etag
+from spellchecker import StreamingCheck, block_cache, check_blocks, word_cache
+import executors
+import metrics
+from executors import Overloaded, correction_limiter, run_check_batch, run_check_text, run_cpu, run_io
 from typing import Optional
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Descargar recursos de NLTK si no están disponibles
-try:
-    nltk.data.find('corpora/words')
-except LookupError:
-    logger.info("Descargando recursos de NLTK...")
-    nltk.download('words')
-
-# Cargar diccionario de palabras en inglés
-try:
-    from nltk.corpus import words
-    ENGLISH_WORDS = set(words.words())
-    logger.info(f"Diccionario de inglés cargado con {len(ENGLISH_WORDS)} palabras")
-except Exception as e:
-    logger.error(f"Error al cargar el diccionario de inglés: {str(e)}")
-    ENGLISH_WORDS = set()
-def similarity_ratio(s1, s2):
-    """Calcula una ratio de similitud simple entre dos cadenas."""
-    s1, s2 = s1.lower(), s2.lower()
-    
-    # Si las cadenas son iguales, la similitud es 1.0
-    if s1 == s2:
-        return 1.0
-    
-    # Si una cadena está contenida en la otra, hay alta similitud
-    if s1 in s2 or s2 in s1:
-        return 0.9
-    
-    # Contar caracteres comunes
-    common = sum(min(s1.count(c), s2.count(c)) for c in set(s1 + s2))
-    total = len(s1) + len(s2)
-    
-    # Devolver ratio de similitud
-    return 2 * common / total if total > 0 else 0.0
-
-# Función mejorada de similitud usando FuzzyWuzzy
-def get_similarity(s1, s2):
-    """Calcula una ratio de similitud entre dos cadenas usando FuzzyWuzzy."""
-    # Convertir a minúsculas para comparación insensible a mayúsculas/minúsculas
-    s1, s2 = s1.lower(), s2.lower()
-    
-    # Si las cadenas son iguales, la similitud es 1.0
-    if s1 == s2:
-        return 1.0
-    
-    # Calcular diferentes tipos de ratios
-    simple_ratio = fuzz.ratio(s1, s2) / 100.0
-    partial_ratio = fuzz.partial_ratio(s1, s2) / 100.0
-    token_sort_ratio = fuzz.token_sort_ratio(s1, s2) / 100.0
-    token_set_ratio = fuzz.token_set_ratio(s1, s2) / 100.0
-    
-    # Para palabras cortas, dar más peso al ratio simple
-    if len(s1) <= 4 or len(s2) <= 4:
-        return max(simple_ratio * 1.1, partial_ratio, token_sort_ratio, token_set_ratio)
-    
-    # Para palabras más largas, usar el máximo de todos los ratios
-    return max(simple_ratio, partial_ratio, token_sort_ratio, token_set_ratio)
-
 # Cargar variables desde .env
 load_dotenv()
 
-# Configura tus claves
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Caché compartida de los diccionarios (tablas spellcheck y towns), leídos del almacén de
+# DICTIONARY_STORE: Supabase (con el cliente compartido de supabase_client), SQLite o memoria
+dictionary_store = create_store()
+dictionary_cache = DictionaryCache(store_loader(dictionary_store))
 
-# Inicializar el cliente de Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 class SpellCheckRequest(BaseModel):
     text: str
 
@@ -95,6 +42,9 @@ class Suggestion(BaseModel):
     suggestion: str
     similarity: float
     correction_type: str = "normal"  # Puede ser "normal" o "town"
+    # Posición [start, end) en caracteres de la palabra corregida dentro del texto enviado
+    start: Optional[int] = None
+    end: Optional[int] = None
 
 class SpellCheckResponse(BaseModel):
     suggestions: List[Suggestion]
@@ -102,6 +52,24 @@ class SpellCheckResponse(BaseModel):
     full_corrected_code: str  # Campo añadido para devolver el código corregido
     town_matches: List[Suggestion] = []  # Campo para sugerencias de pueblos/ciudades
 
+class IncrementalSpellCheckResponse(SpellCheckResponse):
+    blocks: int  # Bloques (párrafos) en los que se ha dividido el texto
+    rechecked_blocks: int  # Bloques que no estaban en la caché y se han corregido
+
+class BatchDocument(BaseModel):
+    id: str
+    text: str
+
+class BatchSpellCheckRequest(BaseModel):
+    documents: List[BatchDocument]
+
+class BatchSpellCheckResult(BaseModel):
+    id: str
+    result: SpellCheckResponse
+
+class BatchSpellCheckResponse(BaseModel):
+    results: List[BatchSpellCheckResult]
+
 # Inicializar FastAPI
 app = FastAPI(
     title="ProofMaster API",
@@ -109,6 +77,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Número máximo de documentos aceptados por /spellcheck/batch
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "1000"))
+
 # Feature flag para autenticación
 AUTH_ENABLED = os.getenv("AUTH_ENABLED", "false").lower() == "true"
 
@@ -126,12 +97,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"]
+    # ETag se nombra aparte: con credenciales, los navegadores no aceptan el comodín
+    expose_headers=["*", "ETag"]
 )
 
+# Cabecera Server-Timing con los tiempos por etapa de cada petición
+if metrics.SERVER_TIMING_ENABLED:
+    app.add_middleware(metrics.ServerTimingMiddleware)
+
 # Configurar directorio para archivos estáticos
 @app.on_event("startup")
 async def startup_event():
+    # Cargar los diccionarios una sola vez y mantenerlos actualizados en segundo plano
+    await run_io(dictionary_cache.start)
+    # El diccionario de inglés solo se carga si se usa; así no se paga en cada arranque
+    if english_lexicon.enabled:
+        await run_io(english_lexicon.load)
+
     # Crear directorio para archivos estáticos si no existe
     static_dir = pathlib.Path("static")
     static_dir.mkdir(exist_ok=True)
@@ -201,6 +183,20 @@ async def startup_event():
             </html>
             """)
 
+@app.on_event("shutdown")
+def shutdown_event():
+    dictionary_cache.stop()
+    executors.shutdown()
+
+# Rechazar con 503 cuando no hay capacidad en lugar de acumular peticiones
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Servidor ocupado: {str(exc)}"},
+        headers={"Retry-After": "1"},
+    )
+
 # Montar archivos estáticos
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -287,194 +283,167 @@ def conditional_auth(current_user: User = Depends(get_current_user)):
         return current_user
     return None
 
-# Endpoint principal
-@app.post("/spellcheck", response_model=SpellCheckResponse)
-async def spellcheck(
-    request: SpellCheckRequest,
-    user: Optional[User] = Depends(conditional_auth)
-):
-    text = request.text
-    suggestions = []
-
+# Obtener el snapshot de diccionarios sin bloquear el event loop (solo consulta Supabase si aún no está cargado)
+async def load_snapshot():
     try:
-        # Conectar y obtener datos de la tabla spellcheck (correcciones personalizadas)
-        response = supabase.table("spellcheck").select("original, suggestion").execute()
-        custom_replacements = {item["original"].lower(): item["suggestion"] for item in response.data}
-        logger.info(f"Cargadas {len(custom_replacements)} correcciones personalizadas de Supabase")
-        
-        # Cargar nombres de pueblos/ciudades desde la tabla towns
-        towns_response = supabase.table("towns").select("name").execute()
-        town_names = [item["name"] for item in towns_response.data]
-        logger.info(f"Cargados {len(town_names)} nombres de pueblos/ciudades desde Supabase")
+        return await run_io(dictionary_cache.get)
     except Exception as e:
         logger.error(f"Error al conectar con Supabase: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error al conectar con Supabase: {str(e)}")
-    
-    # Lista de palabras de jerga o abreviaturas que no deben corregirse
-    slang_words = ["btw", "asap", "lol", "omg", "idk", "gonna", "wanna", "gotta"]
-    
-    # Diccionario de correcciones comunes para errores frecuentes
-    # Solo lo usaremos como respaldo si FuzzyWuzzy no encuentra una buena corrección
-    common_errors = {
-        "wasnt": "wasn't",
-        "becuase": "because",
-        "alot": "a lot",
-        "problm": "problem",
-        "im": "I'm",
-        "speling": "spelling",
-        "grammer": "grammar",
-        "amazng": "amazing",
-        "definately": "definitely",
-        "idntify": "identify",
-        "misstakes": "mistakes",
-        "projct": "project",
-        "documntation": "documentation",
-        "erors": "errors",
-        "versiun": "version",
-        "thnak": "thank",
-        "usefull": "useful",
-    }
 
-    # Extraer palabras y signos de puntuación del texto
-    words = re.findall(r"\b[A-Za-z]+(?:'[A-Za-z]+)?\b|[^\s\w]", text)
-    logger.info(f"Texto a analizar tiene {len(words)} palabras/tokens")
-    corrected_words = []
-    full_corrected_code = []  # Lista para almacenar las palabras corregidas y el código
-
-    for word in words:
-        original_word = word  # Guardar la palabra original para mostrarla en las sugerencias
-        
-        # Si no es una palabra alfabética (signos de puntuación, números, etc.)
-        if not word.isalpha():
-            corrected_words.append(word)
-            full_corrected_code.append(word)
-            continue
-        
-        # Convertir a minúsculas para las comparaciones
-        word_lower = word.lower()
-            
-        # Verificar si la palabra está exactamente en la lista de towns (no necesita corrección)
-        if word in town_names:
-            corrected_words.append(word)
-            full_corrected_code.append(word + " (town/city, exact match)")
-            continue
-            
-        # Verificar correcciones personalizadas de Supabase (prioridad máxima)
-        if word_lower in custom_replacements:
-            suggestion_text = custom_replacements[word_lower]
-            
-            corrected_words.append(suggestion_text)
-            suggestions.append({
-                "original": original_word,
-                "suggestion": suggestion_text,
-                "similarity": 1.0
-            })
-            full_corrected_code.append(f"{original_word} -> {suggestion_text} (custom)")
-            continue
-            
-        # Mantener la palabra original si no se encuentra en las tablas de Supabase
-        # No usamos el diccionario general ni correcciones gramaticales
-        
-        # No corregir palabras de jerga o abreviaturas comunes
-        if word_lower in slang_words:
-            corrected_words.append(word)
-            full_corrected_code.append(word)
-            continue
-            
-        # Verificar si puede ser un nombre de pueblo/ciudad usando FuzzyWuzzy
-        if len(word) >= 3:
-            # Usar FuzzyWuzzy para encontrar la mejor coincidencia en towns
-            if town_names:
-                best_town_match, best_town_score = process.extractOne(word, town_names, scorer=fuzz.ratio)
-                
-                # Solo corregir si la puntuación es lo suficientemente alta (85% o más)
-                if best_town_match and best_town_score >= 85 and best_town_match != word:
-                    similarity = round(best_town_score / 100.0, 2)
-                    corrected_words.append(best_town_match)
-                    suggestions.append({
-                        "original": original_word,
-                        "suggestion": best_town_match,
-                        "similarity": similarity,
-                        "correction_type": "town"
-                    })
-                    full_corrected_code.append(f"{original_word} -> {best_town_match} (town/city, {similarity})")
-                    continue
-            
-        # Usar FuzzyWuzzy para buscar coincidencias aproximadas en la tabla spellcheck
-        if len(word) >= 3:
-            # Obtener todas las palabras originales de la tabla spellcheck
-            spellcheck_words = list(custom_replacements.keys())
-            
-            # Usar FuzzyWuzzy para encontrar la mejor coincidencia en spellcheck
-            if spellcheck_words:
-                best_match, best_score = process.extractOne(word_lower, spellcheck_words, scorer=fuzz.ratio)
-                
-                # Solo corregir si la puntuación es lo suficientemente alta (85% o más)
-                if best_match and best_score >= 85 and best_match != word_lower:
-                    suggestion_text = custom_replacements[best_match]
-                    
-                    # Preservar capitalización original
-                    if word.istitle() and not suggestion_text.startswith("I"):
-                        suggestion_text = suggestion_text.title()
-                    elif word.isupper():
-                        suggestion_text = suggestion_text.upper()
-                    
-                    # Calcular similitud normalizada (0.0 - 1.0)
-                    similarity = round(best_score / 100.0, 2)
-                    
-                    corrected_words.append(suggestion_text)
-                    suggestions.append({
-                        "original": original_word,
-                        "suggestion": suggestion_text,
-                        "similarity": similarity
-                    })
-                    full_corrected_code.append(f"{original_word} -> {suggestion_text} (spellcheck, {similarity})")
-                    continue
-        
-        # Buscar coincidencias aproximadas en la tabla towns
-        if len(word) >= 3:
-            # Obtener todas las palabras originales de la tabla towns
-            town_words = town_names
-            
-            if town_words:
-                # Usar FuzzyWuzzy para encontrar la mejor coincidencia en towns
-                best_match, best_score = process.extractOne(word_lower, town_words, scorer=fuzz.ratio)
-                
-                # Solo corregir si la puntuación es lo suficientemente alta (85% o más)
-                if best_match and best_score >= 85:
-                    suggestion_text = best_match
-                    
-                    # Preservar capitalización original
-                    if word.istitle() and not suggestion_text.startswith("I"):
-                        suggestion_text = suggestion_text.title()
-                    elif word.isupper():
-                        suggestion_text = suggestion_text.upper()
-                    
-                    # Calcular similitud normalizada (0.0 - 1.0)
-                    similarity = round(best_score / 100.0, 2)
-                    
-                    corrected_words.append(suggestion_text)
-                    suggestions.append({
-                        "original": original_word,
-                        "suggestion": suggestion_text,
-                        "similarity": similarity
-                    })
-                    full_corrected_code.append(f"{original_word} -> {suggestion_text} (towns, {similarity})")
-                    continue
-        
-        # Si llegamos aquí, mantener la palabra original
-        corrected_words.append(word)
-        full_corrected_code.append(word)
-
-    corrected_text = " ".join(corrected_words)
-    full_corrected_code = "\n".join(full_corrected_code)  # Formato de código corregido con las sugerencias
-
-    # Filtrar sugerencias de pueblos/ciudades para la respuesta
-    town_matches = [s for s in suggestions if "town/city" in full_corrected_code.split("\n")[suggestions.index(s)]]
-    
+# Recargar los diccionarios manualmente tras editar las tablas en Supabase
+@app.post("/admin/reload")
+async def reload_dictionaries(user: Optional[User] = Depends(conditional_auth)):
+    try:
+        await run_io(dictionary_cache.reload)
+    except Exception as e:
+        logger.error(f"Error al recargar los diccionarios: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al conectar con Supabase: {str(e)}")
+    return dictionary_stats(user)
+
+# Métricas de la caché de diccionarios y de la caché de decisiones por palabra
+@app.get("/admin/dictionary")
+def dictionary_stats(user: Optional[User] = Depends(conditional_auth)):
     return {
-        "suggestions": suggestions,
-        "corrected_text": corrected_text,
-        "full_corrected_code": full_corrected_code,
-        "town_matches": town_matches
+        **dictionary_cache.stats(),
+        "word_cache": word_cache.stats(),
+        "english_lexicon": english_lexicon.stats(),
+        "response_cache": response_cache.stats(),
+        "block_cache": block_cache.stats(),
     }
+
+# Estado del limitador de concurrencia y de los pools de ejecución
+@app.get("/admin/concurrency")
+def concurrency_stats(user: Optional[User] = Depends(conditional_auth)):
+    return executors.stats()
+
+# Métricas en formato Prometheus
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(content=metrics.latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+# Endpoint principal. El ETag identifica el texto y la versión de los diccionarios: si el
+# cliente lo envía en If-None-Match se responde 304 sin corregir nada
+@app.post("/spellcheck", response_model=SpellCheckResponse)
+async def spellcheck(
+    request: SpellCheckRequest,
+    http_request: Request,
+    user: Optional[User] = Depends(conditional_auth)
+):
+    snapshot = await load_snapshot()
+    etag = response_etag(request.text, snapshot.version)
+    headers = {"ETag": etag}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        metrics.RESPONSE_CACHE_REQUESTS.labels(result="not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get(etag)
+    if body is not None:
+        metrics.RESPONSE_CACHE_REQUESTS.labels(result="hit").inc()
+        return Response(content=body, media_type="application/json", headers=headers)
+    metrics.RESPONSE_CACHE_REQUESTS.labels(result="miss").inc()
+
+    async with correction_limiter.slot():
+        timings = {}
+        result = await run_check_text(request.text, snapshot, timings)
+    metrics.record_check(timings)
+    # Se serializa aquí con orjson para medir el tiempo. check_text ya devuelve los campos
+    # de SpellCheckResponse, así que no se valida cada sugerencia con pydantic (response_model
+    # solo se usa para la documentación de la API)
+    with metrics.stage("serialize"):
+        response = ORJSONResponse(result, headers=headers)
+    response_cache.put(etag, response.body)
+    return response
+
+# Corrección incremental: el texto se divide en párrafos y solo se corrigen los que han
+# cambiado desde que se vieron por última vez (con la misma versión de los diccionarios)
+@app.post("/spellcheck/incremental", response_model=IncrementalSpellCheckResponse)
+async def spellcheck_incremental(
+    request: SpellCheckRequest,
+    user: Optional[User] = Depends(conditional_auth)
+):
+    async with correction_limiter.slot():
+        snapshot = await load_snapshot()
+        timings = {}
+        result = await run_cpu(check_blocks, request.text, snapshot, block_cache, timings)
+    metrics.record_check(timings)
+    with metrics.stage("serialize"):
+        return ORJSONResponse(result)
+
+class RequestStreamingResponse(StreamingResponse):
+    """StreamingResponse que no escucha desconexiones mientras envía la respuesta.
+
+    StreamingResponse lee receive() en paralelo para detectar desconexiones y se queda
+    con los mensajes del cuerpo de la petición; aquí el generador es quien lee el cuerpo
+    y request.stream() ya avisa si el cliente se desconecta.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+# Corrección en streaming para documentos muy grandes: el cuerpo es texto plano (UTF-8)
+# y la respuesta son líneas NDJSON (o eventos SSE si se pide text/event-stream)
+@app.post("/spellcheck/stream")
+async def spellcheck_stream(
+    request: Request,
+    user: Optional[User] = Depends(conditional_auth)
+):
+    # La plaza en el limitador solo se ocupa mientras se corrige cada parte, no mientras se
+    # recibe el cuerpo: un cliente que envía despacio no deja sin plazas a los demás
+    async with correction_limiter.slot():
+        snapshot = await load_snapshot()
+
+    use_sse = "text/event-stream" in request.headers.get("accept", "")
+
+    def encode(event: dict) -> str:
+        line = json.dumps(event, ensure_ascii=False)
+        return f"data: {line}\n\n" if use_sse else line + "\n"
+
+    async def correct(function, *args) -> List[dict]:
+        async with correction_limiter.slot():
+            return await run_cpu(function, *args)
+
+    def finish(checker: StreamingCheck, rest: str) -> List[dict]:
+        return checker.feed(rest) + checker.finish()
+
+    async def events():
+        checker = StreamingCheck(snapshot)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            async for chunk in request.stream():
+                for event in await correct(checker.feed, decoder.decode(chunk)):
+                    yield encode(event)
+            for event in await correct(finish, checker, decoder.decode(b"", final=True)):
+                yield encode(event)
+        except Overloaded as e:
+            # La respuesta ya ha empezado y no puede ser un 503: se avisa con un evento y se corta
+            yield encode({"type": "error", "detail": f"Servidor ocupado: {str(e)}"})
+            return
+        logger.info(f"Streaming completado con {checker.tokens} palabras/tokens")
+        metrics.record_check({"tokens": checker.tokens})
+
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return RequestStreamingResponse(events(), media_type=media_type)
+
+# Corrección de varios documentos en una sola petición
+@app.post("/spellcheck/batch", response_model=BatchSpellCheckResponse)
+async def spellcheck_batch(
+    request: BatchSpellCheckRequest,
+    user: Optional[User] = Depends(conditional_auth)
+):
+    if len(request.documents) > BATCH_MAX_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"El lote admite como máximo {BATCH_MAX_DOCUMENTS} documentos")
+    ids = [document.id for document in request.documents]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Los ids de los documentos deben ser únicos")
+
+    async with correction_limiter.slot():
+        snapshot = await load_snapshot()
+        # Todas las palabras del lote comparten las decisiones: cada palabra distinta se evalúa una vez
+        texts = [document.text for document in request.documents]
+        timings = {}
+        results = await run_check_batch(texts, snapshot, timings)
+    metrics.record_check(timings)
+    with metrics.stage("serialize"):
+        return ORJSONResponse({"results": [{"id": id_, "result": result} for id_, result in zip(ids, results)]})
@@ -0,0 +1,419 @@
+import copy
+import os
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from typing import AbstractSet, Dict, List, Optional, Set, Tuple
+
+import Levenshtein
+import numpy as np
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import utils
+
+from tokenizer import tokenize
+
+# Puntuación mínima (fuzz.ratio) para aceptar una coincidencia aproximada
+MATCH_THRESHOLD = 85
+
+# Número máximo de borrados que se indexan por corrección en CorrectionIndex
+MAX_EDIT_DISTANCE = int(os.getenv("SPELLCHECK_MAX_EDIT_DISTANCE", "2"))
+
+
+def min_common_length(a: int, b: int, score_cutoff: int) -> int:
+    """Longitud mínima de subsecuencia común para que fuzz.ratio pueda alcanzar score_cutoff.
+
+    fuzz.ratio vale round(200 * L / (a + b)), donde L es la subsecuencia común más
+    larga, así que basta con exigir 200 * L >= (score_cutoff - 0.5) * (a + b).
+    """
+    return -(-(2 * score_cutoff - 1) * (a + b) // 400)
+
+
+def normalize_town(text: str) -> str:
+    """Forma normalizada de un nombre: sin acentos, en minúsculas (casefold) y con espacios simples."""
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def _bigrams(text: str) -> List[str]:
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+class FuzzyMatcher:
+    """Índice para buscar la mejor coincidencia de una palabra dentro de una lista fija.
+
+    Devuelve exactamente lo mismo que process.extractOne(query, choices, scorer=fuzz.ratio)
+    cuando la puntuación supera el umbral, pero sin recorrer toda la lista: las opciones
+    se agrupan por longitud y se descartan las que no comparten suficientes bigramas con
+    la consulta para poder llegar al umbral. Solo las candidatas se puntúan con fuzz.ratio.
+    """
+
+    def __init__(self, choices: List[str]):
+        self.choices = choices
+        self._processed: List[str] = []
+        # longitud -> ids de opciones con esa longitud (ya procesadas)
+        self._buckets: Dict[int, List[int]] = defaultdict(list)
+        # longitud -> bigrama -> ids (un id por cada aparición del bigrama)
+        self._postings: Dict[int, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        for idx, choice in enumerate(choices):
+            processed = utils.full_process(choice)
+            self._processed.append(processed)
+            if not processed:
+                continue
+            length = len(processed)
+            self._buckets[length].append(idx)
+            postings = self._postings[length]
+            for gram in _bigrams(processed):
+                postings[gram].append(idx)
+        self._buckets = dict(self._buckets)
+        self._postings = {length: dict(postings) for length, postings in self._postings.items()}
+        self.comparisons = 0
+
+    def __len__(self):
+        return len(self.choices)
+
+    def patched(self, added: List[str], removed: Set[str]) -> "FuzzyMatcher":
+        """Copia del índice con opciones nuevas al final y sin las de removed, sin reconstruirlo.
+
+        Este índice no se modifica (puede estar en uso): la copia comparte las listas que
+        no cambian y solo copia los buckets y bigramas que toca. Las opciones retiradas
+        conservan su id con la forma procesada vacía, que ya no se puntúa. Las nuevas van
+        al final, igual que al reconstruirlo, así que los desempates no cambian.
+        """
+        clone = copy.copy(self)
+        clone.comparisons = 0
+        clone.choices = self.choices + added
+        clone._processed = list(self._processed)
+        if removed:
+            for idx, choice in enumerate(self.choices):
+                if choice in removed:
+                    clone._processed[idx] = ""
+        clone._buckets = dict(self._buckets)
+        clone._postings = dict(self._postings)
+        copied = set()
+        for idx, choice in enumerate(added, start=len(self.choices)):
+            processed = utils.full_process(choice)
+            clone._processed.append(processed)
+            if not processed:
+                continue
+            length = len(processed)
+            if length not in copied:
+                clone._buckets[length] = list(self._buckets.get(length, ()))
+                clone._postings[length] = dict(self._postings.get(length, {}))
+                copied.add(length)
+            clone._buckets[length].append(idx)
+            postings = clone._postings[length]
+            for gram in _bigrams(processed):
+                if (length, gram) not in copied:
+                    postings[gram] = list(postings.get(gram, ()))
+                    copied.add((length, gram))
+                postings[gram].append(idx)
+        return clone
+
+    @property
+    def processed_choices(self) -> List[str]:
+        """Opciones normalizadas con utils.full_process, en el mismo orden que choices."""
+        return self._processed
+
+    def candidate_lengths(self, length: int, score_cutoff: int = MATCH_THRESHOLD) -> List[int]:
+        """Longitudes de opción que pueden alcanzar score_cutoff frente a una consulta de esa longitud."""
+        return [
+            b for b in self._buckets
+            if min(length, b) >= min_common_length(length, b, score_cutoff)
+        ]
+
+    def extract_one(
+        self,
+        query: str,
+        score_cutoff: int = MATCH_THRESHOLD,
+    ) -> Optional[Tuple[str, int]]:
+        """Mejor opción (y su puntuación) con score >= score_cutoff, o None.
+
+        En caso de empate gana la opción que aparece antes en la lista, igual que extractOne.
+        """
+        processed_query = utils.full_process(query)
+        if not processed_query:
+            return None
+        lengths = self.candidate_lengths(len(processed_query), score_cutoff)
+        candidates = self._filter_candidates(processed_query, lengths, score_cutoff)
+        return self._best(processed_query, candidates, score_cutoff)
+
+    def _filter_candidates(self, processed_query: str, lengths: List[int], score_cutoff: int) -> List[int]:
+        """Ids de las opciones de esas longitudes que comparten suficientes bigramas con la consulta."""
+        a = len(processed_query)
+        query_grams = set(_bigrams(processed_query))
+        candidates: List[int] = []
+        for b in lengths:
+            bucket = self._buckets.get(b)
+            if not bucket:
+                continue
+            # Bigramas compartidos mínimos: cada borrado destruye como mucho dos bigramas
+            # de la opción y cada inserción uno, así que quedan al menos 3L - a - b - 1.
+            required = 3 * min_common_length(a, b, score_cutoff) - a - b - 1
+            if required <= 0:
+                candidates.extend(bucket)
+                continue
+            shared = Counter()
+            postings = self._postings[b]
+            for gram in query_grams:
+                ids = postings.get(gram)
+                if ids:
+                    shared.update(ids)
+            candidates.extend(idx for idx, count in shared.items() if count >= required)
+        return candidates
+
+    def _best(self, processed_query: str, candidates, score_cutoff: int) -> Optional[Tuple[str, int]]:
+        """Puntúa las candidatas con fuzz.ratio y devuelve la mejor (la primera de la lista si empatan)."""
+        best_idx = -1
+        best_score = -1
+        for idx in candidates:
+            choice = self._processed[idx]
+            if not choice:
+                continue
+            self.comparisons += 1
+            score = fuzz.ratio(processed_query, choice)
+            if score > best_score or (score == best_score and idx < best_idx):
+                best_idx, best_score = idx, score
+        if best_idx < 0 or best_score < score_cutoff:
+            return None
+        return self.choices[best_idx], best_score
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """Variantes de la palabra obtenidas borrando hasta max_distance caracteres (sin llegar a vacío)."""
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for variant in frontier:
+            if len(variant) > 1:
+                for i in range(len(variant)):
+                    next_frontier.add(variant[:i] + variant[i + 1:])
+        variants |= next_frontier
+        frontier = next_frontier
+    return variants
+
+
+class CorrectionIndex(FuzzyMatcher):
+    """Índice de borrados simétricos (estilo SymSpell) sobre las claves de la tabla spellcheck.
+
+    Para cada clave se guardan todas las variantes con hasta max_distance caracteres
+    borrados. Una consulta genera sus propias variantes y las busca en el índice, así
+    que el coste no depende del número de correcciones sino de la longitud de la palabra.
+    """
+
+    def __init__(self, keys: List[str], max_distance: int = MAX_EDIT_DISTANCE):
+        super().__init__(keys)
+        self.max_distance = max_distance
+        # Las variantes se guardan como pares (crc32 de la variante, id de la clave) ordenados
+        # por hash en dos arrays de numpy: ocupan mucho menos que un dict y se pueden
+        # guardar en el snapshot compilado y leerse con mmap sin copiarlos. Una colisión
+        # de crc32 solo añade candidatas, que se vuelven a puntuar igualmente.
+        hashes: List[int] = []
+        ids: List[int] = []
+        for idx, processed in enumerate(self._processed):
+            if not processed:
+                continue
+            for variant in _deletes(processed, max_distance):
+                hashes.append(zlib.crc32(variant.encode("utf-8")))
+                ids.append(idx)
+        delete_hashes = np.array(hashes, dtype=np.uint32)
+        order = np.argsort(delete_hashes, kind="stable")
+        self._delete_hashes = delete_hashes[order]
+        self._delete_ids = np.array(ids, dtype=np.int32)[order]
+        # Variantes de las claves añadidas con patched(): crc32 -> ids
+        self._added_deletes: Dict[int, List[int]] = {}
+
+    def patched(self, added: List[str], removed: Set[str]) -> "CorrectionIndex":
+        """Como FuzzyMatcher.patched; las variantes de las claves nuevas van a un dict aparte.
+
+        Los arrays ordenados (quizá leídos con mmap) se comparten sin tocarlos.
+        """
+        clone = super().patched(added, removed)
+        # Las listas de ids son cortas: se sustituyen en lugar de modificar las compartidas
+        added_deletes = clone._added_deletes = dict(self._added_deletes)
+        for idx in range(len(self.choices), len(clone.choices)):
+            processed = clone._processed[idx]
+            if not processed:
+                continue
+            for variant in _deletes(processed, self.max_distance):
+                value = zlib.crc32(variant.encode("utf-8"))
+                added_deletes[value] = added_deletes.get(value, []) + [idx]
+        return clone
+
+    def _lookup_ids(self, processed_query: str, max_distance: int) -> Set[int]:
+        """Ids de las claves que comparten alguna variante con la consulta."""
+        ids: Set[int] = set()
+        variants = _deletes(processed_query, max_distance)
+        query_hashes = np.fromiter(
+            (zlib.crc32(variant.encode("utf-8")) for variant in variants), dtype=np.uint32, count=len(variants)
+        )
+        starts = np.searchsorted(self._delete_hashes, query_hashes, side="left")
+        ends = np.searchsorted(self._delete_hashes, query_hashes, side="right")
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if start < end:
+                ids.update(self._delete_ids[start:end].tolist())
+        if self._added_deletes:
+            for value in query_hashes.tolist():
+                ids.update(self._added_deletes.get(value, ()))
+        return ids
+
+    def lookup(self, query: str, max_distance: Optional[int] = None) -> Optional[Tuple[str, int]]:
+        """Clave más cercana (distancia de Levenshtein <= max_distance) y su distancia, o None."""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        processed_query = utils.full_process(query)
+        if not processed_query:
+            return None
+        best_idx = -1
+        best_distance = max_distance + 1
+        for idx in self._lookup_ids(processed_query, max_distance):
+            choice = self._processed[idx]
+            if not choice:
+                continue
+            self.comparisons += 1
+            distance = Levenshtein.distance(processed_query, choice)
+            if distance < best_distance or (distance == best_distance and idx < best_idx):
+                best_idx, best_distance = idx, distance
+        if best_idx < 0:
+            return None
+        return self.choices[best_idx], best_distance
+
+    def extract_one(
+        self,
+        query: str,
+        score_cutoff: int = MATCH_THRESHOLD,
+    ) -> Optional[Tuple[str, int]]:
+        """Modo compatible: mismo resultado que process.extractOne(..., scorer=fuzz.ratio).
+
+        Las candidatas del índice de borrados se vuelven a puntuar con fuzz.ratio. Las
+        longitudes de clave que podrían llegar al umbral necesitando más borrados de los
+        indexados se revisan con el filtro de bigramas de FuzzyMatcher.
+        """
+        processed_query = utils.full_process(query)
+        if not processed_query:
+            return None
+        a = len(processed_query)
+        query_distance = 0
+        uncovered = []
+        for b in self.candidate_lengths(a, score_cutoff):
+            common = min_common_length(a, b, score_cutoff)
+            if a - common <= self.max_distance and b - common <= self.max_distance:
+                query_distance = max(query_distance, a - common)
+            else:
+                uncovered.append(b)
+        candidates = self._lookup_ids(processed_query, query_distance)
+        if uncovered:
+            candidates.update(self._filter_candidates(processed_query, uncovered, score_cutoff))
+        return self._best(processed_query, candidates, score_cutoff)
+
+
+def _town_tokens(name: str) -> Tuple[str, ...]:
+    return tuple(tokenize(normalize_town(name)))
+
+
+class TownIndex:
+    """Búsqueda exacta de nombres de pueblos/ciudades por tabla hash.
+
+    Además de la comparación literal, los nombres se buscan normalizados (sin acentos y
+    sin distinguir mayúsculas) y se devuelve la grafía original de la tabla towns. Los
+    nombres de varios tokens ("San Juan") se guardan como tuplas de tokens normalizados
+    para reconocerlos en el texto como n-gramas.
+    """
+
+    def __init__(self, names: List[str]):
+        self.names: Set[str] = set(names)
+        # forma normalizada de un solo token -> nombre original (el primero de la lista)
+        self._canonical: Dict[str, str] = {}
+        # tokens normalizados -> nombre original, para nombres de varios tokens
+        self._phrases: Dict[Tuple[str, ...], str] = {}
+        self._phrase_starts: Set[str] = set()
+        # Formas normalizadas compartidas por varios nombres distintos
+        self._shared: Set[Tuple[str, ...]] = set()
+        self.max_phrase_tokens = 0
+        for name in names:
+            self._add(name, _town_tokens(name))
+
+    def _add(self, name: str, tokens: Tuple[str, ...]):
+        if not tokens:
+            return
+        if len(tokens) == 1:
+            if self._canonical.setdefault(tokens[0], name) != name:
+                self._shared.add(tokens)
+            return
+        if self._phrases.setdefault(tokens, name) != name:
+            self._shared.add(tokens)
+        self._phrase_starts.add(tokens[0])
+        self.max_phrase_tokens = max(self.max_phrase_tokens, len(tokens))
+
+    def patched(self, names: List[str], added: List[str], removed: Set[str]) -> "TownIndex":
+        """Copia del índice para la lista names, que resulta de quitar removed y añadir added."""
+        clone = copy.copy(self)
+        clone.names = set(names)
+        clone._canonical = dict(self._canonical)
+        clone._phrases = dict(self._phrases)
+        clone._phrase_starts = set(self._phrase_starts)
+        clone._shared = set(self._shared)
+        orphaned = set()
+        for name in removed:
+            tokens = _town_tokens(name)
+            if len(tokens) == 1 and clone._canonical.get(tokens[0]) == name:
+                del clone._canonical[tokens[0]]
+                orphaned.add(tokens)
+            elif len(tokens) > 1 and clone._phrases.get(tokens) == name:
+                del clone._phrases[tokens]
+                orphaned.add(tokens)
+        orphaned &= self._shared
+        if orphaned:
+            # Otro nombre con la misma forma normalizada (el primero de la lista) pasa a ser
+            # el canónico; hay que recorrer toda la lista, pero solo en este caso
+            for name in names:
+                tokens = _town_tokens(name)
+                if tokens in orphaned:
+                    clone._add(name, tokens)
+        for name in added:
+            clone._add(name, _town_tokens(name))
+        return clone
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.names
+
+    def canonical(self, word: str) -> Optional[str]:
+        """Nombre original que coincide con la palabra una vez normalizada, o None."""
+        return self._canonical.get(normalize_town(word))
+
+    def find_phrases(self, words: List[str], breaks: AbstractSet[int] = frozenset()) -> Dict[int, Tuple[int, str]]:
+        """Nombres de varios tokens presentes en la lista de tokens.
+
+        Devuelve posición del primer token -> (número de tokens, nombre original). Si hay
+        varios nombres posibles en la misma posición gana el más largo y las coincidencias
+        no se solapan. breaks son las posiciones de los tokens que empiezan una línea: un
+        nombre no continúa en la línea siguiente.
+        """
+        found: Dict[int, Tuple[int, str]] = {}
+        if not self._phrases:
+            return found
+        # Los textos repiten mucho las mismas palabras: se normaliza cada una una sola vez
+        cache: Dict[str, str] = {}
+        normalized = []
+        for word in words:
+            form = cache.get(word)
+            if form is None:
+                form = cache[word] = normalize_town(word)
+            normalized.append(form)
+        i = 0
+        while i < len(words):
+            if normalized[i] in self._phrase_starts:
+                longest = min(self.max_phrase_tokens, len(words) - i)
+                for j in range(i + 1, i + longest):
+                    if j in breaks:
+                        longest = j - i
+                        break
+                for n in range(longest, 1, -1):
+                    name = self._phrases.get(tuple(normalized[i:i + n]))
+                    if name is not None:
+                        found[i] = (n, name)
+                        i += n - 1
+                        break
+            i += 1
+        return found
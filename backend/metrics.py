@@ -0,0 +1,191 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from starlette.datastructures import MutableHeaders
+
+# Añadir la cabecera Server-Timing con los tiempos de cada petición
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+SUPABASE_QUERY_SECONDS = Histogram(
+    "proofmaster_supabase_query_seconds",
+    "Latencia de las consultas a Supabase por tabla",
+    ["table"],
+    buckets=LATENCY_BUCKETS,
+)
+SPELLCHECK_STAGE_SECONDS = Histogram(
+    "proofmaster_spellcheck_stage_seconds",
+    "Tiempo de cada etapa de la corrección por petición",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+SPELLCHECK_TOKENS = Histogram(
+    "proofmaster_spellcheck_tokens",
+    "Tamaño de los textos corregidos en palabras/tokens",
+    buckets=(10, 100, 1000, 10000, 100000, 1000000, 10000000),
+)
+AUTH_SECONDS = Histogram(
+    "proofmaster_auth_seconds",
+    "Latencia de la dependencia de autenticación get_current_user",
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSE_CACHE_REQUESTS = Counter(
+    "proofmaster_response_cache_requests_total",
+    "Peticiones a /spellcheck según la caché de respuestas: hit, miss o not_modified (304)",
+    ["result"],
+)
+LIMITER_ACTIVE = Gauge(
+    "proofmaster_limiter_active",
+    "Trabajos en ejecución en cada limitador de concurrencia",
+    ["pool"],
+    # Con serve.py cada worker publica sus valores y se suman los de los procesos vivos
+    multiprocess_mode="livesum",
+)
+LIMITER_WAITING = Gauge(
+    "proofmaster_limiter_queue_depth",
+    "Peticiones esperando turno en cada limitador de concurrencia",
+    ["pool"],
+    # Con serve.py cada worker publica sus valores y se suman los de los procesos vivos
+    multiprocess_mode="livesum",
+)
+LIMITER_REJECTED = Counter(
+    "proofmaster_limiter_rejected_total",
+    "Peticiones rechazadas con 503 por cada limitador",
+    ["pool"],
+)
+
+# Tiempos de la petición en curso para Server-Timing (None fuera de una petición)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def record(stage: str, seconds: float):
+    """Observa el tiempo de una etapa y lo suma a los tiempos de la petición en curso."""
+    SPELLCHECK_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    _add_to_request(stage, seconds)
+
+
+def record_check(timings: Dict[str, float]):
+    """Observa los tiempos por etapa y el número de tokens devueltos por check_text/check_batch."""
+    for stage, value in timings.items():
+        if stage == "tokens":
+            SPELLCHECK_TOKENS.observe(value)
+        else:
+            record(stage, value)
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+@contextmanager
+def supabase_query(table: str):
+    """Mide una consulta a Supabase sobre la tabla indicada."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        SUPABASE_QUERY_SECONDS.labels(table=table).observe(seconds)
+        _add_to_request(f"supabase_{table}", seconds)
+
+
+@contextmanager
+def auth_timer():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        AUTH_SECONDS.observe(seconds)
+        _add_to_request("auth", seconds)
+
+
+def _add_to_request(name: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def track_limiter(pool: str, limiter):
+    """Publica el estado de un ConcurrencyLimiter cada vez que cambia.
+
+    No se usa Gauge.set_function: con varios procesos solo se exporta lo que cada uno
+    ha escrito en PROMETHEUS_MULTIPROC_DIR.
+    """
+    active = LIMITER_ACTIVE.labels(pool=pool)
+    waiting = LIMITER_WAITING.labels(pool=pool)
+    rejected = LIMITER_REJECTED.labels(pool=pool)
+    # El contador solo avanza: se suman los rechazos nuevos desde la última publicación
+    published_rejected = limiter.rejected
+
+    def publish():
+        nonlocal published_rejected
+        active.set(limiter.active)
+        waiting.set(limiter.waiting)
+        if limiter.rejected > published_rejected:
+            rejected.inc(limiter.rejected - published_rejected)
+            published_rejected = limiter.rejected
+
+    limiter.on_change = publish
+    publish()
+
+
+def latest() -> bytes:
+    """Métricas en el formato de texto de Prometheus.
+
+    Con serve.py (PROMETHEUS_MULTIPROC_DIR definido) se agregan las de todos los
+    workers; si no, son las del proceso.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
+
+
+class ServerTimingMiddleware:
+    """Middleware ASGI que añade la cabecera Server-Timing con los tiempos de la petición.
+
+    Solo incluye lo medido antes de enviar las cabeceras; en las respuestas en streaming
+    eso es la autenticación y la carga del diccionario.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = time.perf_counter() - started
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(timings))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+
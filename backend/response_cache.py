@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+from lexicon import ENGLISH_LEXICON_ENABLED, ENGLISH_LEXICON_PATH, ENGLISH_LEXICON_SIZE
+from lru import LRUCache
+from snapshot_file import index_params
+from spellchecker import CORRECTION_MATCH_MODE
+
+# Guardar las respuestas de /spellcheck para reenviarlas si llega otra vez el mismo texto
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+# Bytes máximos de respuestas guardadas; al superarlos se descartan las usadas hace más tiempo
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Segundos que se reutiliza una respuesta guardada
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+
+# Configuración que cambia las correcciones sin cambiar la versión de los diccionarios
+_SETTINGS = json.dumps(
+    {
+        **index_params(),
+        "correction_mode": CORRECTION_MATCH_MODE,
+        "english_lexicon": [ENGLISH_LEXICON_ENABLED, ENGLISH_LEXICON_PATH, ENGLISH_LEXICON_SIZE],
+    },
+    sort_keys=True,
+).encode("utf-8")
+
+
+def response_etag(text: str, version: str) -> str:
+    """ETag de la corrección de text con esa versión de los diccionarios.
+
+    La respuesta solo depende del texto, del snapshot y de la configuración, así que se
+    sabe si el cliente ya la tiene sin corregir el texto. El texto no se normaliza: la
+    respuesta lo reproduce (corrected_text y posiciones) tal cual se envió.
+    """
+    digest = hashlib.blake2b(_SETTINGS, digest_size=16)
+    digest.update(b"\0" + version.encode("utf-8") + b"\0")
+    digest.update(text.encode("utf-8", "surrogatepass"))
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Si la cabecera If-None-Match incluye el ETag (comparación débil, como en GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+class ResponseCache(LRUCache[str, bytes]):
+    """Respuestas ya serializadas por ETag (LRU limitada en bytes y con caducidad)."""
+
+    def __init__(
+        self,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = RESPONSE_CACHE_TTL_SECONDS,
+    ):
+        super().__init__(max_bytes if enabled else 0, ttl, weight=len)
+        self.max_bytes = max_bytes
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        return {
+            "enabled": self.enabled,
+            "size": stats["size"],
+            "bytes": self._total_weight,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"],
+            "hit_ratio": stats["hit_ratio"],
+        }
+
+
+# Caché de respuestas de /spellcheck del worker
+response_cache = ResponseCache()
@@ -0,0 +1,154 @@
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import utils
+from rapidfuzz import fuzz as rapid_fuzz
+from rapidfuzz import process as rapid_process
+
+from matching import MATCH_THRESHOLD
+
+# Función de similitud para las búsquedas aproximadas: "ratio", "composite" o "simple"
+SPELLCHECK_SCORER = os.getenv("SPELLCHECK_SCORER", "ratio").lower()
+
+# Motor de búsqueda aproximada: "indexed" (índices por palabra) o "bulk" (matriz con rapidfuzz.cdist)
+SPELLCHECK_SCORING_BACKEND = os.getenv("SPELLCHECK_SCORING_BACKEND", "indexed").lower()
+
+# Hilos usados por cdist (-1 usa todos los núcleos)
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "-1"))
+
+# Celdas máximas de cada matriz de puntuaciones; las consultas se reparten en bloques
+CDIST_MAX_CELLS = int(os.getenv("CDIST_MAX_CELLS", "4000000"))
+
+
+def similarity_ratio(s1, s2):
+    """Calcula una ratio de similitud simple entre dos cadenas."""
+    s1, s2 = s1.lower(), s2.lower()
+
+    # Si las cadenas son iguales, la similitud es 1.0
+    if s1 == s2:
+        return 1.0
+
+    # Si una cadena está contenida en la otra, hay alta similitud
+    if s1 in s2 or s2 in s1:
+        return 0.9
+
+    # Contar caracteres comunes
+    common = sum(min(s1.count(c), s2.count(c)) for c in set(s1 + s2))
+    total = len(s1) + len(s2)
+
+    # Devolver ratio de similitud
+    return 2 * common / total if total > 0 else 0.0
+
+# Función mejorada de similitud usando FuzzyWuzzy
+def get_similarity(s1, s2):
+    """Calcula una ratio de similitud entre dos cadenas usando FuzzyWuzzy."""
+    # Convertir a minúsculas para comparación insensible a mayúsculas/minúsculas
+    s1, s2 = s1.lower(), s2.lower()
+
+    # Si las cadenas son iguales, la similitud es 1.0
+    if s1 == s2:
+        return 1.0
+
+    # Calcular diferentes tipos de ratios
+    simple_ratio = fuzz.ratio(s1, s2) / 100.0
+    partial_ratio = fuzz.partial_ratio(s1, s2) / 100.0
+    token_sort_ratio = fuzz.token_sort_ratio(s1, s2) / 100.0
+    token_set_ratio = fuzz.token_set_ratio(s1, s2) / 100.0
+
+    # Para palabras cortas, dar más peso al ratio simple
+    if len(s1) <= 4 or len(s2) <= 4:
+        return max(simple_ratio * 1.1, partial_ratio, token_sort_ratio, token_set_ratio)
+
+    # Para palabras más largas, usar el máximo de todos los ratios
+    return max(simple_ratio, partial_ratio, token_sort_ratio, token_set_ratio)
+
+
+def _composite_scorer(s1, s2, **kwargs):
+    return min(get_similarity(s1, s2), 1.0) * 100
+
+
+def _simple_scorer(s1, s2, **kwargs):
+    return similarity_ratio(s1, s2) * 100
+
+
+# Funciones de similitud en escala 0-100 aceptadas por rapidfuzz.process.cdist
+SCORERS: Dict[str, Callable] = {
+    "ratio": rapid_fuzz.ratio,
+    "composite": _composite_scorer,
+    "simple": _simple_scorer,
+}
+
+
+class BulkScorer:
+    """Puntúa muchas palabras a la vez contra una lista fija con rapidfuzz.process.cdist.
+
+    Con el scorer "ratio" las puntuaciones se redondean igual que fuzz.ratio de fuzzywuzzy
+    antes de elegir la mejor, así que el umbral del 85% y el desempate (gana la opción que
+    aparece antes aunque otra tenga más decimales) no cambian.
+    """
+
+    def __init__(self, processed_choices: List[str], scorer: str = SPELLCHECK_SCORER):
+        if scorer not in SCORERS:
+            raise ValueError(f"Scorer desconocido: {scorer}")
+        self.processed_choices = processed_choices
+        self.scorer = scorer
+        # Posiciones de las opciones vacías (sin texto o retiradas con patched()), que no
+        # pueden ganar aunque el scorer "simple" las considere contenidas en cualquier
+        # palabra. Se calculan en la primera consulta
+        self._blank: Optional[np.ndarray] = None
+        # Comparaciones calculadas (celdas de las matrices de cdist), para los benchmarks
+        self.comparisons = 0
+
+    def best_matches(
+        self,
+        queries: List[str],
+        score_cutoff: int = MATCH_THRESHOLD,
+    ) -> List[Optional[Tuple[int, int]]]:
+        """Para cada consulta, (índice de la mejor opción, puntuación) o None si no llega al umbral."""
+        results: List[Optional[Tuple[int, int]]] = [None] * len(queries)
+        if not queries or not self.processed_choices:
+            return results
+        if self._blank is None:
+            self._blank = np.flatnonzero(np.fromiter(
+                (not choice for choice in self.processed_choices), dtype=bool, count=len(self.processed_choices)
+            ))
+        processed_queries = [utils.full_process(query) for query in queries]
+        rows = max(1, CDIST_MAX_CELLS // len(self.processed_choices))
+        for start in range(0, len(processed_queries), rows):
+            block = processed_queries[start:start + rows]
+            self.comparisons += len(block) * len(self.processed_choices)
+            scores = rapid_process.cdist(
+                block,
+                self.processed_choices,
+                scorer=SCORERS[self.scorer],
+                score_cutoff=score_cutoff - 0.5,
+                dtype=np.float32,
+                workers=SCORING_WORKERS,
+            )
+            if self._blank.size:
+                scores[:, self._blank] = 0
+            best = scores.argmax(axis=1)
+            for offset, idx in enumerate(best):
+                if block[offset] and scores[offset, idx] >= score_cutoff - 0.5:
+                    match = self._first_best(block[offset], scores[offset], scores[offset, idx])
+                    if match[1] >= score_cutoff:
+                        results[start + offset] = match
+        return results
+
+    def _first_best(self, processed_query: str, row: np.ndarray, top: float) -> Tuple[int, int]:
+        """Primera opción con la mejor puntuación redondeada, como extractOne.
+
+        Otra opción con menos decimales que la del máximo puede redondear a lo mismo (86.67
+        y 86.96 valen 87) y aparecer antes. Solo pueden hacerlo las que están a menos de un
+        punto; se vuelven a puntuar en float64 y se redondean con round(), igual que
+        fuzz.ratio (en float32 una puntuación como 92.5 podría redondearse al otro lado).
+        """
+        scorer = SCORERS[self.scorer]
+        best_idx, best_score = -1, -1
+        for idx in np.flatnonzero(row >= top - 1.001):
+            score = round(scorer(processed_query, self.processed_choices[idx]))
+            if score > best_score:
+                best_idx, best_score = int(idx), score
+        return best_idx, best_score
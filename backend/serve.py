@@ -0,0 +1,243 @@
+"""Lanza la API en producción con varios workers que comparten los diccionarios.
+
+El proceso padre carga una sola vez el snapshot de diccionarios (y el diccionario de
+inglés si está activado), abre el socket y crea los workers con fork. Los workers
+heredan el snapshot en páginas de memoria compartidas (copy-on-write) en lugar de
+construir cada uno su copia; gc.freeze() evita que el recolector de basura las toque.
+
+El padre recarga los diccionarios cada DICTIONARY_TTL_SECONDS segundos o al recibir
+SIGHUP (POST /admin/reload en cualquier worker se lo envía). Si la versión cambia,
+incrementa la generación y sustituye los workers uno a uno: arranca uno nuevo con el
+snapshot nuevo y después para uno de la generación anterior, que termina sus peticiones.
+Entre recargas, cada worker aplica por su cuenta los cambios de las tablas
+(DICTIONARY_SYNC_SECONDS) sobre el snapshot compartido; solo lo que cambia deja de
+compartirse.
+
+Las métricas de Prometheus se escriben en PROMETHEUS_MULTIPROC_DIR (un directorio
+temporal si no se indica otro), así que /metrics devuelve las de todos los workers
+sea cual sea el que atiende la petición.
+
+Uso (desde backend/):
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Dict
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+# Número de workers de uvicorn
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "1"))
+# Segundos que se espera a que un worker termine sus peticiones antes de matarlo
+SERVE_GRACEFUL_TIMEOUT = float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30"))
+# Segundos entre intentos de cargar los diccionarios si no se pudieron cargar al arrancar
+SERVE_LOAD_RETRY_SECONDS = float(os.getenv("SERVE_LOAD_RETRY_SECONDS", "5"))
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Proceso padre: mantiene el snapshot y los workers de la generación actual."""
+
+    def __init__(self, app_module, sock: socket.socket, workers: int, graceful_timeout: float, log_level: str):
+        self.app_module = app_module
+        self.sock = sock
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.cache = app_module.dictionary_cache
+        self.generation = 0
+        self.version = None
+        # pid -> generación del snapshot con el que se creó el worker
+        self.workers: Dict[int, int] = {}
+        self._reload_requested = False
+        self._stopping = False
+
+    def run(self):
+        from_file = self.cache.load_initial()
+        # Si el almacén no responde se arranca igualmente: los workers cargan los
+        # diccionarios por su cuenta al recibir peticiones y el padre lo reintenta
+        self.version = self.cache.stats()["version"]
+        if self.version is None:
+            logger.warning(f"Arrancando sin diccionarios; se reintentará cada {SERVE_LOAD_RETRY_SECONDS} s")
+        self.generation = 1
+        lexicon = self.app_module.english_lexicon
+        if lexicon.enabled:
+            lexicon.load()
+        gc.freeze()
+
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        for _ in range(self.worker_count):
+            self.spawn()
+        logger.info(
+            f"{self.worker_count} workers escuchando en {self.sock.getsockname()} "
+            f"con la versión {self.version} de los diccionarios"
+        )
+
+        ttl = self.cache.ttl
+        # Si se arrancó con el snapshot compilado, se comprueba enseguida si hay una versión nueva
+        next_reload = time.monotonic() if from_file else time.monotonic() + self._reload_interval()
+        while not self._stopping:
+            self.reap()
+            due = (ttl > 0 or from_file or self.version is None) and time.monotonic() >= next_reload
+            if self._reload_requested or due:
+                self._reload_requested = False
+                # Los workers creados con el snapshot compilado no conocen la posición en el
+                # registro de cambios del almacén: se sustituyen para que puedan sincronizar
+                self.reload(force=from_file and self.cache.sync_interval > 0)
+                from_file = False
+                next_reload = time.monotonic() + self._reload_interval()
+            time.sleep(0.5)
+        self.stop_all()
+
+    def _reload_interval(self) -> float:
+        return SERVE_LOAD_RETRY_SECONDS if self.version is None else self.cache.ttl
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+        self.workers[pid] = self.generation
+        return pid
+
+    def _run_worker(self):
+        code = 0
+        try:
+            for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, signal.SIG_DFL)
+            parent = os.getppid()
+            self.app_module.dictionary_cache.manage_externally(
+                self.generation, lambda: os.kill(parent, signal.SIGHUP)
+            )
+            config = uvicorn.Config(self.app_module.app, log_level=self.log_level)
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except BaseException:
+            logger.exception("Error en el worker")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def reload(self, force: bool = False):
+        try:
+            snapshot = self.cache.reload()
+        except Exception as e:
+            logger.error(f"Error al recargar los diccionarios: {str(e)}")
+            return
+        if snapshot.version == self.version and not force:
+            return
+        self.version = snapshot.version
+        self.generation += 1
+        gc.freeze()
+        logger.info(f"Generación {self.generation}: versión {self.version}; sustituyendo workers")
+        for pid, generation in list(self.workers.items()):
+            if self._stopping:
+                return
+            if generation < self.generation:
+                # Primero el nuevo, para no perder capacidad mientras el antiguo termina
+                self.spawn()
+                self.stop_worker(pid)
+
+    def stop_worker(self, pid: int):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while time.monotonic() < deadline:
+            finished, _ = os.waitpid(pid, os.WNOHANG)
+            if finished:
+                break
+            time.sleep(0.1)
+        else:
+            logger.warning(f"El worker {pid} no terminó en {self.graceful_timeout} s; se mata")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.forget_worker(pid)
+
+    def forget_worker(self, pid: int) -> bool:
+        """Quita el worker de la lista y sus indicadores (gauges) de las métricas."""
+        # prometheus_client decide al importarse si usa PROMETHEUS_MULTIPROC_DIR: no se
+        # importa en serve.py hasta que main() lo ha definido
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+        return self.workers.pop(pid, None) is not None
+
+    def stop_all(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+
+    def reap(self):
+        """Sustituye los workers que han terminado sin que se les pidiera."""
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                return
+            if self.forget_worker(pid) and not self._stopping:
+                logger.error(f"El worker {pid} terminó inesperadamente (estado {status}); creando otro")
+                self.spawn()
+
+    def _on_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--graceful-timeout", type=float, default=SERVE_GRACEFUL_TIMEOUT)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    sock = bind_socket(args.host, args.port)
+    # Tiene que estar definido antes de crear las métricas, es decir, antes de importar la aplicación
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    temporary = not metrics_dir
+    if temporary:
+        metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="proofmaster-metrics-")
+    else:
+        # Los ficheros de una ejecución anterior sumarían valores que ya no existen
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(metrics_dir, name))
+    # La aplicación se importa en el padre para que los workers compartan también el código
+    import main as app_module
+
+    try:
+        Supervisor(app_module, sock, args.workers, args.graceful_timeout, args.log_level).run()
+    finally:
+        if temporary:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,9 @@
-import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
+from dictionary_store import SupabaseStore
+from import_dictionary import import_rows
+from supabase_client import get_client
 
-# Cargar variables desde .env
-load_dotenv()
-
-# Configurar claves de Supabase
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-# Inicializar el cliente de Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Cliente de Supabase compartido (lee SUPABASE_URL y SUPABASE_KEY de .env)
+supabase = get_client()
 
 # Correcciones personalizadas para añadir
 custom_corrections = [
@@ -49,27 +42,10 @@ def upsert_corrections():
             # Aquí podrías añadir código para crear la tabla si no existe
             # Pero esto depende de cómo esté configurado Supabase
         
-        # Insertar o actualizar correcciones
-        for correction in custom_corrections:
-            print(f"Procesando: {correction['original']} -> {correction['suggestion']}")
-            
-            # Verificar si la corrección ya existe
-            response = supabase.table("spellcheck") \
-                .select("*") \
-                .eq("original", correction["original"]) \
-                .execute()
-                
-            if len(response.data) > 0:
-                print(f"  Actualizando corrección existente...")
-                supabase.table("spellcheck") \
-                    .update({"suggestion": correction["suggestion"]}) \
-                    .eq("original", correction["original"]) \
-                    .execute()
-            else:
-                print(f"  Insertando nueva corrección...")
-                supabase.table("spellcheck") \
-                    .insert(correction) \
-                    .execute()
+        # Insertar o actualizar todas las correcciones con upserts en bloque (on_conflict sobre "original")
+        print(f"Importando {len(custom_corrections)} correcciones...")
+        summary = import_rows(SupabaseStore(supabase), "spellcheck", custom_corrections)
+        print(f"  {summary['imported']} correcciones insertadas o actualizadas")
                     
         print("\nProceso completado con éxito!")
         
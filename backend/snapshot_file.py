@@ -0,0 +1,123 @@
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import time
+from typing import List, Tuple
+
+from matching import MATCH_THRESHOLD, MAX_EDIT_DISTANCE
+from scoring import SPELLCHECK_SCORER
+from tokenizer import TOKEN_PATTERN
+
+# Cabecera: identificador, versión del formato, número de buffers, longitud del pickle y SHA-256 del resto
+SNAPSHOT_MAGIC = b"PMDICT\r\n"
+SNAPSHOT_FORMAT_VERSION = 4
+_HEADER = struct.Struct("<8sIIQ32s")
+# Posición y longitud de cada buffer dentro del fichero
+_BUFFER_ENTRY = struct.Struct("<QQ")
+# Los buffers se alinean para que numpy pueda usarlos directamente
+_ALIGNMENT = 64
+
+
+class SnapshotFileError(Exception):
+    """El fichero de snapshot no existe, está dañado o se compiló con otra configuración."""
+
+
+def index_params() -> dict:
+    """Parámetros con los que se construyen los índices; si cambian, el fichero no sirve."""
+    return {
+        "max_edit_distance": MAX_EDIT_DISTANCE,
+        "match_threshold": MATCH_THRESHOLD,
+        "scorer": SPELLCHECK_SCORER,
+        # Los nombres de varias palabras de towns se indexan ya separados en tokens
+        "tokenizer": TOKEN_PATTERN.pattern,
+    }
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def save_snapshot(snapshot, path: str):
+    """Escribe el snapshot (diccionarios e índices ya construidos) en un fichero versionado.
+
+    Los arrays de numpy de los índices se guardan fuera del pickle (protocolo 5), tal
+    cual están en memoria, para que load_snapshot los lea del mmap sin copiarlos. Se
+    escribe en un fichero temporal y se renombra, así que los procesos que estén leyendo
+    el fichero anterior no ven nunca uno a medias.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    payload = pickle.dumps(
+        {"snapshot": snapshot, "params": index_params(), "compiled_at": time.time()},
+        protocol=5,
+        buffer_callback=buffers.append,
+    )
+    raws = [buffer.raw() for buffer in buffers]
+
+    table_size = _BUFFER_ENTRY.size * len(raws)
+    offset = _HEADER.size + table_size + len(payload)
+    entries = []
+    for raw in raws:
+        offset = _aligned(offset)
+        entries.append((offset, raw.nbytes))
+        offset += raw.nbytes
+
+    digest = hashlib.sha256()
+    body = [b"".join(_BUFFER_ENTRY.pack(*entry) for entry in entries), payload]
+    position = _HEADER.size + table_size + len(payload)
+    for (start, _), raw in zip(entries, raws):
+        body.append(b"\0" * (start - position))
+        body.append(raw)
+        position = start + raw.nbytes
+    for part in body:
+        digest.update(part)
+
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(raws), len(payload), digest.digest())
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for part in body:
+            f.write(part)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str) -> Tuple[object, float]:
+    """Lee un fichero de snapshot con mmap y devuelve (snapshot, fecha de compilación).
+
+    Los arrays de los índices apuntan directamente al mmap (de solo lectura), así que
+    los workers que cargan el mismo fichero comparten esas páginas. Lanza
+    SnapshotFileError si el fichero no existe, la suma de comprobación no coincide o se
+    compiló con otra versión del formato o con otros parámetros de los índices.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise SnapshotFileError(f"No se pudo leer el snapshot: {str(e)}")
+
+    view = memoryview(data)
+    if len(view) < _HEADER.size:
+        raise SnapshotFileError("Fichero de snapshot incompleto")
+    magic, format_version, buffer_count, payload_length, checksum = _HEADER.unpack_from(view)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotFileError("No es un fichero de snapshot de diccionarios")
+    if format_version != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotFileError(f"Versión de formato {format_version} no soportada")
+    if hashlib.sha256(view[_HEADER.size:]).digest() != checksum:
+        raise SnapshotFileError("La suma de comprobación del snapshot no coincide")
+
+    payload_start = _HEADER.size + _BUFFER_ENTRY.size * buffer_count
+    buffers = []
+    for i in range(buffer_count):
+        start, length = _BUFFER_ENTRY.unpack_from(view, _HEADER.size + _BUFFER_ENTRY.size * i)
+        buffers.append(view[start:start + length])
+    try:
+        content = pickle.loads(view[payload_start:payload_start + payload_length], buffers=buffers)
+    except Exception as e:
+        raise SnapshotFileError(f"No se pudo leer el snapshot: {str(e)}")
+    if content["params"] != index_params():
+        raise SnapshotFileError("El snapshot se compiló con otros parámetros de los índices")
+    return content["snapshot"], content["compiled_at"]
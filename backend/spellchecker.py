@@ -0,0 +1,736 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from fuzzywuzzy import fuzz
+
+from dictionary import DictionarySnapshot
+from lexicon import english_lexicon
+from lru import LRUCache
+from scoring import SPELLCHECK_SCORER, SPELLCHECK_SCORING_BACKEND
+from tokenizer import tokenize_spans
+
+logger = logging.getLogger(__name__)
+
+# Modo de búsqueda aproximada en la tabla spellcheck: "ratio" (compatible con fuzz.ratio >= 85)
+# o "distance" (corrección más cercana dentro de SPELLCHECK_MAX_EDIT_DISTANCE)
+CORRECTION_MATCH_MODE = os.getenv("SPELLCHECK_CORRECTION_MODE", "ratio").lower()
+
+# La puntuación en bloque se usa si se pide expresamente o si el scorer no es fuzz.ratio,
+# porque los índices por palabra solo garantizan resultados exactos con fuzz.ratio
+USE_BULK_SCORING = SPELLCHECK_SCORING_BACKEND == "bulk" or SPELLCHECK_SCORER != "ratio"
+
+# Lista de palabras de jerga o abreviaturas que no deben corregirse
+SLANG_WORDS = ["btw", "asap", "lol", "omg", "idk", "gonna", "wanna", "gotta"]
+
+# Diccionario de correcciones comunes para errores frecuentes
+# Solo lo usaremos como respaldo si FuzzyWuzzy no encuentra una buena corrección
+COMMON_ERRORS = {
+    "wasnt": "wasn't",
+    "becuase": "because",
+    "alot": "a lot",
+    "problm": "problem",
+    "im": "I'm",
+    "speling": "spelling",
+    "grammer": "grammar",
+    "amazng": "amazing",
+    "definately": "definitely",
+    "idntify": "identify",
+    "misstakes": "mistakes",
+    "projct": "project",
+    "documntation": "documentation",
+    "erors": "errors",
+    "versiun": "version",
+    "thnak": "thank",
+    "usefull": "useful",
+}
+
+# Separadores en los que se puede cortar un texto recibido por partes sin partir un token
+STREAM_SEPARATORS = " \n\t\r\f\v"
+
+# Caracteres máximos retenidos entre dos partes; al superarlos se corrige lo recibido
+# aunque se parta un token o un nombre de varias palabras
+STREAM_MAX_PENDING = 64 * 1024
+
+# Número máximo de palabras distintas recordadas durante una corrección en streaming
+STREAM_MAX_DECISIONS = 50000
+
+# Número máximo de decisiones por palabra guardadas en la caché compartida (0 la desactiva)
+WORD_CACHE_SIZE = int(os.getenv("WORD_CACHE_SIZE", "100000"))
+
+# Caracteres máximos de un bloque de la corrección incremental; los párrafos más largos se
+# parten por el último espacio antes del límite
+RECHECK_BLOCK_CHARS = int(os.getenv("RECHECK_BLOCK_CHARS", "2000"))
+
+# Número máximo de bloques corregidos guardados para la corrección incremental (0 la desactiva)
+RECHECK_CACHE_BLOCKS = int(os.getenv("RECHECK_CACHE_BLOCKS", "5000"))
+
+# Línea en blanco (y los espacios que la siguen): separa párrafos
+_PARAGRAPH_BREAK = re.compile(r"\n[^\S\n]*\n\s*")
+_WHITESPACE = re.compile(r"\s")
+
+
+class WordDecision(NamedTuple):
+    """Resultado de corregir una palabra."""
+    corrected: str
+    code_line: str
+    suggestion: Optional[dict]
+    # Origen de la decisión: "custom", "town", "spellcheck-fuzzy" o "none"
+    source: str
+
+
+# Caché LRU de decisiones por (versión del snapshot, palabra) compartida por todas las
+# peticiones del worker. Como la clave incluye la versión, una recarga de los diccionarios
+# invalida las entradas antiguas sin tener que vaciar la caché.
+word_cache: "LRUCache[Tuple[str, str], WordDecision]" = LRUCache(WORD_CACHE_SIZE)
+
+
+def _literal_decision(word: str, snapshot: DictionarySnapshot) -> Optional[WordDecision]:
+    # Si no es una palabra alfabética (signos de puntuación, números, etc.)
+    if not word.isalpha():
+        return WordDecision(word, word, None, "none")
+
+    # Verificar si la palabra está exactamente en la lista de towns (no necesita corrección)
+    if word in snapshot.town_index:
+        return WordDecision(word, word + " (town/city, exact match)", None, "none")
+    return None
+
+
+def _custom_decision(word: str, snapshot: DictionarySnapshot) -> Optional[WordDecision]:
+    # Verificar correcciones personalizadas de Supabase (prioridad máxima)
+    suggestion_text = snapshot.custom_replacements.get(word.lower())
+    if suggestion_text is None:
+        return None
+    return WordDecision(suggestion_text, f"{word} -> {suggestion_text} (custom)", {
+        "original": word,
+        "suggestion": suggestion_text,
+        "similarity": 1.0,
+        "correction_type": "normal"
+    }, "custom")
+
+
+def _slang_decision(word: str, snapshot: DictionarySnapshot) -> Optional[WordDecision]:
+    # Mantener la palabra original si no se encuentra en las tablas de Supabase
+    # No usamos el diccionario general ni correcciones gramaticales
+
+    # No corregir palabras de jerga o abreviaturas comunes
+    if word.lower() in SLANG_WORDS or len(word) < 3:
+        return WordDecision(word, word, None, "none")
+    return None
+
+
+def _normalized_town_decision(word: str, snapshot: DictionarySnapshot) -> Optional[WordDecision]:
+    # El mismo nombre de pueblo/ciudad con otras mayúsculas o sin acentos: usar la grafía de towns
+    town_name = snapshot.town_index.canonical(word)
+    if town_name is not None:
+        return _town_decision(word, town_name, 1.0)
+    return None
+
+
+def _lexicon_decision(word: str, snapshot: DictionarySnapshot) -> Optional[WordDecision]:
+    # Palabra inglesa conocida: se deja como está sin buscar coincidencias aproximadas
+    if english_lexicon.enabled and word in english_lexicon:
+        return WordDecision(word, word, None, "none")
+    return None
+
+
+# Comprobaciones sin búsqueda aproximada, en orden de prioridad, con la etapa a la que se atribuye su tiempo
+EXACT_STAGES = (
+    ("exact", _literal_decision),
+    ("custom", _custom_decision),
+    ("slang", _slang_decision),
+    ("exact", _normalized_town_decision),
+    ("lexicon", _lexicon_decision),
+)
+
+
+def _town_decision(original: str, town_name: str, similarity: float) -> WordDecision:
+    return WordDecision(town_name, f"{original} -> {town_name} (town/city, {similarity})", {
+        "original": original,
+        "suggestion": town_name,
+        "similarity": similarity,
+        "correction_type": "town"
+    }, "town")
+
+
+def _accepts_town(word: str, town_match: Optional[Tuple[str, int]]) -> bool:
+    return town_match is not None and town_match[0] != word
+
+
+def _closest_correction(word_lower: str, snapshot: DictionarySnapshot) -> Optional[Tuple[str, int]]:
+    # Corrección más cercana por distancia de edición, sin umbral de fuzz.ratio.
+    # Se permite un error por cada 4 letras para no corregir palabras cortas.
+    correction_match = snapshot.correction_index.lookup(word_lower, max_distance=len(word_lower) // 4)
+    if correction_match:
+        correction_match = (correction_match[0], fuzz.ratio(word_lower, correction_match[0]))
+    return correction_match
+
+
+def fuzzy_decision(
+    word: str,
+    snapshot: DictionarySnapshot,
+    town_match: Optional[Tuple[str, int]],
+    correction_match: Optional[Tuple[str, int]],
+) -> WordDecision:
+    """Decisión a partir de las coincidencias aproximadas encontradas para la palabra."""
+    original_word = word
+    word_lower = word.lower()
+
+    if _accepts_town(word, town_match):
+        best_town_match, best_town_score = town_match
+
+        # Solo corregir si la puntuación es lo suficientemente alta (85% o más)
+        return _town_decision(original_word, best_town_match, round(best_town_score / 100.0, 2))
+
+    if correction_match:
+        best_match, best_score = correction_match
+
+        if best_match != word_lower:
+            suggestion_text = snapshot.custom_replacements[best_match]
+
+            # Preservar capitalización original
+            if word.istitle() and not suggestion_text.startswith("I"):
+                suggestion_text = suggestion_text.title()
+            elif word.isupper():
+                suggestion_text = suggestion_text.upper()
+
+            # Calcular similitud normalizada (0.0 - 1.0)
+            similarity = round(best_score / 100.0, 2)
+
+            return WordDecision(suggestion_text, f"{original_word} -> {suggestion_text} (spellcheck, {similarity})", {
+                "original": original_word,
+                "suggestion": suggestion_text,
+                "similarity": similarity,
+                "correction_type": "normal"
+            }, "spellcheck-fuzzy")
+
+    # Reutilizar la coincidencia en towns calculada antes
+    if town_match:
+        best_match, best_score = town_match
+        suggestion_text = best_match
+
+        # Preservar capitalización original
+        if word.istitle() and not suggestion_text.startswith("I"):
+            suggestion_text = suggestion_text.title()
+        elif word.isupper():
+            suggestion_text = suggestion_text.upper()
+
+        # Calcular similitud normalizada (0.0 - 1.0)
+        similarity = round(best_score / 100.0, 2)
+
+        return WordDecision(suggestion_text, f"{original_word} -> {suggestion_text} (towns, {similarity})", {
+            "original": original_word,
+            "suggestion": suggestion_text,
+            "similarity": similarity,
+            "correction_type": "normal"
+        }, "town")
+
+    # Si llegamos aquí, mantener la palabra original
+    return WordDecision(word, word, None, "none")
+
+
+def _add_timing(timings: Optional[Dict[str, float]], stage: str, started: float):
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def _add_tokens(timings: Optional[Dict[str, float]], count: int):
+    if timings is not None:
+        timings["tokens"] = timings.get("tokens", 0) + count
+
+
+def resolve_words(
+    words,
+    snapshot: DictionarySnapshot,
+    decisions: Dict[str, WordDecision],
+    timings: Optional[Dict[str, float]] = None,
+):
+    """Decide todas las palabras distintas que todavía no están en decisions.
+
+    Primero se resuelven las palabras exactas (caché compartida, towns, spellcheck, jerga)
+    y después las que necesitan búsqueda aproximada: todas contra towns y, las que no se
+    aceptan como pueblo/ciudad, contra spellcheck. Con la puntuación en bloque cada lista
+    se compara en una sola llamada a rapidfuzz.cdist. Si se pasa timings, se acumulan en
+    él los segundos de cada etapa ("exact", "custom", "slang", "lexicon", "fuzzy_town" y
+    "fuzzy_corrections").
+    """
+    started = time.perf_counter()
+    pending = []
+    for word in set(words):
+        if word in decisions:
+            continue
+        decision = word_cache.get((snapshot.version, word))
+        if decision is None:
+            pending.append(word)
+        else:
+            decisions[word] = decision
+    _add_timing(timings, "exact", started)
+
+    # Cada comprobación exacta se aplica a las palabras que no ha resuelto la anterior
+    for stage, check in EXACT_STAGES:
+        if not pending:
+            return
+        started = time.perf_counter()
+        remaining = []
+        for word in pending:
+            decision = check(word, snapshot)
+            if decision is None:
+                remaining.append(word)
+            else:
+                word_cache.put((snapshot.version, word), decision)
+                decisions[word] = decision
+        pending = remaining
+        _add_timing(timings, stage, started)
+    if not pending:
+        return
+
+    # Verificar si puede ser un nombre de pueblo/ciudad. La búsqueda se hace una sola
+    # vez por palabra: fuzz.ratio ya compara en minúsculas.
+    started = time.perf_counter()
+    if USE_BULK_SCORING:
+        names = snapshot.town_matcher.choices
+        town_matches = [
+            (names[found[0]], found[1]) if found else None
+            for found in snapshot.town_scorer.best_matches(pending)
+        ]
+    else:
+        town_matches = [snapshot.town_matcher.extract_one(word) for word in pending]
+    _add_timing(timings, "fuzzy_town", started)
+
+    # Solo se buscan correcciones para las palabras que no se han aceptado como pueblo/ciudad
+    started = time.perf_counter()
+    needs_correction = [i for i, word in enumerate(pending) if not _accepts_town(word, town_matches[i])]
+    correction_matches: List[Optional[Tuple[str, int]]] = [None] * len(pending)
+    if CORRECTION_MATCH_MODE == "distance":
+        for i in needs_correction:
+            correction_matches[i] = _closest_correction(pending[i].lower(), snapshot)
+    elif USE_BULK_SCORING:
+        keys = snapshot.correction_index.choices
+        found = snapshot.correction_scorer.best_matches([pending[i].lower() for i in needs_correction])
+        for i, match in zip(needs_correction, found):
+            correction_matches[i] = (keys[match[0]], match[1]) if match else None
+    else:
+        # Modo compatible: mismo resultado que extractOne con fuzz.ratio (85% o más)
+        for i in needs_correction:
+            correction_matches[i] = snapshot.correction_index.extract_one(pending[i].lower())
+    _add_timing(timings, "fuzzy_corrections", started)
+
+    for word, town_match, correction_match in zip(pending, town_matches, correction_matches):
+        decision = fuzzy_decision(word, snapshot, town_match, correction_match)
+        word_cache.put((snapshot.version, word), decision)
+        decisions[word] = decision
+
+
+class TokenRecord(NamedTuple):
+    """Corrección aplicada a un token del texto."""
+    # Posición del token dentro del texto (0 es el primer token); en nombres de varias palabras, la del primero
+    offset: int
+    # Posición [start, end) en caracteres dentro del texto original (en varias palabras, del primero al último)
+    start: int
+    end: int
+    original: str
+    replacement: str
+    # Origen de la decisión, igual que en WordDecision
+    source: str
+    # Similitud normalizada (0.0 - 1.0) si hay sugerencia
+    score: Optional[float]
+    code_line: str
+    suggestion: Optional[dict]
+
+    @property
+    def is_town_match(self) -> bool:
+        """Sugerencia aceptada como nombre de pueblo/ciudad."""
+        return self.suggestion is not None and self.suggestion.get("correction_type") == "town"
+
+
+def correct_tokens(
+    text: str,
+    words: List[str],
+    spans: List[Tuple[int, int]],
+    snapshot: DictionarySnapshot,
+    decisions: Dict[str, WordDecision],
+    start: int = 0,
+    timings: Optional[Dict[str, float]] = None,
+    base: int = 0,
+) -> List[TokenRecord]:
+    """Aplica las decisiones de corrección a los tokens de text; start es la posición del primero.
+
+    words y spans son los tokens y sus posiciones en text (tokenize_spans).
+
+    base es la posición de text dentro del documento completo; las sugerencias llevan
+    start y end en el documento. Los nombres de pueblos/ciudades de varias palabras se
+    reconocen antes que las palabras sueltas y producen un único registro para todos sus tokens.
+    """
+    started = time.perf_counter()
+    phrases = snapshot.town_index.find_phrases(words)
+    if phrases and "\n" in text:
+        # Solo se aceptan los nombres escritos en una misma línea
+        phrases = snapshot.town_index.find_phrases(words, _line_starts(text, spans))
+    _add_timing(timings, "exact", started)
+    if phrases:
+        in_phrase = set()
+        for i, (n, _) in phrases.items():
+            in_phrase.update(range(i, i + n))
+        resolve_words((word for i, word in enumerate(words) if i not in in_phrase), snapshot, decisions, timings)
+    else:
+        resolve_words(words, snapshot, decisions, timings)
+
+    records = []
+    i = 0
+    while i < len(words):
+        phrase = phrases.get(i)
+        if phrase is not None:
+            n, town_name = phrase
+            # Los tokens del nombre tal como aparecen, con un solo espacio donde había espacios
+            parts = [words[i]]
+            for k in range(i + 1, i + n):
+                if spans[k][0] > spans[k - 1][1]:
+                    parts.append(" ")
+                parts.append(words[k])
+            records.append(_phrase_record(
+                start + i, base + spans[i][0], base + spans[i + n - 1][1], "".join(parts), town_name
+            ))
+            i += n
+            continue
+        word = words[i]
+        decision = decisions[word]
+        token_start, token_end = base + spans[i][0], base + spans[i][1]
+        suggestion = decision.suggestion
+        if suggestion is not None:
+            # Cada sugerencia de la respuesta es un diccionario propio
+            suggestion = {**suggestion, "start": token_start, "end": token_end}
+        records.append(TokenRecord(
+            start + i,
+            token_start,
+            token_end,
+            word,
+            decision.corrected,
+            decision.source,
+            suggestion["similarity"] if suggestion is not None else None,
+            decision.code_line,
+            suggestion,
+        ))
+        i += 1
+    return records
+
+
+def _line_starts(text: str, spans: List[Tuple[int, int]]) -> Set[int]:
+    """Posiciones de los tokens separados del anterior por un salto de línea."""
+    starts = set()
+    position = 0
+    for i, (token_start, token_end) in enumerate(spans):
+        if text.find("\n", position, token_start) >= 0:
+            starts.add(i)
+        position = token_end
+    return starts
+
+
+def _phrase_record(offset: int, start: int, end: int, original: str, town_name: str) -> TokenRecord:
+    if original == town_name:
+        return TokenRecord(
+            offset, start, end, original, town_name, "none", None, town_name + " (town/city, exact match)", None
+        )
+    decision = _town_decision(original, town_name, 1.0)
+    suggestion = {**decision.suggestion, "start": start, "end": end}
+    return TokenRecord(offset, start, end, original, town_name, decision.source, 1.0, decision.code_line, suggestion)
+
+
+def build_response(text: str, records: List[TokenRecord], base: int = 0) -> dict:
+    """Construye la respuesta de /spellcheck recorriendo los registros una sola vez.
+
+    El texto corregido se obtiene sustituyendo en el texto original solo los tokens que
+    cambian, así que se conservan los espacios, los saltos de línea y todo lo demás.
+    base es la posición de text dentro del documento, como en correct_tokens.
+    """
+    suggestions = []
+    town_matches = []
+    pieces = []
+    position = 0
+    full_corrected_code = []  # Lista para almacenar las palabras corregidas y el código
+    for record in records:
+        if record.replacement != record.original:
+            pieces.append(text[position:record.start - base])
+            pieces.append(record.replacement)
+            position = record.end - base
+        full_corrected_code.append(record.code_line)
+        if record.suggestion is not None:
+            suggestions.append(record.suggestion)
+            # Filtrar sugerencias de pueblos/ciudades para la respuesta
+            if record.is_town_match:
+                town_matches.append(record.suggestion)
+    pieces.append(text[position:])
+
+    return {
+        "suggestions": suggestions,
+        "corrected_text": "".join(pieces),
+        "full_corrected_code": "\n".join(full_corrected_code),  # Formato de código corregido con las sugerencias
+        "town_matches": town_matches
+    }
+
+
+def check_text(
+    text: str,
+    snapshot: DictionarySnapshot,
+    decisions: Optional[Dict[str, WordDecision]] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> dict:
+    """Corrige un texto completo y construye la respuesta de /spellcheck.
+
+    decisions guarda la corrección de cada palabra distinta; se puede compartir entre
+    varios textos corregidos con el mismo snapshot para no repetir las búsquedas.
+    timings, si se pasa, acumula los segundos de cada etapa ("tokenize", "exact",
+    "custom", "slang", "lexicon", "fuzzy_town", "fuzzy_corrections" y "build") y el número de
+    tokens en "tokens".
+    """
+    # Extraer palabras, números y signos de puntuación del texto con sus posiciones
+    started = time.perf_counter()
+    words, spans = tokenize_spans(text)
+    _add_timing(timings, "tokenize", started)
+    _add_tokens(timings, len(words))
+    logger.info(f"Texto a analizar tiene {len(words)} palabras/tokens")
+    records = correct_tokens(text, words, spans, snapshot, {} if decisions is None else decisions, timings=timings)
+    started = time.perf_counter()
+    response = build_response(text, records)
+    _add_timing(timings, "build", started)
+    return response
+
+
+def check_batch(
+    texts: List[str],
+    snapshot: DictionarySnapshot,
+    timings: Optional[Dict[str, float]] = None,
+) -> List[dict]:
+    """Corrige varios textos con el mismo snapshot evaluando cada palabra distinta una sola vez."""
+    decisions: Dict[str, WordDecision] = {}
+    started = time.perf_counter()
+    tokenized = [tokenize_spans(text) for text in texts]
+    _add_timing(timings, "tokenize", started)
+    _add_tokens(timings, sum(len(words) for words, _ in tokenized))
+    # Todas las palabras sin resolver del lote se buscan juntas (y en la misma matriz con la puntuación en bloque)
+    resolve_words([word for words, _ in tokenized for word in words], snapshot, decisions, timings)
+    results = []
+    for text, (words, spans) in zip(texts, tokenized):
+        records = correct_tokens(text, words, spans, snapshot, decisions, timings=timings)
+        started = time.perf_counter()
+        results.append(build_response(text, records))
+        _add_timing(timings, "build", started)
+    logger.info(f"Lote de {len(results)} documentos con {len(decisions)} palabras/tokens distintos")
+    return results
+
+
+class StreamingCheck:
+    """Corrige un texto que llega por partes y devuelve eventos a medida que avanza.
+
+    Los tokens nunca contienen espacios, así que el texto solo se procesa hasta el
+    último espacio recibido; el resto se guarda hasta que llegue la siguiente parte,
+    junto con las últimas palabras que podrían empezar un nombre de pueblo/ciudad de
+    varias palabras. Los segmentos de texto corregido concatenados dan
+    el mismo resultado que check_text.
+    """
+
+    def __init__(self, snapshot: DictionarySnapshot):
+        self.snapshot = snapshot
+        self.decisions: Dict[str, WordDecision] = {}
+        self.tokens = 0
+        # Caracteres ya corregidos: posición del siguiente fragmento dentro del documento
+        self.chars = 0
+        self.suggestions = 0
+        self._pending = ""
+
+    def feed(self, text: str) -> List[dict]:
+        """Añade texto y devuelve los eventos de la parte que ya se puede corregir."""
+        self._pending += text
+        cut = max(self._pending.rfind(c) for c in STREAM_SEPARATORS)
+        if cut < 0:
+            # Sin espacios no hay límite seguro; solo se corta si el fragmento crece demasiado
+            if len(self._pending) < STREAM_MAX_PENDING:
+                return []
+            cut = len(self._pending) - 1
+        end = self._phrase_cut(self._pending[:cut + 1])
+        if len(self._pending) - end >= STREAM_MAX_PENDING:
+            # Lo retenido nunca supera STREAM_MAX_PENDING, aunque se parta un nombre o un token
+            end = cut + 1
+        ready, self._pending = self._pending[:end], self._pending[end:]
+        return self._check(ready)
+
+    def _phrase_cut(self, text: str) -> int:
+        """Posición hasta la que se puede corregir text sin partir un nombre de varias palabras.
+
+        Las últimas palabras podrían empezar un nombre que sigue en la parte siguiente: se
+        retienen las que le faltarían al nombre más largo y, si una de ellas termina un
+        nombre ya completo, desde el principio de ese nombre. Solo cuenta la última
+        línea, porque un nombre no continúa en la línea siguiente.
+        """
+        town_index = self.snapshot.town_index
+        line_start = text.rfind("\n") + 1
+        line = text[line_start:]
+        words, spans = tokenize_spans(line)
+        hold = max(len(words) - (town_index.max_phrase_tokens - 1), 0)
+        if hold >= len(words):
+            return len(text)
+        for i, (n, _) in town_index.find_phrases(words).items():
+            if i < hold < i + n:
+                hold = i
+        return line_start + spans[hold][0]
+
+    def finish(self) -> List[dict]:
+        """Corrige el texto pendiente y añade el evento final con el resumen."""
+        events = self._check(self._pending)
+        self._pending = ""
+        events.append({
+            "type": "done",
+            "tokens": self.tokens,
+            "suggestions": self.suggestions,
+            "version": self.snapshot.version,
+        })
+        return events
+
+    def _check(self, text: str) -> List[dict]:
+        if not text:
+            return []
+        words, spans = tokenize_spans(text)
+        if not words:
+            # Solo espacios: se devuelven tal cual para que el texto concatenado sea el original
+            self.chars += len(text)
+            return [{"type": "text", "corrected_text": text, "full_corrected_code": ""}]
+        if len(self.decisions) > STREAM_MAX_DECISIONS:
+            self.decisions.clear()
+        records = correct_tokens(text, words, spans, self.snapshot, self.decisions, self.tokens, base=self.chars)
+        response = build_response(text, records, base=self.chars)
+
+        events = [
+            {"type": "suggestion", **suggestion}
+            for suggestion in response["suggestions"]
+        ]
+        code = response["full_corrected_code"]
+        if self.tokens:
+            code = "\n" + code
+        events.append({"type": "text", "corrected_text": response["corrected_text"], "full_corrected_code": code})
+        self.tokens += len(words)
+        self.chars += len(text)
+        self.suggestions += len(response["suggestions"])
+        return events
+
+
+def split_blocks(text: str, max_chars: int = RECHECK_BLOCK_CHARS) -> List[str]:
+    """Divide el texto en párrafos (de como mucho max_chars) sin partir ningún token.
+
+    Cada bloque incluye los espacios que lo siguen, así que los bloques concatenados
+    son el texto original.
+    """
+    blocks: List[str] = []
+    start = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        _add_block(blocks, text[start:match.end()], max_chars)
+        start = match.end()
+    _add_block(blocks, text[start:], max_chars)
+    return blocks
+
+
+def _add_block(blocks: List[str], block: str, max_chars: int):
+    while len(block) > max_chars:
+        cut = max(block.rfind(c, 0, max_chars) for c in STREAM_SEPARATORS)
+        if cut <= 0:
+            # Un token más largo que el bloque: se corta en el primer espacio que lo sigue
+            match = _WHITESPACE.search(block, max_chars)
+            if match is None:
+                break
+            cut = match.start()
+        blocks.append(block[:cut + 1])
+        block = block[cut + 1:]
+    if block:
+        blocks.append(block)
+
+
+class BlockResult(NamedTuple):
+    """Corrección de un bloque, con las posiciones relativas al inicio del bloque."""
+    corrected_text: str
+    full_corrected_code: str
+    suggestions: List[dict]
+    tokens: int
+
+
+def block_digest(block: str) -> bytes:
+    """Huella del contenido de un bloque para la caché de la corrección incremental."""
+    return hashlib.blake2b(block.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+# Caché LRU de bloques corregidos por (versión del snapshot, huella del contenido). No
+# depende de qué documento contiene el bloque ni de su posición: un párrafo que no cambia
+# entre dos envíos (o que se repite en otro documento) se reutiliza tal cual.
+block_cache: "LRUCache[Tuple[str, bytes], BlockResult]" = LRUCache(RECHECK_CACHE_BLOCKS)
+
+
+def check_blocks(
+    text: str,
+    snapshot: DictionarySnapshot,
+    cache: LRUCache = block_cache,
+    timings: Optional[Dict[str, float]] = None,
+) -> dict:
+    """Corrige el texto por bloques y solo vuelve a procesar los que no están en la caché.
+
+    La respuesta es la de check_text con dos campos más: blocks (bloques del texto) y
+    rechecked_blocks (los que se han corregido en esta llamada). Se diferencia de
+    check_text en que un nombre de pueblo/ciudad de varias palabras partido entre dos
+    párrafos no se reconoce. Las palabras de todos los bloques nuevos se resuelven juntas,
+    como en check_batch.
+    """
+    started = time.perf_counter()
+    blocks = split_blocks(text)
+    digests = [block_digest(block) for block in blocks]
+    results: List[Optional[BlockResult]] = [cache.get((snapshot.version, digest)) for digest in digests]
+    # Un bloque repetido dentro del mismo texto solo se corrige una vez
+    pending: Dict[bytes, int] = {}
+    for i, result in enumerate(results):
+        if result is None:
+            pending.setdefault(digests[i], i)
+    tokenized = {digest: tokenize_spans(blocks[i]) for digest, i in pending.items()}
+    _add_timing(timings, "tokenize", started)
+    _add_tokens(timings, sum(len(words) for words, _ in tokenized.values()))
+
+    decisions: Dict[str, WordDecision] = {}
+    resolve_words([word for words, _ in tokenized.values() for word in words], snapshot, decisions, timings)
+    computed: Dict[bytes, BlockResult] = {}
+    for digest, i in pending.items():
+        words, spans = tokenized[digest]
+        records = correct_tokens(blocks[i], words, spans, snapshot, decisions, timings=timings)
+        started = time.perf_counter()
+        response = build_response(blocks[i], records)
+        computed[digest] = BlockResult(
+            response["corrected_text"], response["full_corrected_code"], response["suggestions"], len(words)
+        )
+        cache.put((snapshot.version, digest), computed[digest])
+        _add_timing(timings, "build", started)
+
+    # Se unen los bloques desplazando las posiciones de las sugerencias al documento completo
+    started = time.perf_counter()
+    suggestions = []
+    town_matches = []
+    corrected = []
+    code = []
+    offset = 0
+    for block, digest, result in zip(blocks, digests, results):
+        if result is None:
+            result = computed[digest]
+        corrected.append(result.corrected_text)
+        if result.tokens:
+            code.append(result.full_corrected_code)
+        for suggestion in result.suggestions:
+            suggestion = {**suggestion, "start": suggestion["start"] + offset, "end": suggestion["end"] + offset}
+            suggestions.append(suggestion)
+            if suggestion.get("correction_type") == "town":
+                town_matches.append(suggestion)
+        offset += len(block)
+    _add_timing(timings, "build", started)
+    logger.info(f"Texto dividido en {len(blocks)} bloques; {len(pending)} corregidos de nuevo")
+    return {
+        "suggestions": suggestions,
+        "corrected_text": "".join(corrected),
+        "full_corrected_code": "\n".join(code),
+        "town_matches": town_matches,
+        "blocks": len(blocks),
+        "rechecked_blocks": len(pending),
+    }
@@ -0,0 +1,37 @@
+import os
+import threading
+from typing import Optional
+
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+_client: Optional[Client] = None
+_lock = threading.Lock()
+
+
+def get_client() -> Client:
+    """Cliente de Supabase compartido por todo el proceso (API, autenticación y scripts).
+
+    Se crea la primera vez que se pide, así que importar un módulo no abre conexiones ni
+    exige SUPABASE_URL cuando los diccionarios se leen de otro almacén. Todas las
+    consultas comparten el mismo cliente HTTP de PostgREST y su pool de conexiones.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                load_dotenv()
+                _client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    return _client
+
+
+def _forget_client():
+    # Un proceso hijo (workers de serve.py) no debe reutilizar las conexiones HTTP abiertas por el padre
+    global _client, _lock
+    _client = None
+    _lock = threading.Lock()
+
+
+# os.register_at_fork solo existe en Unix (serve.py tampoco funciona en Windows)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client)
@@ -0,0 +1,214 @@
+import json
+import os
+from collections import Counter
+
+# La API se prueba sin Supabase, con las tablas en memoria
+os.environ.setdefault("DICTIONARY_STORE", "memory")
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+
+import main
+import spellchecker
+from executors import ConcurrencyLimiter, Overloaded, correction_limiter
+from lru import LRUCache
+from response_cache import ResponseCache
+
+
+@pytest.fixture(scope="module")
+def app_client():
+    # Al cerrar la aplicación se apagan los pools de executors: se arranca una sola vez
+    main.app.dependency_overrides[main.conditional_auth] = lambda: None
+    with TestClient(main.app) as client:
+        yield client
+    main.app.dependency_overrides.clear()
+
+
+@pytest.fixture()
+def client(app_client, monkeypatch):
+    main.dictionary_store.upsert("spellcheck", [{"original": "becuase", "suggestion": "because"}])
+    main.dictionary_store.upsert("towns", [{"name": "Springfield"}])
+    main.dictionary_cache.reload()
+    monkeypatch.setattr(main, "response_cache", ResponseCache(True, 1024 * 1024, 60))
+    return app_client
+
+
+def test_spellcheck_returns_304_for_matching_etag(client):
+    first = client.post("/spellcheck", json={"text": "becuase springfeld"})
+    assert first.status_code == 200
+    assert first.json()["corrected_text"] == "because Springfield"
+    etag = first.headers["etag"]
+
+    again = client.post("/spellcheck", json={"text": "becuase springfeld"}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+
+    weak = client.post("/spellcheck", json={"text": "becuase springfeld"}, headers={"If-None-Match": f'"x", W/{etag}'})
+    assert weak.status_code == 304
+
+    other = client.post("/spellcheck", json={"text": "becuase  springfeld"}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+    assert other.headers["etag"] != etag
+
+
+def test_etag_changes_with_dictionary_version(client):
+    etag = client.post("/spellcheck", json={"text": "becuase"}).headers["etag"]
+    main.dictionary_store.upsert("spellcheck", [{"original": "becuase", "suggestion": "since"}])
+    main.dictionary_cache.reload()
+    response = client.post("/spellcheck", json={"text": "becuase"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["corrected_text"] == "since"
+
+
+def test_response_cache_reuses_serialized_body(client):
+    first = client.post("/spellcheck", json={"text": "becuase springfeld"})
+    stats = main.response_cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (1, 0, 1)
+    assert stats["bytes"] == len(first.content)
+
+    second = client.post("/spellcheck", json={"text": "becuase springfeld"})
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert main.response_cache.stats()["hits"] == 1
+
+
+def test_full_limiter_returns_503_with_retry_after(client, monkeypatch):
+    limiter = ConcurrencyLimiter(limit=1, max_queue=0, queue_timeout=1)
+    # La única plaza está ocupada por otra corrección y no se admite cola
+    limiter.active = 1
+    monkeypatch.setattr(main, "correction_limiter", limiter)
+    for path, body in [("/spellcheck", {"text": "becuase"}), ("/spellcheck/batch", {"documents": [{"id": "a", "text": "becuase"}]})]:
+        response = client.post(path, json=body)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+    assert (limiter.rejected, limiter.active, limiter.waiting) == (2, 1, 0)
+
+
+def metric_samples(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+
+def test_metrics_report_stages_cache_and_limiter(client, monkeypatch):
+    before = metric_samples(client)
+    client.post("/spellcheck", json={"text": "becuase springfeld"})
+    client.post("/spellcheck", json={"text": "becuase springfeld"})
+    # El limitador real (el que publica sus métricas) sin plazas libres
+    monkeypatch.setattr(correction_limiter, "active", correction_limiter.limit + correction_limiter.max_queue)
+    assert client.post("/spellcheck", json={"text": "springfeld becuase"}).status_code == 503
+    monkeypatch.undo()
+    after = metric_samples(client)
+
+    def delta(name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        return after.get(key, 0) - before.get(key, 0)
+
+    assert delta("proofmaster_spellcheck_stage_seconds_count", stage="tokenize") == 1
+    assert delta("proofmaster_spellcheck_stage_seconds_count", stage="serialize") == 1
+    assert delta("proofmaster_spellcheck_tokens_count") == 1
+    assert delta("proofmaster_spellcheck_tokens_sum") == 2
+    # La petición rechazada también consultó la caché antes de pedir plaza
+    assert delta("proofmaster_response_cache_requests_total", result="miss") == 2
+    assert delta("proofmaster_response_cache_requests_total", result="hit") == 1
+    assert delta("proofmaster_limiter_rejected_total", pool="spellcheck") == 1
+    assert ("proofmaster_limiter_active", (("pool", "password_hash"),)) in after
+    assert ("proofmaster_limiter_queue_depth", (("pool", "spellcheck"),)) in after
+
+
+def test_batch_evaluates_each_distinct_word_once(client, monkeypatch):
+    evaluated = Counter()
+    first_stage, first_check = spellchecker.EXACT_STAGES[0]
+
+    def counting_check(word, snapshot):
+        evaluated[word] += 1
+        return first_check(word, snapshot)
+
+    monkeypatch.setattr(spellchecker, "EXACT_STAGES", ((first_stage, counting_check),) + spellchecker.EXACT_STAGES[1:])
+    # Sin la caché por palabra, solo la deduplicación del lote evita repetir las comprobaciones
+    monkeypatch.setattr(spellchecker, "word_cache", LRUCache(0))
+    documents = [
+        {"id": "a", "text": "becuase springfeld"},
+        {"id": "b", "text": "springfeld becuase becuase"},
+        {"id": "c", "text": "becuase"},
+    ]
+    response = client.post("/spellcheck/batch", json={"documents": documents})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["id"] for result in results] == ["a", "b", "c"]
+    assert [result["result"]["corrected_text"] for result in results] == [
+        "because Springfield", "Springfield because because", "because",
+    ]
+    assert evaluated == {"becuase": 1, "springfeld": 1}
+
+
+def test_batch_rejects_too_many_documents_and_repeated_ids(client, monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_DOCUMENTS", 2)
+    documents = [{"id": str(i), "text": "becuase"} for i in range(3)]
+    too_many = client.post("/spellcheck/batch", json={"documents": documents})
+    assert too_many.status_code == 400
+    assert client.post("/spellcheck/batch", json={"documents": documents[:2]}).status_code == 200
+
+    repeated = client.post("/spellcheck/batch", json={"documents": [documents[0], documents[0]]})
+    assert repeated.status_code == 400
+
+
+def stream_events(client, body):
+    response = client.post("/spellcheck/stream", content=body, headers={"Content-Type": "text/plain"})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+class FailingLimiter(ConcurrencyLimiter):
+    """Limitador que rechaza a partir de la plaza número fail_at (contando desde 1)."""
+
+    def __init__(self, fail_at: int):
+        super().__init__(limit=1, max_queue=0, queue_timeout=1)
+        self.fail_at = fail_at
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        if self.acquired >= self.fail_at:
+            raise Overloaded("Cola de correcciones llena")
+        await super().acquire()
+
+
+def test_stream_holds_the_slot_only_while_correcting(client, monkeypatch):
+    limiter = ConcurrencyLimiter(limit=1, max_queue=0, queue_timeout=1)
+    monkeypatch.setattr(main, "correction_limiter", limiter)
+    active_while_uploading = []
+
+    def body():
+        for part in [b"becuase ", b"spring", b"feld"]:
+            active_while_uploading.append(limiter.active)
+            yield part
+
+    events = stream_events(client, body())
+    assert active_while_uploading == [0, 0, 0]
+    assert "".join(event["corrected_text"] for event in events if event["type"] == "text") == "because Springfield"
+    assert events[-1]["type"] == "done"
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_stream_rejected_before_starting_returns_503(client, monkeypatch):
+    monkeypatch.setattr(main, "correction_limiter", FailingLimiter(fail_at=1))
+    response = client.post("/spellcheck/stream", content="becuase", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_stream_overloaded_midway_ends_with_error_event(client, monkeypatch):
+    limiter = FailingLimiter(fail_at=2)
+    monkeypatch.setattr(main, "correction_limiter", limiter)
+    events = stream_events(client, "becuase springfeld")
+    assert events[-1]["type"] == "error"
+    assert limiter.active == 0
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from auth_cache import RevocationList, UserCache, _timestamp
+
+
+def test_revocation_list_refreshes_after_interval():
+    rows = [{"token": "a", "expires_at": time.time() + 60}]
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return list(rows)
+
+    revoked = RevocationList(loader, refresh_seconds=0.05)
+    assert not revoked.loaded and revoked.needs_refresh()
+    revoked.refresh()
+    assert revoked.loaded and "a" in revoked and "b" not in revoked
+
+    rows.append({"token": "b", "expires_at": time.time() + 60})
+    revoked.refresh()
+    assert len(calls) == 1 and "b" not in revoked
+    time.sleep(0.06)
+    revoked.refresh()
+    assert len(calls) == 2 and "b" in revoked
+
+
+def test_revocation_list_keeps_revoked_tokens_until_they_expire():
+    rows = [
+        {"token": "a", "expires_at": time.time() + 60},
+        {"token": "old", "expires_at": "2000-01-01T00:00:00+00:00"},
+    ]
+    revoked = RevocationList(lambda: rows, refresh_seconds=0)
+    revoked.refresh()
+    assert "a" in revoked and "old" not in revoked
+    assert len(revoked) == 1
+    # Una lectura posterior sin la fila no deshace la revocación
+    rows = []
+    revoked.refresh()
+    assert "a" in revoked
+    revoked.add("c", time.time() + 60)
+    revoked.add("d", time.time() - 1)
+    assert "c" in revoked and "d" not in revoked
+
+
+@pytest.mark.parametrize("value", [
+    "2024-05-01T10:00:00.12+00:00",
+    "2024-05-01T10:00:00.120000+00:00",
+    "2024-05-01 12:00:00.12+02",
+    "2024-05-01T10:00:00.12Z",
+    "2024-05-01T10:00:00.12",
+])
+def test_timestamp_parses_postgres_formats(value):
+    assert _timestamp(value) == pytest.approx(1714557600.12)
+
+
+def test_revocation_list_counts_failed_refreshes():
+    def loader():
+        raise ConnectionError("down")
+
+    revoked = RevocationList(loader, refresh_seconds=0)
+    with pytest.raises(ConnectionError):
+        revoked.refresh()
+    assert revoked.refresh_failures == 1 and not revoked.loaded
+
+
+def test_user_cache_expires_evicts_and_invalidates():
+    cache = UserCache(ttl=0.05, maxsize=2)
+    cache.put("a@example.com", {"id": 1})
+    cache.put("b@example.com", {"id": 2})
+    assert cache.get("a@example.com") == {"id": 1}
+    # b es la menos usada: se descarta al añadir c
+    cache.put("c@example.com", {"id": 3})
+    assert cache.get("b@example.com") is None
+    assert cache.get("c@example.com") == {"id": 3}
+    cache.invalidate("c@example.com")
+    assert cache.get("c@example.com") is None
+    time.sleep(0.06)
+    assert cache.get("a@example.com") is None
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_user_cache_disabled_with_zero_ttl():
+    cache = UserCache(ttl=0, maxsize=10)
+    cache.put("a@example.com", {"id": 1})
+    assert cache.get("a@example.com") is None
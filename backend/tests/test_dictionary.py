@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+import spellchecker
+from benchmarks.incremental_sync import random_edits
+from benchmarks.pipeline import synthetic_document, synthetic_tables
+from dictionary import build_snapshot, store_loader
+from dictionary_store import Change, MemoryStore
+from spellchecker import check_text, word_cache
+
+
+def suggestions(text, snapshot, bulk, monkeypatch):
+    monkeypatch.setattr(spellchecker, "USE_BULK_SCORING", bulk)
+    word_cache.clear()
+    return [(s["start"], s["original"], s["suggestion"], s["similarity"]) for s in check_text(text, snapshot)["suggestions"]]
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_patched_matches_full_rebuild(bulk, monkeypatch):
+    rng = random.Random(5)
+    tables = synthetic_tables(500, rng)
+    store = MemoryStore(tables)
+    loader = store_loader(store)
+    loader()
+    for _ in range(4):
+        touched = random_edits(store, 30, rng)
+        patched = loader.sync()
+        rebuilt = build_snapshot(store.corrections(), store.towns())
+        assert patched.custom_replacements == rebuilt.custom_replacements
+        assert patched.town_names == rebuilt.town_names
+        assert patched.version == rebuilt.version
+        text = synthetic_document(5000, tables, rng) + " " + " ".join(touched)
+        assert suggestions(text, patched, bulk, monkeypatch) == suggestions(text, rebuilt, bulk, monkeypatch)
+
+
+def test_patched_leaves_original_snapshot_untouched():
+    snapshot = build_snapshot([{"original": "teh", "suggestion": "the"}], [{"name": "Springfield"}])
+    changes = [
+        Change("spellcheck", "upsert", {"original": "recieve", "suggestion": "receive"}),
+        Change("spellcheck", "delete", {"original": "teh"}),
+        Change("towns", "upsert", {"name": "Shelbyville"}),
+    ]
+    patched = snapshot.patched(changes)
+    assert snapshot.custom_replacements == {"teh": "the"}
+    assert snapshot.town_names == ["Springfield"]
+    assert check_text("teh", snapshot)["corrected_text"] == "the"
+    assert check_text("teh recieve", patched)["corrected_text"] == "teh receive"
+    assert patched.version != snapshot.version
+    assert patched.base_version == snapshot.version
+    assert patched.patches == (changes,)
+
+
+def test_patched_without_effect_returns_same_snapshot():
+    snapshot = build_snapshot([{"original": "teh", "suggestion": "the"}], [{"name": "Springfield"}])
+    unchanged = [
+        Change("spellcheck", "upsert", {"original": "teh", "suggestion": "the"}),
+        Change("towns", "delete", {"name": "Shelbyville"}),
+    ]
+    assert snapshot.patched(unchanged) is snapshot
+
+
+def test_version_depends_only_on_content():
+    snapshot = build_snapshot([{"original": "teh", "suggestion": "the"}], [{"name": "Springfield"}])
+    edited = snapshot.patched([
+        Change("spellcheck", "upsert", {"original": "teh", "suggestion": "tea"}),
+        Change("towns", "upsert", {"name": "Shelbyville"}),
+    ])
+    restored = edited.patched([
+        Change("towns", "delete", {"name": "Shelbyville"}),
+        Change("spellcheck", "upsert", {"original": "teh", "suggestion": "the"}),
+    ])
+    assert len({snapshot.version, edited.version}) == 2
+    assert restored.version == snapshot.version
+    reordered = build_snapshot(
+        [{"original": "b", "suggestion": "B"}, {"original": "a", "suggestion": "A"}], [{"name": "Y"}, {"name": "X"}]
+    )
+    assert reordered.version == build_snapshot(
+        [{"original": "a", "suggestion": "A"}, {"original": "b", "suggestion": "B"}], [{"name": "X"}, {"name": "Y"}]
+    ).version
+
+
+def test_full_reload_after_sync_keeps_version():
+    rng = random.Random(6)
+    store = MemoryStore(synthetic_tables(200, rng))
+    loader = store_loader(store)
+    loader()
+    random_edits(store, 20, rng)
+    synced = loader.sync()
+    # Otro cargador sin historial relee las tablas desde cero
+    assert store_loader(store)().version == synced.version
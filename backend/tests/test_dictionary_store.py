@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+from dictionary import build_snapshot, store_loader
+from dictionary_store import Change, SQLiteStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "dictionaries.sqlite3"))
+    store.upsert("spellcheck", [{"original": "teh", "suggestion": "the"}, {"original": "bro", "suggestion": "brother"}])
+    store.upsert("towns", [{"name": "Springfield"}])
+    return store
+
+
+def test_unchanged_upsert_records_nothing(store):
+    version = store.version()
+    store.upsert("spellcheck", [{"original": "teh", "suggestion": "the"}])
+    store.upsert("towns", [{"name": "Springfield"}])
+    store.delete("towns", ["Shelbyville"])
+    assert store.version() == version
+    assert store.changes(store.cursor()) == ([], store.cursor())
+
+
+def test_triggers_record_changes_made_outside_the_application(store):
+    cursor = store.cursor()
+    # Otra conexión cualquiera, como sqlite3 desde la línea de órdenes
+    conn = sqlite3.connect(store.path)
+    with conn:
+        conn.execute("UPDATE spellcheck SET suggestion = 'tea' WHERE original = 'teh'")
+        conn.execute("UPDATE spellcheck SET original = 'broo' WHERE original = 'bro'")
+        conn.execute("DELETE FROM towns WHERE name = 'Springfield'")
+        conn.execute("INSERT INTO towns (name) VALUES ('Shelbyville')")
+    conn.close()
+
+    changes, next_cursor = store.changes(cursor)
+    assert changes == [
+        Change("spellcheck", "upsert", {"original": "teh", "suggestion": "tea"}),
+        Change("spellcheck", "delete", {"original": "bro"}),
+        Change("spellcheck", "upsert", {"original": "broo", "suggestion": "brother"}),
+        Change("towns", "delete", {"name": "Springfield"}),
+        Change("towns", "upsert", {"name": "Shelbyville"}),
+    ]
+    assert next_cursor == store.cursor() == cursor + 5
+    assert store.changes(next_cursor) == ([], next_cursor)
+
+
+def test_loader_syncs_deletes_and_skips_unchanged_reloads(store):
+    loader = store_loader(store)
+    first = loader()
+    assert loader() is first
+
+    store.delete("spellcheck", ["teh"])
+    store.upsert("towns", [{"name": "Shelbyville"}])
+    synced = loader.sync()
+    rebuilt = build_snapshot(store.corrections(), store.towns())
+    assert synced.custom_replacements == rebuilt.custom_replacements == {"bro": "brother"}
+    assert synced.town_names == rebuilt.town_names == ["Springfield", "Shelbyville"]
+    assert synced.version == rebuilt.version
+    assert loader.sync() is synced
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import import_dictionary
+from dictionary_store import MemoryStore
+from import_dictionary import import_rows, read_checkpoint
+
+
+class FailingStore(MemoryStore):
+    """MemoryStore que falla en el upsert número fail_at (contando desde 1)."""
+
+    def __init__(self, fail_at: int):
+        super().__init__()
+        self.fail_at = fail_at
+        self.upserts = 0
+
+    def upsert(self, table, rows):
+        self.upserts += 1
+        if self.upserts == self.fail_at:
+            raise ConnectionError("store down")
+        super().upsert(table, rows)
+
+
+def rows(count):
+    return [{"original": f"Word{i}", "suggestion": f"word {i}"} for i in range(count)]
+
+
+def test_import_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "words.spellcheck.checkpoint")
+    store = FailingStore(fail_at=3)
+    with pytest.raises(ConnectionError):
+        import_rows(store, "spellcheck", rows(25), batch_size=10, checkpoint=checkpoint, retries=0)
+    assert read_checkpoint(checkpoint) == 20
+    assert len(store.corrections()) == 20
+
+    # Al relanzar solo se envían las filas que faltan y el checkpoint se borra al terminar
+    summary = import_rows(store, "spellcheck", rows(25), batch_size=10, checkpoint=checkpoint, retries=0)
+    assert (summary["resumed_from"], summary["read"], summary["imported"]) == (20, 25, 5)
+    assert store.upserts == 4
+    assert sorted(row["original"] for row in store.corrections()) == sorted(f"word{i}" for i in range(25))
+    assert not (tmp_path / "words.spellcheck.checkpoint").exists()
+
+
+def test_import_resumes_in_the_middle_of_a_batch(tmp_path):
+    checkpoint = tmp_path / "towns.checkpoint"
+    checkpoint.write_text(json.dumps({"rows": 7}))
+    store = MemoryStore()
+    names = [{"name": f"Town {i}"} for i in range(12)]
+    summary = import_rows(store, "towns", names, batch_size=5, checkpoint=str(checkpoint))
+    assert (summary["resumed_from"], summary["imported"]) == (7, 5)
+    assert [row["name"] for row in store.towns()] == [f"Town {i}" for i in range(7, 12)]
+
+
+def test_import_retries_failed_batch(monkeypatch):
+    monkeypatch.setattr(import_dictionary.time, "sleep", lambda seconds: None)
+    store = FailingStore(fail_at=2)
+    summary = import_rows(store, "spellcheck", rows(10) + [{"original": " ", "suggestion": "x"}], batch_size=4, retries=1)
+    assert (summary["imported"], summary["skipped"]) == (10, 1)
+    assert len(store.corrections()) == 10
@@ -0,0 +1,67 @@
+import pytest
+
+import spellchecker
+from dictionary import build_snapshot
+from lexicon import EnglishLexicon, file_words
+from spellchecker import check_text, word_cache
+
+
+def make_snapshot():
+    return build_snapshot(
+        [{"original": "recieve", "suggestion": "receive"}, {"original": "becuase", "suggestion": "because"}],
+        [{"name": "Paris"}, {"name": "Springfield"}],
+    )
+
+
+def check(text, snapshot, known_words, monkeypatch):
+    monkeypatch.setattr(spellchecker, "english_lexicon", known_words)
+    word_cache.clear()
+    timings = {}
+    return check_text(text, snapshot, timings=timings), timings
+
+
+def test_lexicon_lookup_ignores_case():
+    known_words = EnglishLexicon(lambda: ["Relieve", "house", "house"], enabled=True)
+    assert "relieve" in known_words and "HOUSE" in known_words
+    assert "hous" not in known_words and "houses" not in known_words
+    # Más larga que el ancho del array: no debe coincidir con su prefijo recortado
+    assert "relieveandmore" not in known_words
+    assert len(known_words) == 2
+
+
+def test_failed_load_leaves_lexicon_empty():
+    def broken():
+        raise LookupError("corpus words no instalado")
+
+    known_words = EnglishLexicon(broken, enabled=True)
+    assert "house" not in known_words
+    assert known_words.stats()["error"] == "corpus words no instalado"
+    assert known_words.stats()["words"] == 0
+
+
+def test_file_words_reads_first_column_up_to_limit(tmp_path):
+    path = tmp_path / "frecuentes.txt"
+    path.write_text("# palabra frecuencia\nthe 100\nof 90\n\nhouse 50\nrelieve 10\n", encoding="utf-8")
+    assert list(file_words(str(path))) == ["the", "of", "house", "relieve"]
+    assert list(file_words(str(path), limit=3)) == ["the", "of"]
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_known_words_skip_fuzzy_stages(enabled, monkeypatch):
+    snapshot = make_snapshot()
+    known_words = EnglishLexicon(lambda: ["relieve", "paris", "becuase"], enabled=enabled)
+    response, timings = check("relieve Paris becuase", snapshot, known_words, monkeypatch)
+    if enabled:
+        # "relieve" se acepta sin compararla con spellcheck ni con towns
+        assert response["corrected_text"] == "relieve Paris because"
+        assert "fuzzy_town" not in timings and "fuzzy_corrections" not in timings
+    else:
+        assert response["corrected_text"] == "receive Paris because"
+        assert "fuzzy_corrections" in timings
+        assert not known_words.loaded
+
+
+def test_dictionary_tables_take_priority_over_lexicon(monkeypatch):
+    known_words = EnglishLexicon(lambda: ["paris", "becuase"], enabled=True)
+    response, _ = check("paris becuase", make_snapshot(), known_words, monkeypatch)
+    assert response["corrected_text"] == "Paris because"
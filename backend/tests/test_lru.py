@@ -0,0 +1,44 @@
+import time
+
+from dictionary import build_snapshot
+from lru import LRUCache
+from spellchecker import check_text, word_cache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 3, 1, 1)
+
+
+def test_weight_and_ttl_limits():
+    cache = LRUCache(10, ttl=0.05, weight=len)
+    cache.put("a", b"12345")
+    cache.put("b", b"123456")
+    assert cache.get("a") is None and cache.get("b") == b"123456"
+    # Un valor más pesado que la caché entera no se guarda
+    cache.put("big", b"x" * 11)
+    assert cache.get("big") is None and len(cache) == 1
+    time.sleep(0.06)
+    assert cache.get("b") is None and len(cache) == 0
+
+
+def test_disabled_cache_stores_nothing():
+    for cache in (LRUCache(0), LRUCache(10, ttl=0)):
+        cache.put("a", 1)
+        assert cache.get("a") is None
+
+
+def test_word_cache_is_keyed_on_snapshot_version():
+    word_cache.clear()
+    before = build_snapshot([{"original": "teh", "suggestion": "the"}], [])
+    after = build_snapshot([{"original": "teh", "suggestion": "tea"}], [])
+    assert check_text("teh", before)["corrected_text"] == "the"
+    assert check_text("teh", after)["corrected_text"] == "tea"
+    assert word_cache.get((before.version, "teh")).corrected == "the"
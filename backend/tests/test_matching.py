@@ -0,0 +1,60 @@
+import random
+
+import pytest
+from fuzzywuzzy import fuzz, process, utils
+
+from benchmarks.town_matcher import misspell, synthetic_towns
+from matching import CorrectionIndex, FuzzyMatcher
+from scoring import BulkScorer
+
+
+def extract_one(query, choices):
+    match = process.extractOne(query, choices, scorer=fuzz.ratio, score_cutoff=85)
+    return None if match is None else (match[0], match[1])
+
+
+def bulk_extract(queries, choices):
+    scorer = BulkScorer([utils.full_process(choice) for choice in choices])
+    return [None if match is None else (choices[match[0]], match[1]) for match in scorer.best_matches(queries)]
+
+
+@pytest.fixture(scope="module")
+def towns():
+    return synthetic_towns(300, random.Random(11))
+
+
+@pytest.fixture(scope="module")
+def queries(towns):
+    rng = random.Random(12)
+    return [misspell(rng.choice(towns), rng) for _ in range(300)] + [rng.choice(towns).upper() for _ in range(20)]
+
+
+# "abcdefghijklm" puntúa 86.67 con la primera y 86.96 con la segunda: las dos valen 87
+TIES = [
+    ("abcdefghijklm", ["abcdefghijklmwxyz", "abcdefghij"]),
+    ("abcdefghijklm", ["abcdefghij", "abcdefghijklmwxyz"]),
+    ("springfeld", ["Springfield", "Springfelds", "Springfield"]),
+]
+
+
+@pytest.mark.parametrize("query,choices", TIES)
+def test_ties_pick_first_choice(query, choices):
+    expected = extract_one(query, choices)
+    assert FuzzyMatcher(choices).extract_one(query) == expected
+    assert bulk_extract([query], choices) == [expected]
+
+
+def test_fuzzy_matcher_matches_extract_one(towns, queries):
+    matcher = FuzzyMatcher(towns)
+    assert [matcher.extract_one(query) for query in queries] == [extract_one(query, towns) for query in queries]
+
+
+def test_bulk_scorer_matches_extract_one(towns, queries):
+    assert bulk_extract(queries, towns) == [extract_one(query, towns) for query in queries]
+
+
+def test_correction_index_matches_extract_one(towns, queries):
+    keys = sorted({town.lower() for town in towns})
+    index = CorrectionIndex(keys)
+    lowered = [query.lower() for query in queries]
+    assert [index.extract_one(query) for query in lowered] == [extract_one(query, keys) for query in lowered]
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import auth
+import executors
+from executors import ConcurrencyLimiter, Overloaded, run_password
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def hash_in_subprocess(rounds: int, password: str) -> str:
+    env = dict(os.environ, BCRYPT_ROUNDS=str(rounds))
+    code = f"import auth; print(auth.get_password_hash({password!r}))"
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def test_bcrypt_rounds_sets_the_cost_of_new_hashes():
+    assert auth.get_password_hash("secreto").split("$")[2] == f"{auth.BCRYPT_ROUNDS:02d}"
+    cheap = hash_in_subprocess(4, "secreto")
+    assert cheap.split("$")[2] == "04"
+    # Los hashes creados con otro coste se siguen verificando
+    assert auth.verify_password("secreto", cheap)
+    assert not auth.verify_password("otro", cheap)
+
+
+@pytest.fixture()
+def password_pool(monkeypatch):
+    # Un pool propio: el de executors se apaga al cerrar la aplicación en test_api
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bcrypt")
+    limiter = ConcurrencyLimiter(limit=1, max_queue=0, queue_timeout=1)
+    monkeypatch.setattr(executors, "password_executor", pool)
+    monkeypatch.setattr(executors, "password_limiter", limiter)
+    yield limiter
+    pool.shutdown(wait=True)
+
+
+def test_password_work_runs_in_its_own_pool(password_pool):
+    name = asyncio.run(run_password(lambda: threading.current_thread().name))
+    assert name.startswith("bcrypt")
+    assert (password_pool.active, password_pool.waiting) == (0, 0)
+
+
+def test_password_pool_rejects_when_full_without_blocking_the_loop(password_pool):
+    release = threading.Event()
+
+    async def scenario():
+        hashing = asyncio.ensure_future(run_password(release.wait))
+        await asyncio.sleep(0.05)
+        # El event loop sigue libre mientras bcrypt ocupa la única plaza
+        assert password_pool.active == 1
+        with pytest.raises(Overloaded):
+            await run_password(release.wait)
+        release.set()
+        return await hashing
+
+    assert asyncio.run(scenario()) is True
+    assert (password_pool.active, password_pool.rejected) == (0, 1)
@@ -0,0 +1,89 @@
+import gc
+import os
+import signal
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from dictionary import DictionaryCache, store_loader
+from dictionary_store import MemoryStore
+from serve import Supervisor
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="serve.py crea los workers con os.fork")
+
+
+class SleepingSupervisor(Supervisor):
+    """Supervisor cuyos workers no arrancan uvicorn: esperan hasta que los paren."""
+
+    def _run_worker(self):
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            time.sleep(60)
+        finally:
+            os._exit(0)
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.fixture()
+def supervisor(tmp_path, monkeypatch):
+    # forget_worker borra los ficheros de métricas del worker parado
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    store = MemoryStore({"spellcheck": [{"original": "teh", "suggestion": "the"}], "towns": [{"name": "Springfield"}]})
+    cache = DictionaryCache(store_loader(store), ttl=0, snapshot_path="", sync_interval=0)
+    supervisor = SleepingSupervisor(SimpleNamespace(dictionary_cache=cache), None, 2, 5, "info")
+    supervisor.version = cache.reload().version
+    supervisor.generation = 1
+    for _ in range(supervisor.worker_count):
+        supervisor.spawn()
+    try:
+        yield supervisor, store
+    finally:
+        supervisor.stop_all()
+        gc.unfreeze()
+
+
+def test_reload_replaces_workers_only_when_version_changes(supervisor):
+    supervisor, store = supervisor
+    first = dict(supervisor.workers)
+    assert list(first.values()) == [1, 1]
+
+    supervisor.reload()
+    assert supervisor.workers == first and supervisor.generation == 1
+
+    store.upsert("spellcheck", [{"original": "teh", "suggestion": "tea"}])
+    supervisor.reload()
+    assert supervisor.generation == 2
+    assert list(supervisor.workers.values()) == [2, 2]
+    assert not set(first) & set(supervisor.workers)
+    assert not any(alive(pid) for pid in first)
+    assert all(alive(pid) for pid in supervisor.workers)
+
+    # Un cambio que se deshace deja la misma versión: no se sustituye nada
+    store.upsert("spellcheck", [{"original": "teh", "suggestion": "the"}])
+    store.upsert("spellcheck", [{"original": "teh", "suggestion": "tea"}])
+    second = dict(supervisor.workers)
+    supervisor.reload()
+    assert supervisor.workers == second
+
+    supervisor.reload(force=True)
+    assert supervisor.generation == 3 and list(supervisor.workers.values()) == [3, 3]
+
+
+def test_reap_replaces_a_worker_that_died(supervisor):
+    supervisor, _ = supervisor
+    dead = next(iter(supervisor.workers))
+    os.kill(dead, signal.SIGKILL)
+    deadline = time.monotonic() + 5
+    while dead in supervisor.workers and time.monotonic() < deadline:
+        supervisor.reap()
+        time.sleep(0.05)
+    assert dead not in supervisor.workers
+    assert len(supervisor.workers) == 2 and set(supervisor.workers.values()) == {1}
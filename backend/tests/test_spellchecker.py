@@ -0,0 +1,133 @@
+import random
+
+from dictionary import build_snapshot
+import spellchecker
+from lru import LRUCache
+from spellchecker import StreamingCheck, check_blocks, check_text
+
+TOWNS = ["San Juan", "New York", "Salt Lake City", "Springfield", "Paris"]
+CORRECTIONS = {"bro": "brother", "becuase": "because"}
+
+
+def make_snapshot():
+    return build_snapshot(
+        [{"original": original, "suggestion": suggestion} for original, suggestion in CORRECTIONS.items()],
+        [{"name": name} for name in TOWNS],
+    )
+
+
+def test_town_phrase_does_not_cross_lines():
+    text = "We flew back from san\n\njuan arrived home.\nnew\nyork is next"
+    response = check_text(text, make_snapshot())
+    assert response["corrected_text"] == text
+    assert response["town_matches"] == []
+
+
+def test_town_phrase_on_one_line_keeps_other_newlines():
+    text = "From san  juan\nto new york\n\nbro"
+    response = check_text(text, make_snapshot())
+    assert response["corrected_text"] == "From San Juan\nto New York\n\nbrother"
+    assert [(m["suggestion"], m["start"], m["end"]) for m in response["town_matches"]] == [
+        ("San Juan", 5, 14), ("New York", 18, 26),
+    ]
+
+
+def test_longest_phrase_before_line_break():
+    response = check_text("salt lake\ncity", make_snapshot())
+    assert response["corrected_text"] == "salt lake\ncity"
+    response = check_text("visit salt lake city\nsoon", make_snapshot())
+    assert response["corrected_text"] == "visit Salt Lake City\nsoon"
+
+
+def test_corrected_text_preserves_whitespace():
+    rng = random.Random(7)
+    words = ["bro", "becuase", "san", "juan", "new", "york", "hello", "42", "café", ",", "."]
+    separators = [" ", "  ", "\n", "\n\n", "\t", " \n "]
+    snapshot = make_snapshot()
+    for _ in range(200):
+        tokens = [rng.choice(words) for _ in range(rng.randint(1, 30))]
+        text = "".join(token + rng.choice(separators) for token in tokens)
+        response = check_text(text, snapshot)
+        # Solo cambian las palabras con sugerencia; todo lo demás queda en su sitio
+        expected = []
+        position = 0
+        for suggestion in response["suggestions"]:
+            expected.append(text[position:suggestion["start"]])
+            expected.append(suggestion["suggestion"])
+            position = suggestion["end"]
+        expected.append(text[position:])
+        assert response["corrected_text"] == "".join(expected)
+        assert response["corrected_text"].count("\n") == text.count("\n")
+
+
+def test_check_blocks_matches_check_text():
+    rng = random.Random(3)
+    words = ["san", "juan", "new", "york", "bro", "becuase", "hello", "paris", ","]
+    separators = [" ", " ", " ", "\n", "\n\n", "\n  \n"]
+    snapshot = make_snapshot()
+    cache = LRUCache(1000)
+    for _ in range(200):
+        text = "".join(rng.choice(words) + rng.choice(separators) for _ in range(rng.randint(1, 60)))
+        response = check_text(text, snapshot)
+        blocks = check_blocks(text, snapshot, cache)
+        assert {key: blocks[key] for key in response} == response
+
+
+def test_check_blocks_rechecks_only_edited_paragraphs():
+    snapshot = make_snapshot()
+    cache = LRUCache(1000)
+    paragraphs = ["hello bro", "from san juan", "becuase paris"]
+    first = check_blocks("\n\n".join(paragraphs), snapshot, cache)
+    assert (first["blocks"], first["rechecked_blocks"]) == (3, 3)
+    paragraphs[1] = "from new york"
+    text = "\n\n".join(paragraphs)
+    second = check_blocks(text, snapshot, cache)
+    assert (second["blocks"], second["rechecked_blocks"]) == (3, 1)
+    assert second["corrected_text"] == "hello brother\n\nfrom New York\n\nbecause Paris"
+    assert second["suggestions"] == check_text(text, snapshot)["suggestions"]
+
+
+def stream(snapshot, parts):
+    checker = StreamingCheck(snapshot)
+    events = []
+    for part in parts:
+        events.extend(checker.feed(part))
+    return events + checker.finish()
+
+
+def test_streaming_keeps_town_phrase_split_between_chunks():
+    events = stream(make_snapshot(), ["hello san ", "juan bro"])
+    assert "".join(event["corrected_text"] for event in events if event["type"] == "text") == "hello San Juan brother"
+
+
+def test_streaming_matches_check_text():
+    rng = random.Random(9)
+    words = ["san", "juan", "salt", "lake", "city", "new", "york", "bro", "hello", ",", "paris"]
+    separators = [" ", "  ", "\n", "\n\n"]
+    snapshot = make_snapshot()
+    for _ in range(300):
+        text = "".join(rng.choice(words) + rng.choice(separators) for _ in range(rng.randint(1, 40)))
+        cuts = sorted(rng.sample(range(len(text) + 1), rng.randint(0, min(8, len(text)))))
+        parts = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+        events = stream(snapshot, parts)
+        response = check_text(text, snapshot)
+        texts = [event for event in events if event["type"] == "text"]
+        assert "".join(event["corrected_text"] for event in texts) == response["corrected_text"]
+        assert "".join(event["full_corrected_code"] for event in texts) == response["full_corrected_code"]
+        suggestions = [{k: v for k, v in event.items() if k != "type"} for event in events if event["type"] == "suggestion"]
+        assert suggestions == response["suggestions"]
+
+
+def test_streaming_bounds_pending_text_without_whitespace(monkeypatch):
+    monkeypatch.setattr(spellchecker, "STREAM_MAX_PENDING", 100)
+    snapshot = make_snapshot()
+    assert snapshot.town_index.max_phrase_tokens >= 2
+    for parts in (["x" * 30] * 40, ["san "] + ["y" * 30] * 40, ["hello bro " + "z" * 30] + ["z" * 30] * 40):
+        checker = StreamingCheck(snapshot)
+        events = []
+        for part in parts:
+            events.extend(checker.feed(part))
+            assert len(checker._pending) < 100 + len(part)
+        events.extend(checker.finish())
+        text = "".join(event["corrected_text"] for event in events if event["type"] == "text")
+        assert text.replace("brother", "bro") == "".join(parts)
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+import supabase_client
+from dictionary_store import SupabaseStore, create_store
+
+
+def test_store_uses_current_shared_client(monkeypatch):
+    parent, child = object(), object()
+    monkeypatch.setattr(supabase_client, "_client", parent)
+    store = create_store("supabase")
+    assert store.client is parent
+    monkeypatch.setattr(supabase_client, "_client", child)
+    assert store.client is child
+
+
+def test_explicit_client_is_kept():
+    client = object()
+    assert SupabaseStore(client).client is client
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="os.fork solo existe en Unix")
+def test_forked_child_does_not_reuse_parent_client(monkeypatch):
+    parent = object()
+    monkeypatch.setattr(supabase_client, "_client", parent)
+    store = create_store("supabase")
+    pid = os.fork()
+    if pid == 0:
+        # Hijo: el cliente del padre se ha olvidado y el almacén toma el nuevo
+        ok = supabase_client._client is None
+        supabase_client._client = child = object()
+        ok = ok and store.client is child
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert store.client is parent
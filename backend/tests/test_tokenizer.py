@@ -0,0 +1,26 @@
+import random
+
+from tokenizer import NUMBER, OTHER, PUNCT, WORD, iter_spans, tokenize, tokenize_spans
+
+
+def test_iter_spans_kinds():
+    text = "Don't  pay 1,000.50 for mp3 café\n3rd, at 12:30!"
+    spans = list(iter_spans(text))
+    assert [(text[span.start:span.end], span.kind) for span in spans] == [
+        ("Don't", WORD), ("pay", WORD), ("1,000.50", NUMBER), ("for", WORD), ("mp3", OTHER),
+        ("café", WORD), ("3rd", OTHER), (",", PUNCT), ("at", WORD), ("12:30", NUMBER), ("!", PUNCT),
+    ]
+
+
+def test_spans_rebuild_the_original_text():
+    rng = random.Random(4)
+    pieces = ["word", "l'été", "42", "3.5", "x_y", ",", "!", "’", " ", "  ", "\n", "\t", "\n\n"]
+    for _ in range(300):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+        words, spans = tokenize_spans(text)
+        assert words == tokenize(text)
+        assert spans == [(span.start, span.end) for span in iter_spans(text)]
+        assert words == [text[start:end] for start, end in spans]
+        # Entre dos tokens solo quedan espacios
+        gaps = [text[end:start] for (_, end), (start, _) in zip([(0, 0)] + spans, spans + [(len(text), 0)])]
+        assert all(not gap.strip() for gap in gaps)
@@ -0,0 +1,63 @@
+import re
+from typing import Iterator, List, NamedTuple, Tuple
+
+# Tipos de token
+WORD = "word"
+NUMBER = "number"
+# Mezcla de letras, cifras o guiones bajos ("mp3", "3rd", "snake_case"): nunca se corrige
+OTHER = "other"
+PUNCT = "punct"
+
+# Números (con separadores decimales o de hora), secuencias alfanuméricas con apóstrofos
+# opcionales y cualquier otro carácter que no sea un espacio, uno por token
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,:]\d+)*\b|\w+(?:['’]\w+)*|\S")
+
+_APOSTROPHES = str.maketrans("", "", "'’")
+_NUMBER_SEPARATORS = str.maketrans("", "", ".,:")
+
+
+class Span(NamedTuple):
+    """Posición [start, end) de un token en el texto original y su tipo."""
+    start: int
+    end: int
+    kind: str
+
+
+def token_kind(token: str) -> str:
+    if token.translate(_NUMBER_SEPARATORS).isdigit():
+        return NUMBER
+    if token.translate(_APOSTROPHES).isalpha():
+        return WORD
+    if token[0].isalnum() or token[0] == "_":
+        return OTHER
+    return PUNCT
+
+
+def iter_spans(text: str) -> Iterator[Span]:
+    """Recorre los tokens del texto (palabras Unicode, números y signos) sin copiarlo.
+
+    El texto que queda entre dos spans son solo espacios, así que el texto original se
+    reconstruye exactamente a partir de los spans y de esos huecos.
+    """
+    for match in TOKEN_PATTERN.finditer(text):
+        start, end = match.span()
+        yield Span(start, end, token_kind(text[start:end]))
+
+
+def tokenize(text: str) -> List[str]:
+    """Extrae palabras, números y signos de puntuación del texto."""
+    return TOKEN_PATTERN.findall(text)
+
+
+def tokenize_spans(text: str) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """Tokens del texto y su posición [start, end), en una sola pasada de finditer.
+
+    Es lo que usa la corrección: las posiciones salen de match.span() como en iter_spans,
+    pero sin crear un Span ni calcular el tipo de cada token, que es lo que más cuesta.
+    """
+    words = []
+    spans = []
+    for match in TOKEN_PATTERN.finditer(text):
+        words.append(match.group())
+        spans.append(match.span())
+    return words, spans